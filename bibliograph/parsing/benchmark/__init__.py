@@ -0,0 +1,2 @@
+# benchmarks of the parsers on synthetic corpora, run them with
+#   python -m bibliograph.parsing.benchmark --help
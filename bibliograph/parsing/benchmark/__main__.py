@@ -0,0 +1,3 @@
+from bibliograph.parsing.benchmark.runner import main
+
+main()
@@ -0,0 +1,251 @@
+"""Synthetic corpora for the benchmarks"""
+
+# Python stuff
+import random
+from xml.sax.saxutils import escape
+
+_words = ('analysis', 'evidence', 'genetic', 'python', 'model', 'network',
+          'learning', 'distance', 'behavior', 'markets', 'municipal',
+          'reptiles', 'differentiation', 'hatching', 'pedagogical', 'study',
+          'system', 'theory', 'structure', 'dynamics', 'protein', 'cell',
+          'population', 'measurement', 'antibody', 'workshop', 'sequence',
+          'evolution', 'signal', 'approach', 'method', 'effects', 'human')
+
+_first_names = ('Mark', 'Pedro', 'James', 'Henrik', 'Martin', 'Lorenzo',
+                'Anna', 'Maria', 'Tobias', 'Ines', 'Paul', 'Cris', 'Raphael',
+                'Sophie', 'Jean', 'Olga', 'Jakob', 'Emma')
+
+_last_names = ('Lutz', 'Carneiro', 'Heckman', 'Christoffersen', 'Paldam',
+               'Groot', 'Bruins', 'Breeuwer', 'Alibardi', 'Thompson',
+               'Staccini', 'Dufour', 'Fieschi', 'Esparza', 'Mueller',
+               'Garcia', 'Nakamura', 'Olsen', 'Rossi', 'Novak')
+
+_journals = ('Heredity', 'Public Choice', 'Stud Health Technol Inform',
+             'Journal of Morphology', 'Nature Genetics', 'AIDS',
+             'Journal of Theoretical Biology', 'Economics Letters')
+
+# special characters as LaTeX (for BibTeX) and as UTF-8 (the others)
+_specials = (('{\\"u}', '\xc3\xbc'), ('{\\"o}', '\xc3\xb6'),
+             ('{\\"a}', '\xc3\xa4'), ("{\\'e}", '\xc3\xa9'),
+             ('{\\`a}', '\xc3\xa0'), ('{\\ss}', '\xc3\x9f'),
+             ('{\\c{c}}', '\xc3\xa7'), ('$\\alpha$', '\xce\xb1'))
+
+# the formats generated and the (utility) names of their parsers
+formats = {'bibtex': 'bibtex',
+           'medline': 'medline',
+           'ris': 'ris',
+           'endnote': 'endnote',
+           'mods': 'xml',
+           }
+
+_mods_header = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<modsCollection xmlns="http://www.loc.gov/mods/v3">\n')
+_mods_footer = '</modsCollection>\n'
+
+
+class CorpusGenerator(object):
+    """
+    Generates reproducible sources of made up references in BibTeX,
+    Medline, RIS, EndNote and MODS format.
+
+    'authors' is the number of authors per entry and 'abstract_words' the
+    length of the abstracts. 'special_density' is the share of words with
+    a special character, written as a LaTeX command in BibTeX and as UTF-8
+    in the other formats. BibTeX sources start with 'macros' @String
+    definitions used by the journal fields.
+    """
+
+    def __init__(self, seed=0, authors=3, abstract_words=80,
+                 special_density=0.1, macros=10):
+        self.seed = seed
+        self.authors = authors
+        self.abstract_words = abstract_words
+        self.special_density = special_density
+        self.macros = macros
+
+    def generate(self, format, count):
+        """
+        returns a source with 'count' entries in 'format'
+        """
+        return ''.join(self.iterSource(format, count))
+
+    def write(self, format, count, fileobj):
+        """
+        writes a source with 'count' entries in 'format' to a file object
+        without keeping it in memory
+        """
+        for text in self.iterSource(format, count):
+            fileobj.write(text)
+
+    def iterSource(self, format, count):
+        """
+        yields the parts of a source with 'count' entries in 'format'
+        """
+        if format not in formats:
+            raise ValueError("Unknown format '%s'" % format)
+        rng = random.Random(self.seed)
+        if format == 'bibtex':
+            for i in range(self.macros):
+                yield '@String{j%d = "%s %d"}\n' % (i, rng.choice(_journals),
+                                                   i)
+            yield '\n'
+        elif format == 'mods':
+            yield _mods_header
+        record = getattr(self, format)
+        for number in xrange(count):
+            yield record(rng, number, self.makeReference(rng, number,
+                                                         format == 'bibtex'))
+        if format == 'mods':
+            yield _mods_footer
+
+    def makeReference(self, rng, number, latex=False):
+        """
+        returns the made up fields of a reference
+        """
+        authors = []
+        for i in range(self.authors):
+            authors.append((self.word(rng, rng.choice(_first_names), latex),
+                            self.word(rng, rng.choice(_last_names), latex)))
+        first_page = rng.randint(1, 900)
+        return {'title': self.words(rng, rng.randint(5, 15), latex),
+                'abstract': self.words(rng, self.abstract_words, latex),
+                'authors': authors,
+                'journal': rng.choice(_journals),
+                'year': str(rng.randint(1950, 2011)),
+                'volume': str(rng.randint(1, 120)),
+                'number': str(rng.randint(1, 12)),
+                'pages': (str(first_page), str(first_page + rng.randint(1, 30))),
+                'doi': '10.%d/bench.%d' % (rng.randint(1000, 9999), number),
+                }
+
+    def word(self, rng, word, latex=False):
+        if rng.random() >= self.special_density:
+            return word
+        special = rng.choice(_specials)[not latex and 1 or 0]
+        position = rng.randint(1, len(word) - 1)
+        return word[:position] + special + word[position:]
+
+    def words(self, rng, count, latex=False):
+        return ' '.join([self.word(rng, rng.choice(_words), latex)
+                         for i in range(count)])
+
+    def wrap(self, text, indent, width=78):
+        """
+        wraps a text the way Medline does
+        """
+        lines = []
+        line = []
+        length = 0
+        for word in text.split():
+            if line and length + len(word) > width - len(indent):
+                lines.append(' '.join(line))
+                line = []
+                length = 0
+            line.append(word)
+            length += len(word) + 1
+        lines.append(' '.join(line))
+        return ('\n' + indent).join(lines)
+
+    def bibtex(self, rng, number, ref):
+        if self.macros:
+            journal = 'j%d' % rng.randrange(self.macros)
+        else:
+            journal = '{%s}' % ref['journal']
+        return ('@Article{Bench%d,\n'
+                '  author = {%s},\n'
+                '  title = {%s},\n'
+                '  journal = %s,\n'
+                '  year = %s,\n'
+                '  volume = {%s},\n'
+                '  number = {%s},\n'
+                '  pages = {%s--%s},\n'
+                '  abstract = {%s},\n'
+                '  doi = {%s}\n'
+                '}\n\n'
+                % (number,
+                   ' and '.join(['%s %s' % name for name in ref['authors']]),
+                   ref['title'], journal, ref['year'], ref['volume'],
+                   ref['number'], ref['pages'][0], ref['pages'][1],
+                   ref['abstract'], ref['doi']))
+
+    def medline(self, rng, number, ref):
+        lines = ['PMID- %d' % (10000000 + number),
+                 'DP  - %s' % ref['year'],
+                 'TI  - %s' % self.wrap(ref['title'], '      '),
+                 'PG  - %s-%s' % ref['pages'],
+                 'AB  - %s' % self.wrap(ref['abstract'], '      ')]
+        for first, last in ref['authors']:
+            lines.append('FAU - %s, %s' % (last, first))
+            lines.append('AU  - %s %s' % (last, first[0]))
+        lines.extend(['PT  - Journal Article',
+                      'TA  - %s' % ref['journal'],
+                      'VI  - %s' % ref['volume'],
+                      'IP  - %s' % ref['number'],
+                      'AID - %s [doi]' % ref['doi']])
+        return '\n'.join(lines) + '\n\n'
+
+    def ris(self, rng, number, ref):
+        lines = ['TY  - JOUR',
+                 'ID  - Bench%d' % number,
+                 'T1  - %s' % ref['title']]
+        for first, last in ref['authors']:
+            lines.append('AU  - %s, %s' % (last, first))
+        lines.extend(['JF  - %s' % ref['journal'],
+                      'PY  - %s' % ref['year'],
+                      'VL  - %s' % ref['volume'],
+                      'IS  - %s' % ref['number'],
+                      'SP  - %s' % ref['pages'][0],
+                      'EP  - %s' % ref['pages'][1],
+                      'N2  - %s' % ref['abstract'],
+                      'DO  - %s' % ref['doi'],
+                      'ER  - '])
+        return '\n'.join(lines) + '\n\n'
+
+    def endnote(self, rng, number, ref):
+        lines = ['%0 Journal Article']
+        for first, last in ref['authors']:
+            lines.append('%%A %s, %s' % (last, first))
+        lines.extend(['%%T %s' % ref['title'],
+                      '%%J %s' % ref['journal'],
+                      '%%D %s' % ref['year'],
+                      '%%V %s' % ref['volume'],
+                      '%%N %s' % ref['number'],
+                      '%%P %s-%s' % ref['pages'],
+                      '%%X %s' % ref['abstract'],
+                      '%%R %s' % ref['doi'],
+                      '%%F Bench%d' % number])
+        return '\n'.join(lines) + '\n\n'
+
+    def mods(self, rng, number, ref):
+        names = []
+        for first, last in ref['authors']:
+            names.append('  <name type="personal">\n'
+                         '    <namePart type="given">%s</namePart>\n'
+                         '    <namePart type="family">%s</namePart>\n'
+                         '    <role><roleTerm type="text">author</roleTerm>'
+                         '</role>\n'
+                         '  </name>\n' % (escape(first), escape(last)))
+        return ('<mods ID="Bench%d">\n'
+                '  <titleInfo><title>%s</title></titleInfo>\n'
+                '%s'
+                '  <originInfo><dateIssued>%s</dateIssued></originInfo>\n'
+                '  <typeOfResource>text</typeOfResource>\n'
+                '  <genre>journal article</genre>\n'
+                '  <relatedItem type="host">\n'
+                '    <titleInfo><title>%s</title></titleInfo>\n'
+                '    <originInfo><issuance>continuing</issuance></originInfo>\n'
+                '    <genre authority="marcgt">periodical</genre>\n'
+                '    <part>\n'
+                '      <detail type="volume"><number>%s</number></detail>\n'
+                '      <detail type="issue"><number>%s</number></detail>\n'
+                '      <extent unit="page"><start>%s</start><end>%s</end>'
+                '</extent>\n'
+                '    </part>\n'
+                '  </relatedItem>\n'
+                '  <abstract>%s</abstract>\n'
+                '  <identifier type="doi">%s</identifier>\n'
+                '</mods>\n'
+                % (number, escape(ref['title']), ''.join(names), ref['year'],
+                   escape(ref['journal']), ref['volume'], ref['number'],
+                   ref['pages'][0], ref['pages'][1], escape(ref['abstract']),
+                   escape(ref['doi'])))
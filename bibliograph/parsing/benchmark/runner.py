@@ -0,0 +1,199 @@
+"""Throughput benchmarks of the parsers"""
+
+# Python stuff
+import os
+import sys
+import csv
+import time
+import json
+import tempfile
+import platform
+from optparse import OptionParser
+
+# Bibliography stuff
+from bibliograph.parsing.cache import VERSION
+from bibliograph.parsing.stats import ParseStats
+from bibliograph.parsing.parsers.bibtex import BibtexParser
+from bibliograph.parsing.parsers.medline import MedlineParser
+from bibliograph.parsing.parsers.ris import RISParser
+from bibliograph.parsing.parsers.endnote import EndNoteParser
+from bibliograph.parsing.parsers.xml import XMLParser
+from bibliograph.parsing.benchmark.corpus import CorpusGenerator, formats
+
+parsers = {'bibtex': BibtexParser,
+           'medline': MedlineParser,
+           'ris': RISParser,
+           'endnote': EndNoteParser,
+           'xml': XMLParser,
+           }
+
+columns = ('format', 'entries', 'bytes', 'parsed', 'seconds',
+           'entries_per_second', 'megabytes_per_second', 'mapped')
+
+
+def timeStages(parser, parse):
+    """
+    calls 'parse' once while the parser collects ParseStats and returns
+    the seconds spent in each stage
+    """
+    stats = parser.stats = ParseStats()
+    try:
+        parse()
+    finally:
+        parser.stats = None
+    return dict([(stage, data['seconds'])
+                 for stage, data in stats.asDict().items()])
+
+
+def runBenchmark(format, count, generator=None, repeat=3, mapped=False):
+    """
+    generates a 'format' source with 'count' entries and returns the
+    results of parsing it with getEntries (the best of 'repeat' runs)
+    and the seconds of its stages as a dictionary
+
+    if 'mapped' is set the source is written to a temporary file and
+    parsed with iterEntriesFromFile instead, without keeping the source
+    or the entries in memory
+
+    the stages are timed in an extra run
+    """
+    if generator is None:
+        generator = CorpusGenerator()
+    parser = parsers[formats[format]]()
+    if mapped:
+        fd, path = tempfile.mkstemp('.' + format)
+        f = os.fdopen(fd, 'wb')
+        try:
+            generator.write(format, count, f)
+        finally:
+            f.close()
+        size = os.path.getsize(path)
+        def parse():
+            parsed = 0
+            for entry in parser.iterEntriesFromFile(path):
+                parsed += 1
+            return parsed
+    else:
+        source = generator.generate(format, count)
+        size = len(source)
+        def parse():
+            return len(parser.getEntries(source))
+
+    try:
+        best = None
+        for i in range(repeat):
+            started = time.time()
+            parsed = parse()
+            seconds = time.time() - started
+            if best is None or seconds < best:
+                best = seconds
+        stages = timeStages(parser, parse)
+    finally:
+        if mapped:
+            os.remove(path)
+    best = max(best, 1e-9)
+    return {'format': format,
+            'entries': count,
+            'bytes': size,
+            'parsed': parsed,
+            'seconds': best,
+            'entries_per_second': parsed / best,
+            'megabytes_per_second': size / best / 1024 / 1024,
+            'mapped': mapped,
+            'stages': stages,
+            }
+
+
+def runBenchmarks(formats, sizes, generator=None, repeat=3, mapped=False,
+                  log=None):
+    """
+    runs the benchmarks of every format for every size; returns the
+    results together with what they were measured on
+    """
+    if generator is None:
+        generator = CorpusGenerator()
+    results = []
+    for format in formats:
+        for count in sizes:
+            result = runBenchmark(format, count, generator, repeat, mapped)
+            if log is not None:
+                log.write('%(format)-8s %(entries)8d entries %(seconds)9.3fs '
+                          '%(entries_per_second)10.0f entries/s\n' % result)
+            results.append(result)
+    return {'version': VERSION,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'corpus': {'seed': generator.seed,
+                       'authors': generator.authors,
+                       'abstract_words': generator.abstract_words,
+                       'special_density': generator.special_density,
+                       'macros': generator.macros,
+                       },
+            'repeat': repeat,
+            'mapped': mapped,
+            'results': results,
+            }
+
+
+def writeResults(report, path):
+    """
+    writes a report of runBenchmarks as JSON or, if 'path' ends with
+    '.csv', as a table with a row per format and size
+    """
+    f = open(path, 'wb')
+    try:
+        if os.path.splitext(path)[1].lower() == '.csv':
+            stages = sorted(set([name for result in report['results']
+                                 for name in result['stages']]))
+            writer = csv.writer(f)
+            writer.writerow(list(columns) + stages)
+            for result in report['results']:
+                writer.writerow([result[name] for name in columns] +
+                                [result['stages'].get(name, '')
+                                 for name in stages])
+        else:
+            json.dump(report, f, indent=2, sort_keys=True)
+    finally:
+        f.close()
+
+
+def main(argv=None):
+    """
+    runs the benchmarks from the command line, see --help
+    """
+    options = OptionParser(usage='%prog [options] [output.json|output.csv]')
+    options.add_option('-f', '--formats', default=','.join(sorted(formats)),
+                       help='comma separated formats [%default]')
+    options.add_option('-s', '--sizes', default='1000,10000',
+                       help='comma separated numbers of entries [%default]')
+    options.add_option('-r', '--repeat', type='int', default=3,
+                       help='runs per benchmark, the best counts [%default]')
+    options.add_option('-m', '--mapped', action='store_true', default=False,
+                       help='parse memory mapped files, for large sizes')
+    options.add_option('--seed', type='int', default=0)
+    options.add_option('--authors', type='int', default=3,
+                       help='authors per entry [%default]')
+    options.add_option('--abstract-words', type='int', default=80)
+    options.add_option('--special-density', type='float', default=0.1,
+                       help='share of words with special characters '
+                            '(LaTeX in BibTeX) [%default]')
+    options.add_option('--macros', type='int', default=10,
+                       help='@String macros in BibTeX sources [%default]')
+    opts, args = options.parse_args(argv)
+    generator = CorpusGenerator(seed=opts.seed, authors=opts.authors,
+                                abstract_words=opts.abstract_words,
+                                special_density=opts.special_density,
+                                macros=opts.macros)
+    selected = [name.strip() for name in opts.formats.split(',')]
+    for name in selected:
+        if name not in formats:
+            options.error("unknown format '%s'" % name)
+    sizes = [int(size) for size in opts.sizes.split(',')]
+    report = runBenchmarks(selected, sizes, generator, opts.repeat,
+                           opts.mapped, log=sys.stderr)
+    if args:
+        writeResults(report, args[0])
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
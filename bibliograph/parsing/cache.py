@@ -0,0 +1,336 @@
+"""Caches of parse results"""
+
+# Python stuff
+import os
+import time
+import tempfile
+import threading
+import cPickle
+import logging
+from hashlib import sha1
+from collections import OrderedDict
+
+# Bibliography stuff
+from bibliograph.parsing.parsers.base import ParsedReference
+
+try:
+    import pkg_resources
+    VERSION = pkg_resources.get_distribution('bibliograph.parsing').version
+except Exception:
+    VERSION = 'unknown'
+
+log = logging.getLogger('bibliograph.parsing')
+
+
+def _parserKey(parser):
+    """
+    what the results of a parser depend on besides its input
+    """
+    klass = parser.__class__
+    return '%s.%s\n%s\n%s\n%s\n' % (klass.__module__, klass.__name__,
+                                     VERSION, parser.encoding,
+                                     bool(parser.compact))
+
+
+class ParseResultCache(object):
+    """
+    Caches the entries parsed from a source, keyed by a hash of the source
+    plus the parser's class, its 'encoding' and 'compact' settings and the
+    package version.
+
+    Results are kept pickled in a memory tier, a least recently used
+    mapping bounded by the number of items and their total size. If a
+    directory is given, results are also written there and looked up when
+    missing from memory; that tier is bounded by its total size. Items
+    older than 'max_age' seconds (if given) are dropped from both tiers.
+    A corrupt item (like a truncated file) counts as a miss and is dropped.
+
+    Results are stored as pickles, and unpickling can run arbitrary code:
+    the directory must not be writable by anyone less trusted than the
+    process using the cache.
+    """
+
+    def __init__(self, max_items=32, max_size=64 * 1024 * 1024,
+                 max_age=None, directory=None,
+                 max_disk_size=1024 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_size = max_size
+        self.max_age = max_age
+        self.directory = directory
+        self.max_disk_size = max_disk_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict() # key -> (timestamp, pickled entries)
+        self._size = 0
+        self._lock = threading.Lock()
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def makeKey(self, parser, source):
+        """
+        returns the cache key for parsing 'source' with 'parser'
+        """
+        if isinstance(source, unicode):
+            source = source.encode('utf-8')
+        digest = sha1(_parserKey(parser))
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        returns the cached entries for 'key' or None
+        """
+        data = self._getMemory(key)
+        from_disk = data is None and self.directory
+        if from_disk:
+            data = self._getDisk(key)
+        entries = None
+        if data is not None:
+            # unpickle every time so callers can't modify the cached entries
+            try:
+                entries = cPickle.loads(data)
+            except Exception:
+                log.warning('Dropping corrupt cache item %s', key)
+                self._drop(key)
+                data = None
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        if from_disk:
+            self._setMemory(key, data)
+        return entries
+
+    def set(self, key, entries):
+        """
+        stores the parsed entries under 'key'
+        """
+        data = cPickle.dumps(entries, cPickle.HIGHEST_PROTOCOL)
+        self._setMemory(key, data)
+        if self.directory:
+            self._setDisk(key, data)
+
+    def clear(self):
+        """
+        drops all cached items from memory and disk
+        """
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+        if self.directory:
+            for name in self._diskFiles():
+                self._remove(os.path.join(self.directory, name))
+
+    def _drop(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None:
+                self._size -= len(item[1])
+        if self.directory:
+            self._remove(os.path.join(self.directory, key + '.pickle'))
+
+    def _expired(self, timestamp):
+        return self.max_age is not None and \
+               time.time() - timestamp > self.max_age
+
+    def _getMemory(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is None:
+                return None
+            if self._expired(item[0]):
+                self._size -= len(item[1])
+                return None
+            # re-insert to mark it as most recently used
+            self._items[key] = item
+            return item[1]
+
+    def _setMemory(self, key, data):
+        if len(data) > self.max_size:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old[1])
+            self._items[key] = (time.time(), data)
+            self._size += len(data)
+            while len(self._items) > self.max_items or \
+                  self._size > self.max_size:
+                key, (timestamp, data) = self._items.popitem(last=False)
+                self._size -= len(data)
+
+    def _diskFiles(self):
+        return [name for name in os.listdir(self.directory)
+                if name.endswith('.pickle')]
+
+    def _getDisk(self, key):
+        path = os.path.join(self.directory, key + '.pickle')
+        try:
+            if self._expired(os.path.getmtime(path)):
+                self._remove(path)
+                return None
+            f = open(path, 'rb')
+            try:
+                return f.read()
+            finally:
+                f.close()
+        except (IOError, OSError):
+            return None
+
+    def _setDisk(self, key, data):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        os.rename(tmp, os.path.join(self.directory, key + '.pickle'))
+        self._pruneDisk()
+
+    def _pruneDisk(self):
+        files = []
+        total = 0
+        for name in self._diskFiles():
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self._expired(stat.st_mtime):
+                self._remove(path)
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        files.sort()
+        while files and total > self.max_disk_size:
+            mtime, size, path = files.pop(0)
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class EntryCache(object):
+    """
+    Memoizes parsed entries by a hash of their (split, unparsed) text plus
+    the parser's class and settings and the package version, so
+    re-importing a slightly changed source only parses the changed entries.
+
+    Keep one EntryCache per imported source. After each complete run
+    getChanges() reports the pids added, changed and removed compared with
+    the previous run as well as the pids used by several entries, and only
+    the entries of the latest run are kept.
+    If a 'path' is given the cache is loaded from and saved to that file,
+    so it survives between processes; a corrupt file is dropped and all
+    entries are parsed again. Like the directory of a ParseResultCache,
+    the file must not be writable by anyone less trusted than the process.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._results = {} # entry digest -> pickled parsed entry
+        self._pids = {}    # pid -> entry digests of the latest run
+        self._changes = {'added': [], 'changed': [], 'removed': [],
+                         'duplicates': []}
+        if path and os.path.exists(path):
+            self.load()
+
+    def getEntries(self, parser, source):
+        """
+        returns the list of entries parsed from 'source' by 'parser'
+        """
+        return list(self.iterEntries(parser, source))
+
+    def iterEntries(self, parser, source):
+        """
+        yields the entries parsed from 'source' by 'parser', reusing the
+        results of the previous run for unchanged entries
+        """
+        results = {}
+        pids = {}
+        hits = 0
+        key = _parserKey(parser)
+        for raw in parser.iterSource(source):
+            if isinstance(raw, unicode):
+                raw_bytes = raw.encode('utf-8')
+            else:
+                raw_bytes = raw
+            digest = sha1(key + raw_bytes).hexdigest()
+            data = results.get(digest) or self._results.get(digest)
+            if data is None:
+                entry = parser.processEntry(raw)
+                data = cPickle.dumps(entry, cPickle.HIGHEST_PROTOCOL)
+            else:
+                entry = cPickle.loads(data)
+                hits += 1
+            results[digest] = data
+            pid = self.getPid(entry)
+            if pid:
+                pids.setdefault(pid, []).append(digest)
+            yield entry
+
+        self._changes = {
+            'added': sorted(pid for pid in pids if pid not in self._pids),
+            'changed': sorted(pid for pid, digest in pids.items()
+                              if pid in self._pids
+                              and self._pids[pid] != digest),
+            'removed': sorted(pid for pid in self._pids if pid not in pids),
+            'duplicates': sorted(pid for pid, digests in pids.items()
+                                 if len(digests) > 1),
+            }
+        self._results = results
+        self._pids = pids
+        if parser.metrics is not None:
+            parser.metrics.recordCache('entry', hits=hits,
+                                       misses=len(results) - hits)
+        if self.path:
+            self.save()
+
+    def getPid(self, entry):
+        """
+        returns the identifier of a parsed entry (None for parse errors)
+        """
+        if isinstance(entry, (dict, ParsedReference)):
+            return entry.get('pid') or entry.get('pmid')
+        return None
+
+    def getChanges(self):
+        """
+        returns a dictionary listing the 'added', 'changed' and 'removed'
+        pids of the latest run compared with the one before, and the
+        'duplicates', pids of more than one entry of the latest run
+        """
+        return self._changes
+
+    def load(self):
+        """
+        reads the entries of the previous run from 'path'
+        """
+        f = open(self.path, 'rb')
+        try:
+            try:
+                self._results, self._pids = cPickle.load(f)
+            except Exception:
+                log.warning('Dropping corrupt entry cache %s', self.path)
+                self._results, self._pids = {}, {}
+                os.remove(self.path)
+        finally:
+            f.close()
+
+    def save(self):
+        """
+        writes the entries of the latest run to 'path'
+        """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        f = os.fdopen(fd, 'wb')
+        try:
+            cPickle.dump((self._results, self._pids), f,
+                         cPickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(tmp, self.path)
@@ -0,0 +1,162 @@
+"""Detection of duplicate references among parsed entries"""
+
+# Python stuff
+import re
+import unicodedata
+from hashlib import md5
+
+# Bibliography stuff
+from bibliograph.parsing.parsers.base import ParsedReference
+
+_non_words = re.compile(r'[\W_]+', re.U)
+_doi_prefix = re.compile(r'^(?:doi:\s*|https?://(?:dx\.)?doi\.org/)', re.I)
+_isbn_chars = re.compile(r'[^0-9X]')
+
+# the types of the parts of a volume, which share the ISBN of the volume
+part_types = ('InbookReference', 'IncollectionReference',
+              'InproceedingsReference', 'ConferenceReference')
+
+
+def normalizeText(value):
+    """
+    returns a lowercased text without accents, punctuation and repeated
+    white space, as unicode
+    """
+    if not isinstance(value, unicode):
+        value = value.decode('utf-8', 'replace')
+    try:
+        value.encode('ascii')
+    except UnicodeEncodeError:
+        value = unicodedata.normalize('NFKD', value)
+        value = u''.join([char for char in value
+                          if not unicodedata.combining(char)])
+    return _non_words.sub(u' ', value.lower()).strip()
+
+
+def normalizeDOI(value):
+    """
+    returns a DOI without a 'doi:' or resolver prefix, lowercased
+    """
+    return _doi_prefix.sub('', value.strip()).lower()
+
+
+def normalizeISBN(value):
+    """
+    returns an ISBN as 13 digits (ISBN-10 are converted); None if it is
+    no ISBN
+    """
+    value = _isbn_chars.sub('', value.upper())
+    if len(value) == 10:
+        value = '978' + value[:9]
+        total = sum([int(digit) * (i % 2 and 3 or 1)
+                     for i, digit in enumerate(value)])
+        value += str((10 - total % 10) % 10)
+    if len(value) != 13 or not value.isdigit():
+        return None
+    return value
+
+
+class DuplicateFinder(object):
+    """
+    Finds duplicate references among the entries returned by getEntries
+    (of any parser).
+
+    Every entry gets a few blocking keys: its DOI, ISBN and PubMed id and
+    a digest of its normalized title, the normalized last name of its
+    first author and its publication year. The ISBN of a part of a volume
+    (like a chapter) is that of the volume, so it is no key for the
+    part_types. Entries sharing any key end up in the same cluster, so no
+    pairs of entries are compared and the costs grow linearly with the
+    number of entries. Override getKeys to block differently.
+    """
+
+    def __init__(self, use_title=True, use_identifiers=True):
+        self.use_title = use_title
+        self.use_identifiers = use_identifiers
+
+    def getKeys(self, entry):
+        """
+        returns the blocking keys of a parsed entry
+        """
+        keys = []
+        if self.use_identifiers:
+            is_part = entry.get('reference_type') in part_types
+            identifiers = [(item.get('label', '').upper(), item.get('value'))
+                           for item in entry.get('identifiers') or []]
+            for field in ('doi', 'isbn', 'pmid'):
+                value = entry.get(field)
+                if value:
+                    identifiers.append((field.upper(), value))
+            for label, value in identifiers:
+                if not value:
+                    continue
+                if label == 'DOI':
+                    keys.append(('DOI', normalizeDOI(value)))
+                elif label == 'ISBN' and not is_part:
+                    value = normalizeISBN(value)
+                    if value:
+                        keys.append(('ISBN', value))
+                elif label == 'PMID':
+                    keys.append(('PMID', value.strip()))
+        if self.use_title:
+            title = normalizeText(entry.get('title') or '')
+            if title:
+                authors = entry.get('authors') or [{}]
+                lastname = normalizeText(authors[0].get('lastname') or '')
+                year = (entry.get('publication_year') or '').strip()
+                key = u'\n'.join((title, lastname, year)).encode('utf-8')
+                # a digest keeps the memory needed for long titles down
+                keys.append(('TITLE', md5(key).digest()))
+        return keys
+
+    def findClusters(self, entries):
+        """
+        returns the clusters of duplicates among 'entries' (a sequence or
+        an iterable) as lists of the positions of the entries, each with
+        at least two entries; parse errors are skipped
+        """
+        owners = {}  # blocking key -> position of the first entry
+        parents = [] # the union-find forest of the positions
+        for position, entry in enumerate(entries):
+            parents.append(position)
+            if not isinstance(entry, (dict, ParsedReference)):
+                continue
+            for key in self.getKeys(entry):
+                other = owners.setdefault(key, position)
+                if other != position:
+                    self._union(parents, other, position)
+
+        clusters = {}
+        for position in xrange(len(parents)):
+            root = self._find(parents, position)
+            if root != position:
+                clusters.setdefault(root, [root]).append(position)
+        result = clusters.values()
+        result.sort()
+        return result
+
+    def _find(self, parents, position):
+        root = position
+        while parents[root] != root:
+            root = parents[root]
+        # point the whole path to its root
+        while parents[position] != root:
+            parents[position], position = root, parents[position]
+        return root
+
+    def _union(self, parents, first, second):
+        first = self._find(parents, first)
+        second = self._find(parents, second)
+        # the smaller position is the root, so clusters start with it
+        if first < second:
+            parents[second] = first
+        elif second < first:
+            parents[first] = second
+
+
+def findDuplicates(entries):
+    """
+    returns the clusters of duplicates among parsed entries as found by
+    a DuplicateFinder with the default blocking keys
+    """
+    return DuplicateFinder().findClusters(entries)
@@ -0,0 +1,284 @@
+"""Parsing in the background"""
+
+# Python stuff
+import time
+import logging
+import threading
+import Queue
+
+log = logging.getLogger('bibliograph.parsing')
+
+# what a stream's queue holds after the last entry
+_end = object()
+
+
+class ParseJob(object):
+    """
+    a source waiting to be parsed by a ParseExecutor and, once done, its
+    entries or the error raised
+    """
+
+    def __init__(self, parser, source, timeout=None):
+        self.parser = parser
+        self.source = source
+        self.timeout = timeout
+        self.deadline = timeout is not None and time.time() + timeout or None
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def run(self):
+        """
+        parses the source one entry at a time, so a cancelled job stops
+        at the next entry instead of keeping its worker busy
+        """
+        entries = []
+        for entry in self.parser.iterEntries(self.source):
+            if self.cancelled:
+                return None
+            entries.append(entry)
+        return entries
+
+    def finish(self, result=None, error=None):
+        with self._lock:
+            if self.done.isSet():
+                return
+            self.result = result
+            self.error = error
+            self.done.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+        for callback in callbacks:
+            self._call(callback)
+
+    def addCallback(self, callback):
+        """
+        calls 'callback' with the job once it is done, right away if it is
+        done already; callbacks run in the thread finishing the job
+        """
+        with self._lock:
+            if not self.done.isSet():
+                self._callbacks.append(callback)
+                return
+        self._call(callback)
+
+    def _call(self, callback):
+        try:
+            callback(self)
+        except Exception:
+            log.exception('callback of a parse job failed')
+
+    def cancel(self, error=None):
+        """
+        drops the job unless it is done already; a job being parsed right
+        now is not interrupted, its result is thrown away
+        """
+        if self.done.isSet():
+            return False
+        self.cancelled = True
+        self.finish(error=error or RuntimeError('Parsing was cancelled'))
+        return True
+
+    def expired(self):
+        return self.deadline is not None and time.time() > self.deadline
+
+    def timedOut(self, timeout=None):
+        """
+        cancels the job because it took longer than 'timeout' (or its own
+        timeout) seconds; returns the error raised to its caller
+        """
+        if timeout is None:
+            timeout = self.timeout
+        error = RuntimeError('Parsing timed out after %s seconds' % timeout)
+        self.cancel(error)
+        return error
+
+    def getResult(self, timeout=None):
+        """
+        waits for the parsed entries and returns them, raises the error
+        of the parser instead if there was one; gives up after 'timeout'
+        seconds or at the job's deadline, whichever comes first, raising
+        a RuntimeError and cancelling the job
+        """
+        wait = timeout
+        if self.deadline is not None:
+            left = max(0, self.deadline - time.time())
+            if wait is None or left < wait:
+                wait = left
+                timeout = None
+        if not self.done.wait(wait):
+            self.timedOut(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class EntryStream(ParseJob):
+    """
+    A source parsed by a ParseExecutor one entry at a time. Iterating over
+    the stream yields the entries as the parser produces them; at most
+    'buffer' entries are parsed ahead of the consumer.
+    """
+
+    def __init__(self, parser, source, timeout=None, buffer=100):
+        ParseJob.__init__(self, parser, source, timeout)
+        self.entries = Queue.Queue(buffer)
+
+    def run(self):
+        try:
+            for entry in self.parser.iterEntries(self.source):
+                if not self._put(entry):
+                    return None
+        except Exception, e:
+            # raised to the consumer after the entries parsed before
+            self.error = e
+            self._put(_end)
+            raise
+        self._put(_end)
+        return None
+
+    def finish(self, result=None, error=None):
+        ParseJob.finish(self, result, error)
+        if self.cancelled:
+            # wake up a consumer waiting for the next entry
+            try:
+                self.entries.put_nowait(_end)
+            except Queue.Full:
+                pass
+
+    def _put(self, entry):
+        """
+        waits for room in the queue until the stream is cancelled
+        """
+        while not self.cancelled:
+            try:
+                self.entries.put(entry, True, 0.1)
+                return True
+            except Queue.Full:
+                if self.expired():
+                    self.timedOut()
+        return False
+
+    def __iter__(self):
+        finished = False
+        try:
+            while True:
+                wait = None
+                if self.deadline is not None:
+                    wait = max(0, self.deadline - time.time())
+                try:
+                    entry = self.entries.get(True, wait)
+                except Queue.Empty:
+                    raise self.timedOut()
+                if entry is _end:
+                    finished = True
+                    if self.error is not None:
+                        raise self.error
+                    return
+                yield entry
+        finally:
+            # a consumer leaving early must not keep the worker waiting
+            if not finished:
+                self.close()
+
+    def close(self):
+        """
+        stops parsing when the rest of the entries is not needed
+        """
+        self.cancel()
+
+
+class ParseExecutor(object):
+    """
+    Parses sources in a bounded pool of worker threads, so callers (like
+    an event loop) don't have to wait for them.
+
+    Jobs wait in a queue until one of 'workers' threads picks them up, so
+    no more than that many sources are parsed at the same time. A job not
+    done within its timeout ('timeout' unless given when submitting it) is
+    given up: its caller gets a RuntimeError, a job not started yet is
+    never parsed and a job being parsed stops at its next entry. Jobs are
+    parsed by iterEntries, so the result cache of a parser is not used.
+
+    Parsing is CPU bound and holds the interpreter lock: the threads keep
+    the callers responsive, they don't parse faster than a single thread.
+    Use getEntries with 'workers' to parse a large source on several CPUs.
+    """
+
+    def __init__(self, workers=4, timeout=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def getEntries(self, parser, source, timeout=None):
+        """
+        queues 'source' to be parsed by parser.getEntries; returns the
+        ParseJob
+        """
+        return self.submit(ParseJob(parser, source,
+                                    self._getTimeout(timeout)))
+
+    def iterEntries(self, parser, source, timeout=None, buffer=100):
+        """
+        queues 'source' to be parsed by parser.iterEntries; returns an
+        EntryStream to iterate over
+        """
+        return self.submit(EntryStream(parser, source,
+                                       self._getTimeout(timeout), buffer))
+
+    def submit(self, job):
+        self._startWorkers()
+        self.queue.put(job)
+        return job
+
+    def _getTimeout(self, timeout):
+        if timeout is None:
+            return self.timeout
+        return timeout
+
+    def _startWorkers(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work,
+                                          name='parser-%d' % len(self._threads))
+                thread.setDaemon(True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job.cancelled or job.done.isSet():
+                continue
+            if job.expired():
+                job.timedOut()
+                continue
+            try:
+                result = job.run()
+            except Exception, e:
+                job.finish(error=e)
+            else:
+                if not job.done.isSet():
+                    job.finish(result)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+def getExecutor():
+    """
+    returns the executor shared by the parsers of the process
+    """
+    global _default
+    if _default is None:
+        with _default_lock:
+            if _default is None:
+                _default = ParseExecutor()
+    return _default
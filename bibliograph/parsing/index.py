@@ -0,0 +1,260 @@
+"""Cite key index of BibTeX files"""
+
+# Python stuff
+import os
+import re
+import mmap
+import tempfile
+import cPickle
+from hashlib import sha1
+
+# Bibliography stuff
+from bibliograph.parsing.cache import VERSION
+from bibliograph.parsing.parsers.base import decodeText, _ascii_encodings
+from bibliograph.parsing.parsers.bibtex import BibtexParser, iterEntrySpans
+
+# the type and the cite key at the start of an entry
+_entry_head = re.compile(r'@\s*([A-Za-z]+)\s*[{(]\s*([^\s,{}()]*)')
+
+# entries without a cite key
+_special_types = ('string', 'preamble', 'comment')
+
+
+class CiteKeyIndex(object):
+    """
+    An index of the entries of a BibTeX file by their cite key (the
+    'pid' of the parsed entries), so single entries can be parsed without
+    parsing the whole file.
+
+    The index maps every cite key to the (offset, length, digest) of the
+    entries using it, in the order of the file. It is built in a single
+    pass over the memory mapped file, which also finds the duplicate cite
+    keys, and saved to 'index_path' (the file's path plus '.idx' by
+    default). A saved index is only used while the file still has the
+    size and modification time it was built for, and an entry whose text
+    doesn't match its digest anymore causes a rebuild as well. @String
+    definitions are indexed too, so macros are expanded in the entries
+    looked up.
+    """
+
+    def __init__(self, path, parser=None, index_path=None):
+        self.path = path
+        self.parser = parser or BibtexParser()
+        self.index_path = index_path or path + '.idx'
+        self._entries = {}  # cite key -> [(offset, length, digest), ...]
+        self._strings = []  # (offset, length) of the @String definitions
+        self._encoding = None
+        self._stamp = None
+        self._macros = None
+
+    def getStamp(self):
+        """
+        returns what identifies the current state of the indexed file
+        """
+        stat = os.stat(self.path)
+        return (stat.st_size, stat.st_mtime, VERSION)
+
+    def isCurrent(self):
+        """
+        is the index (in memory) up to date with the file?
+        """
+        return self._stamp is not None and self._stamp == self.getStamp()
+
+    def update(self):
+        """
+        makes sure the index is up to date, loading it from 'index_path'
+        or building it again if the file changed
+        """
+        if not self.isCurrent() and not self.load():
+            self.build()
+
+    def load(self):
+        """
+        loads the index saved at 'index_path'; returns False if there is
+        none or if it is out of date
+        """
+        try:
+            f = open(self.index_path, 'rb')
+        except IOError:
+            return False
+        try:
+            try:
+                data = cPickle.load(f)
+            except Exception:
+                return False
+        finally:
+            f.close()
+        if data.get('stamp') != self.getStamp():
+            return False
+        self._setData(data)
+        return True
+
+    def build(self):
+        """
+        scans the file once, indexes its entries and saves the index
+        """
+        stamp = self.getStamp()
+        entries = {}
+        strings = []
+        encoding = 'utf-8'
+        f = open(self.path, 'rb')
+        try:
+            if stamp[0]:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    encoding = self.parser.detectEncoding(buffer)
+                    if encoding not in _ascii_encodings:
+                        raise ValueError('%s: cannot index %s encoded files'
+                                         % (self.path, encoding))
+                    for start, end in iterEntrySpans(buffer):
+                        if end is None:
+                            end = len(buffer)
+                        text = buffer[start:end]
+                        match = _entry_head.match(text)
+                        if match is None:
+                            continue
+                        type = match.group(1).lower()
+                        if type == 'string':
+                            strings.append((start, end - start))
+                        elif type not in _special_types:
+                            key = self.getKey(match.group(2), encoding)
+                            entries.setdefault(key, []).append(
+                                (start, end - start, sha1(text).hexdigest()))
+                finally:
+                    buffer.close()
+        finally:
+            f.close()
+        data = {'stamp': stamp,
+                'encoding': encoding,
+                'entries': entries,
+                'strings': strings,
+                }
+        self._setData(data)
+        self.save(data)
+
+    def getKey(self, key, encoding):
+        """
+        returns a cite key as found in the file like the parsers' 'pid'
+        """
+        return decodeText(key, encoding).encode('utf-8')
+
+    def save(self, data):
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        f = os.fdopen(fd, 'wb')
+        try:
+            cPickle.dump(data, f, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(tmp, self.index_path)
+
+    def _setData(self, data):
+        self._stamp = data['stamp']
+        self._encoding = data['encoding']
+        self._entries = data['entries']
+        self._strings = data['strings']
+        self._macros = None
+
+    def keys(self):
+        """
+        returns the indexed cite keys
+        """
+        self.update()
+        return self._entries.keys()
+
+    def __contains__(self, pid):
+        self.update()
+        return self._normalize(pid) in self._entries
+
+    def __len__(self):
+        self.update()
+        return len(self._entries)
+
+    def lookup(self, pid):
+        """
+        returns the (offset, length, digest) of every entry with the cite
+        key 'pid', in the order of the file
+        """
+        self.update()
+        return list(self._entries.get(self._normalize(pid), []))
+
+    def getDuplicates(self):
+        """
+        returns a dictionary mapping the cite keys used by more than one
+        entry to the offsets of those entries
+        """
+        self.update()
+        return dict([(pid, [offset for offset, length, digest in spans])
+                     for pid, spans in self._entries.items()
+                     if len(spans) > 1])
+
+    def getEntry(self, pid):
+        """
+        returns the parsed entry with the cite key 'pid' (the first one
+        of duplicates) or None
+        """
+        entries = self.getEntries([pid])
+        if entries:
+            return entries[0]
+        return None
+
+    def getEntries(self, pids):
+        """
+        parses and returns the entries with the given cite keys in the
+        order asked for; all entries sharing a cite key are returned,
+        unknown cite keys are skipped
+        """
+        self.update()
+        try:
+            texts = self._readEntries(pids)
+        except ValueError:
+            # the file changed without its size or time changing
+            self.build()
+            texts = self._readEntries(pids)
+        parser = self.parser
+        macros = self._getMacros()
+        entries = []
+        for text in texts:
+            # the macros of the file are known to every entry
+            text = parser.preprocess(text, dict(macros))
+            for start, end in iterEntrySpans(text):
+                entries.append(parser.processEntry(text[start:end]))
+        return entries
+
+    def _normalize(self, pid):
+        if isinstance(pid, unicode):
+            return pid.encode('utf-8')
+        return pid
+
+    def _readEntries(self, pids):
+        spans = []
+        for pid in pids:
+            spans.extend(self._entries.get(self._normalize(pid), []))
+        texts = []
+        f = open(self.path, 'rb')
+        try:
+            for offset, length, digest in spans:
+                f.seek(offset)
+                text = f.read(length)
+                if sha1(text).hexdigest() != digest:
+                    raise ValueError('%s: entry at %d changed'
+                                     % (self.path, offset))
+                texts.append(decodeText(text, self._encoding))
+        finally:
+            f.close()
+        return texts
+
+    def _getMacros(self):
+        if self._macros is None:
+            macros = {}
+            if self._strings:
+                f = open(self.path, 'rb')
+                try:
+                    for offset, length in self._strings:
+                        f.seek(offset)
+                        text = decodeText(f.read(length), self._encoding)
+                        self.parser.expandStringMacros(text, macros)
+                finally:
+                    f.close()
+            self._macros = macros
+        return self._macros
@@ -53,11 +53,51 @@ class IBibliographyParser(Interface):
         returns true (1) if so and false (0) otherwise
         """
 
-    def getEntries(source):
+    def getEntries(source, workers=None, stats=None):
         """
         splits a (text) file with several entries
         parses the entries
         returns a list of the parsed entries
+        if 'workers' > 1 the entries are parsed by that many processes
+        if 'stats' is given the stages of parsing are timed there
+        """
+
+    def iterEntries(source, stats=None):
+        """
+        splits a (text) file or an open file object with several entries
+        parses the entries
+        yields the parsed entries one at a time
+        """
+
+    def getEntriesFromFile(path, stats=None):
+        """
+        parses the file at 'path' through a memory map, decoding one
+        run of entries at a time
+        returns a list of the parsed entries
+        """
+
+    def iterEntriesFromFile(path, stats=None):
+        """
+        same as getEntriesFromFile but yields the parsed entries one
+        at a time
+        """
+
+    def getEntryBatches(source, size=100):
+        """
+        same as iterEntries but yields lists of at most 'size'
+        parsed entries
+        """
+
+    def agetEntries(source, timeout=None):
+        """
+        parses the source in a background thread
+        returns a job whose getResult waits for the parsed entries
+        """
+
+    def aiterEntries(source, timeout=None, buffer=100):
+        """
+        same as agetEntries but returns a stream yielding the parsed
+        entries one at a time
         """
 
     def splitSource(source):
@@ -73,3 +113,27 @@ class IBibliographyParser(Interface):
         returns a dictionary to be passed to
         BibliographyEntry's edit method
         """
+
+
+class IFormatSniffer(Interface):
+    """ Detects the format of a bibliographic source
+    """
+
+    def detect(source):
+        """
+        returns (name, confidence) pairs of the registered parsers which
+        might parse the (text) source or open file object, the most
+        likely first; confidence is a number between 0 and 1
+        """
+
+    def getParser(source):
+        """
+        returns the parser most likely able to parse source or None
+        """
+
+    def sniff(source):
+        """
+        returns the parser most likely able to parse source (or None)
+        and the source to pass to it, which reads an open file object
+        from the beginning again
+        """
@@ -0,0 +1,264 @@
+"""Process wide metrics of the parsers"""
+
+# Python stuff
+import bisect
+import threading
+
+# Bibliography stuff
+from bibliograph.parsing.parsers.base import BibliographyParser
+
+# upper bounds (in seconds) of the latency histograms' buckets
+default_buckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0,
+                   30.0, 60.0)
+
+
+def _labelText(names, values):
+    if not names:
+        return ''
+    return '{%s}' % ','.join(['%s="%s"' % (name, _escape(value))
+                              for name, value in zip(names, values)])
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+                     .replace('\n', '\\n')
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """
+    a monotonically increasing count per combination of label values
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *values):
+        """
+        adds 'amount' to the count of the label values
+        """
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def get(self, *values):
+        with self._lock:
+            return self._values.get(values, 0)
+
+    def expose(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return ['%s%s %s' % (self.name, _labelText(self.labels, values),
+                             _number(value))
+                for values, value in items]
+
+
+class Histogram(object):
+    """
+    counts observations (like latencies) in cumulative buckets per
+    combination of label values, together with their sum
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=default_buckets):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *values):
+        """
+        adds an observation for the label values
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(values)
+            if data is None:
+                data = self._values[values] = [0] * (len(self.buckets) + 1) \
+                                              + [0.0, 0]
+            data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def get(self, *values):
+        """
+        returns the (sum, count) of the observations of the label values
+        """
+        with self._lock:
+            data = self._values.get(values)
+            if data is None:
+                return (0.0, 0)
+            return (data[-2], data[-1])
+
+    def expose(self):
+        with self._lock:
+            items = sorted([(values, list(data))
+                            for values, data in self._values.items()])
+        lines = []
+        labels = self.labels + ('le',)
+        for values, data in items:
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), data):
+                total += count
+                lines.append('%s_bucket%s %d' % (
+                    self.name, _labelText(labels, values + (_number(bound),)),
+                    total))
+            label_text = _labelText(self.labels, values)
+            lines.append('%s_sum%s %s' % (self.name, label_text,
+                                          _number(data[-2])))
+            lines.append('%s_count%s %d' % (self.name, label_text, data[-1]))
+        return lines
+
+
+class MetricsRegistry(object):
+    """
+    A thread safe collection of counters and histograms which can be
+    dumped in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, help, labels=()):
+        """
+        returns the counter 'name', registering it if needed
+        """
+        return self._register(Counter, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=default_buckets):
+        """
+        returns the histogram 'name', registering it if needed
+        """
+        return self._register(Histogram, name, help, labels, buckets)
+
+    def _register(self, klass, name, *args):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = klass(name, *args)
+            elif not isinstance(metric, klass):
+                raise ValueError("'%s' is registered as a %s already"
+                                 % (name, metric.type))
+            return metric
+
+    def get(self, name):
+        """
+        returns the metric 'name' or None
+        """
+        with self._lock:
+            return self._metrics.get(name)
+
+    def clear(self):
+        """
+        forgets all metrics
+        """
+        with self._lock:
+            self._metrics.clear()
+
+    def expose(self):
+        """
+        returns all metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        lines = []
+        for name, metric in metrics:
+            lines.append('# HELP %s %s' % (name, metric.help))
+            lines.append('# TYPE %s %s' % (name, metric.type))
+            lines.extend(metric.expose())
+        return ''.join([line + '\n' for line in lines])
+
+
+# the registry of the process
+registry = MetricsRegistry()
+
+
+class ParserMetrics(object):
+    """
+    Records what the parsers do in a MetricsRegistry: entries parsed,
+    sizes of their texts, failures (error strings and EntryParseErrors
+    returned as well as exceptions raised), the time spent parsing a
+    source, bibutils transformations and cache lookups. The parsers
+    report once per source, not once per entry.
+    """
+
+    def __init__(self, registry=registry):
+        self.registry = registry
+        self.entries = registry.counter(
+            'bibliograph_parser_entries_total',
+            'Entries parsed.', ('parser',))
+        self.bytes = registry.counter(
+            'bibliograph_parser_bytes_total',
+            'Size of the entry texts parsed (characters once decoded).',
+            ('parser',))
+        self.failures = registry.counter(
+            'bibliograph_parser_failures_total',
+            'Entries which could not be parsed.', ('parser',))
+        self.seconds = registry.histogram(
+            'bibliograph_parser_seconds',
+            'Seconds spent splitting and parsing a source.', ('parser',))
+        self.transforms = registry.histogram(
+            'bibliograph_transform_seconds',
+            'Seconds taken by bibutils transformations.',
+            ('source', 'target'))
+        self.transform_failures = registry.counter(
+            'bibliograph_transform_failures_total',
+            'Failed or timed out bibutils transformations.',
+            ('source', 'target'))
+        self.cache = registry.counter(
+            'bibliograph_cache_lookups_total',
+            'Lookups of parse results by cache and result.',
+            ('cache', 'result'))
+
+    def getName(self, parser):
+        """
+        returns the label of a parser
+        """
+        return getattr(parser, 'id', None) or parser.__class__.__name__
+
+    def recordParse(self, parser, entries, failures, size, seconds):
+        name = self.getName(parser)
+        self.entries.inc(entries, name)
+        self.bytes.inc(size, name)
+        if failures:
+            self.failures.inc(failures, name)
+        self.seconds.observe(seconds, name)
+
+    def recordTransform(self, source_format, target_format, seconds,
+                        failed=False):
+        self.transforms.observe(seconds, source_format, target_format)
+        if failed:
+            self.transform_failures.inc(1, source_format, target_format)
+
+    def recordCache(self, cache, hits=0, misses=0):
+        if hits:
+            self.cache.inc(hits, cache, 'hit')
+        if misses:
+            self.cache.inc(misses, cache, 'miss')
+
+
+def enableMetrics(registry=registry):
+    """
+    makes all parsers and the pooled transform utility of the process
+    record their metrics in 'registry'; returns the ParserMetrics
+    """
+    metrics = BibliographyParser.metrics = ParserMetrics(registry)
+    return metrics
+
+def disableMetrics():
+    """
+    stops recording metrics
+    """
+    BibliographyParser.metrics = None
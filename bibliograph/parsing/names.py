@@ -0,0 +1,63 @@
+"""Memoized parsing of author names shared by the parsers"""
+
+# str and unicode are kept apart since equal ASCII strings of both types
+# are the same dictionary key
+_components = {}
+_unicode_components = {}
+_max_components = 100000
+
+def internComponent(component):
+    """
+    returns a shared copy of a name component (works for str and unicode)
+    """
+    if isinstance(component, unicode):
+        components = _unicode_components
+    else:
+        components = _components
+    shared = components.get(component)
+    if shared is None:
+        if len(components) >= _max_components:
+            components.clear()
+        shared = components.setdefault(component, component)
+    return shared
+
+
+class NameMemo(object):
+    """
+    A bounded memo mapping raw author strings to their parsed
+    (firstname, middlename, lastname) tuple.
+
+    Repeated authors only cost a dictionary lookup and all their names
+    share the same interned components. The memo is simply emptied when
+    it reaches 'max_size' entries.
+    """
+
+    def __init__(self, max_size=50000):
+        self.max_size = max_size
+        self._names = {}
+        self._unicode_names = {} # see internComponent
+
+    def getName(self, raw, parse):
+        """
+        returns a new author dictionary for 'raw'; 'parse' is called with
+        'raw' to split it into (firstname, middlename, lastname) unless
+        the result is already known
+        """
+        if isinstance(raw, unicode):
+            names = self._unicode_names
+        else:
+            names = self._names
+        name = names.get(raw)
+        if name is None:
+            name = tuple([internComponent(part) for part in parse(raw)])
+            if len(names) >= self.max_size:
+                names.clear()
+            names[raw] = name
+        # a fresh dictionary each time since callers may add to it
+        return {'firstname': name[0],
+                'middlename': name[1],
+                'lastname': name[2]}
+
+    def clear(self):
+        self._names.clear()
+        self._unicode_names.clear()
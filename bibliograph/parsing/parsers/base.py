@@ -8,14 +8,37 @@
 """BibliographyParser main class"""
 
 # Python stuff
+import os
 import re
+import mmap
+import time
+import codecs
+from multiprocessing import Pool
 
 # Zope stuff
+from zope.component import getUtility, queryUtility
 from zope.interface import implements
 
 from bibliograph.parsing.interfaces import IBibliographyParser
+from bibliograph.rendering.interfaces import IBibTransformUtility
 from bibliograph.core.bibutils import _getCommand
 
+from bibliograph.parsing.names import NameMemo, internComponent
+from bibliograph.parsing.stats import _size
+from bibliograph.parsing.executor import getExecutor
+
+# byte order marks and the encodings they stand for (longest first)
+_boms = ((codecs.BOM_UTF32_LE, 'utf-32'),
+         (codecs.BOM_UTF32_BE, 'utf-32'),
+         (codecs.BOM_UTF8, 'utf-8-sig'),
+         (codecs.BOM_UTF16_LE, 'utf-16'),
+         (codecs.BOM_UTF16_BE, 'utf-16'),
+         )
+_utf8_decoder = codecs.getincrementaldecoder('utf-8')
+
+# encodings whose bytes can be split at ASCII characters like '@' and '\n'
+_ascii_encodings = ('utf-8', 'utf-8-sig', 'iso-8859-15')
+
 
 class BibliographyParser(object):
     """
@@ -30,6 +53,17 @@ class BibliographyParser(object):
 
     delimiter = "\n\n"       # used to split a text into a list of entries
     pattern = r'(^.{0,4}- )' # the Medline pattern as default
+    cache = None             # optional ParseResultCache used by getEntries
+    compact = False          # return ParsedReference instead of dicts
+    stats = None             # optional ParseStats timing the stages
+    metrics = None           # ParserMetrics, see metrics.enableMetrics
+    sampler = None           # optional SlowEntrySampler
+    executor = None          # ParseExecutor of agetEntries, a shared one if None
+    encoding = 'utf-8'       # of the parsed entries' strings, None: unicode
+    sample_size = 65536      # bytes looked at to detect a source's encoding
+    chunk_size = 65536       # bytes decoded at once from a mapped file
+    record_start = None      # pattern matching where the records of a
+                             # mapped file start, see iterRecordSpans
 
     def __init__(self):
         """
@@ -37,6 +71,18 @@ class BibliographyParser(object):
         """
         self.format = BibliographyParser.format
 
+    def __getstate__(self):
+        """ the cache, the stats, the metrics, the sampler and the executor
+        stay behind when a parser is sent to a worker process
+        """
+        state = self.__dict__.copy()
+        state.pop('cache', None)
+        state.pop('stats', None)
+        state.pop('metrics', None)
+        state.pop('sampler', None)
+        state.pop('executor', None)
+        return state
+
     def isAvailable(self):
         """ by default parser is available, override in specific parser's code
             if there are some hurdles to take before parsing is possible
@@ -125,25 +171,746 @@ class BibliographyParser(object):
         """
         pass  # needs to be overwriten by the individual parser
 
-    def getEntries(self, source):
+    def processEntry(self, entry):
+        """
+        turns an entry yielded by iterSource into what getEntries returns
+        """
+        return self.compactEntry(self.encodeEntry(self.parseEntry(entry)))
+
+    def processEntries(self, entries, raw=False):
+        """
+        yields the processed entries of an iterable of (unparsed) entries;
+        with 'stats' set the time spent getting the next entry is added to
+        the 'splitSource' stage and the time processing it to 'parseEntry',
+        with 'metrics' set the entries and failures are counted and with
+        'sampler' set the time of every entry is passed to it
+
+        if 'raw' is set the iterable yields the (offset, raw text, entry)
+        triples of iterRawEntries and the sampler gets the raw records
+        """
+        stats = self.stats
+        metrics = self.metrics
+        sampler = self.sampler
+        if stats is None and metrics is None and sampler is None:
+            for entry in entries:
+                yield self.processEntry(entry)
+            return
+        split = parse = 0.0
+        count = size = failures = 0
+        entries = iter(entries)
+        try:
+            while True:
+                started = time.time()
+                try:
+                    entry = entries.next()
+                except StopIteration:
+                    break
+                if raw:
+                    offset, text, entry = entry
+                else:
+                    offset, text = None, entry
+                split_done = time.time()
+                try:
+                    result = self.processEntry(entry)
+                except Exception:
+                    failures += 1
+                    raise
+                seconds = time.time() - split_done
+                if sampler is not None:
+                    sampler.add(seconds, text, count, offset)
+                parse += seconds
+                split += split_done - started
+                count += 1
+                size += _size(entry)
+                if isinstance(result, (basestring, EntryParseError)):
+                    failures += 1
+                yield result
+        finally:
+            if stats is not None:
+                stats.add('splitSource', split, bytes_out=size, entries=count)
+                stats.add('parseEntry', parse, bytes_in=size, entries=count)
+            if metrics is not None:
+                metrics.recordParse(self, count, failures, size,
+                                    split + parse)
+
+    def measure(self, stage, function, source, *args):
+        """
+        returns function(source, *args), timed as 'stage' if 'stats' is set
+        """
+        if self.stats is None:
+            return function(source, *args)
+        return self.stats.measure(stage, function, source, *args)
+
+    def encodeEntry(self, entry):
+        """
+        encodes the unicode strings of a parsed entry to 'encoding'
+        unless that is None
+        """
+        if self.encoding is None or not isinstance(entry, dict):
+            return entry
+        return _encodeValue(entry, self.encoding)
+
+    def compactEntry(self, entry):
+        """
+        turns a parsed entry into a ParsedReference (see its fromDict)
+        if 'compact' is set
+        """
+        if self.compact and isinstance(entry, dict):
+            return ParsedReference.fromDict(entry)
+        return entry
+
+    def getEntries(self, source, workers=None, stats=None):
         """
         splits a (text) file with several entries
         parses the entries
         returns a list of the parsed entries
+
+        if 'workers' is greater than one the entries are parsed in a pool
+        of that many processes; the result is the same as when parsing
+        them one after the other
+
+        if a cache is set, the entries parsed from a (text) source are
+        stored there and returned again when the same source is passed in
+
+        if 'stats' is given the stages of this call are added to that
+        ParseStats instead of the parser's own (see withStats)
+        """
+        if stats is not None:
+            return self.withStats(stats).getEntries(source, workers)
+        key = None
+        if self.cache is not None and isinstance(source, basestring):
+            key = self.cache.makeKey(self, source)
+            entries = self.cache.get(key)
+            if self.metrics is not None:
+                self.metrics.recordCache('result', hits=int(entries is not None),
+                                         misses=int(entries is None))
+            if entries is not None:
+                return entries
+
+        started = time.time()
+        if not workers or workers < 2:
+            entries = list(self.iterEntries(source))
+        else:
+            entries = self.parseEntriesInParallel(source, workers)
+        if self.stats is not None:
+            self.stats.add('getEntries', time.time() - started,
+                           bytes_in=_size(source), entries=len(entries))
+
+        if key is not None:
+            self.cache.set(key, entries)
+        return entries
+
+    def parseEntriesInParallel(self, source, workers):
+        """
+        splits the source and parses the entries in a pool of 'workers'
+        processes, returns the parsed entries in the order of the source
+        """
+        timed = self.sampler is not None
+        if timed:
+            records = list(self.iterRawEntries(source))
+            entries = [entry for offset, text, entry in records]
+        else:
+            entries = list(self.iterSource(source))
+        # a few chunks per worker to even out entries of different size
+        size = max(1, len(entries) // (workers * 4))
+        chunks = [(self, entries[i:i+size], timed)
+                  for i in range(0, len(entries), size)]
+        if len(chunks) < 2:
+            if timed:
+                return list(self.processEntries(records, raw=True))
+            return list(self.processEntries(entries))
+
+        started = time.time()
+        pool = Pool(min(workers, len(chunks)))
+        try:
+            results = pool.map(_parseEntries, chunks)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        if self.stats is not None:
+            # the wall time of all workers together
+            self.stats.add('parseEntry', time.time() - started,
+                           entries=len(entries))
+        results = [entry for chunk in results for entry in chunk]
+        if timed:
+            for position, ((offset, text, entry), (result, seconds)) in \
+                    enumerate(zip(records, results)):
+                self.sampler.add(seconds, text, position, offset)
+            results = [result for result, seconds in results]
+        if self.metrics is not None:
+            failures = len([entry for entry in results
+                            if isinstance(entry, (basestring,
+                                                  EntryParseError))])
+            self.metrics.recordParse(self, len(entries), failures,
+                                     sum([_size(entry) for entry in entries]),
+                                     time.time() - started)
+        return results
+
+    def iterEntries(self, source, stats=None):
+        """
+        splits a (text) file or an open file object with several entries
+        yields the parsed entries one at a time
+        """
+        parser = self.withStats(stats)
+        if parser.sampler is not None:
+            entries = parser.processEntries(parser.iterRawEntries(source),
+                                            raw=True)
+        else:
+            entries = parser.processEntries(parser.iterSource(source))
+        for entry in entries:
+            yield entry
+
+    def withStats(self, stats):
+        """
+        returns a (shallow) copy of the parser collecting the stages of
+        its calls in 'stats', or the parser itself if 'stats' is None;
+        parsers are shared utilities, a copy keeps the stats of a single
+        call (like a request being traced) apart from those of others
+        """
+        if stats is None:
+            return self
+        parser = self.__class__.__new__(self.__class__)
+        parser.__dict__.update(self.__dict__)
+        parser.stats = stats
+        return parser
+
+    def getEntriesFromFile(self, path, stats=None):
+        """
+        parses the file at 'path' without reading it into a string first;
+        returns a list of the parsed entries
+        """
+        return list(self.iterEntriesFromFile(path, stats))
+
+    def iterEntriesFromFile(self, path, stats=None):
+        """
+        memory maps the file at 'path' and yields its parsed entries one
+        at a time; only the bytes of the entries currently being parsed
+        are decoded
+        """
+        parser = self.withStats(stats)
+        fileobj = open(path, 'rb')
+        try:
+            if not os.fstat(fileobj.fileno()).st_size:
+                # empty files can't be mapped
+                return
+            buffer = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if parser.sampler is not None:
+                    entries = parser.processEntries(
+                        parser.iterRawEntries(buffer), raw=True)
+                else:
+                    entries = parser.processEntries(
+                        parser.iterMappedSource(buffer))
+                for entry in entries:
+                    yield entry
+            finally:
+                buffer.close()
+        finally:
+            fileobj.close()
+
+    def iterMappedSource(self, buffer):
+        """
+        yields the single (unparsed) entries of a memory mapped file by
+        splitting the decoded spans of iterMappedText
+        """
+        for text in self.iterMappedText(buffer):
+            for entry in self.iterSource(text):
+                yield entry
+
+    def iterMappedText(self, buffer):
+        """
+        yields the spans of a memory mapped file found by iterSpans,
+        decoding the bytes of one span at a time
+        """
+        encoding = self.detectEncoding(buffer)
+        if encoding in _ascii_encodings:
+            spans = self.iterSpans(buffer)
+        else:
+            # the spans can only be looked for in ASCII compatible bytes
+            spans = [(0, len(buffer))]
+        for start, end in spans:
+            yield decodeText(buffer[start:end], encoding)
+
+    def iterSpans(self, buffer):
+        """
+        yields the (start, end) offsets of runs of whole records of a
+        (byte) buffer, each of at most 'chunk_size' bytes unless a single
+        record is larger
+        """
+        first = last = None
+        for start, end in self.iterRecordSpans(buffer):
+            if first is not None and end - first > self.chunk_size:
+                yield first, last
+                first = None
+            if first is None:
+                first = start
+            last = end
+        if first is not None:
+            yield first, last
+
+    def iterRecordSpans(self, buffer):
+        """
+        yields the (start, end) offsets of the records of a (byte)
+        buffer, each record starting where 'record_start' matches;
+        without a pattern the whole buffer is a single record
+        """
+        if self.record_start is None:
+            yield 0, len(buffer)
+            return
+        start = 0
+        for match in self.record_start.finditer(buffer):
+            if match.start() > start:
+                yield start, match.start()
+            start = match.start()
+        if start < len(buffer):
+            yield start, len(buffer)
+
+    def iterRawEntries(self, source):
+        """
+        yields the (offset, raw text, entry) of every entry of a source,
+        the raw text being the record found by iterRecordSpans at that
+        offset of the source (in bytes, or in characters for unicode and
+        sources in an encoding not compatible with ASCII) and the entry
+        what iterSource yields for it; the records are split one by one
+        so a 'sampler' can point at the records making a source slow
         """
-        source = self.checkEncoding(source)
-        return [self.parseEntry(entry) \
-                for entry in self.splitSource(source)]
+        if hasattr(source, 'read') and not isinstance(source, mmap.mmap):
+            source = source.read()
+        encoding = None
+        if not isinstance(source, unicode):
+            encoding = self.detectEncoding(source)
+            if encoding not in _ascii_encodings:
+                source = self.decodeSource(source)
+                encoding = None
+        state = {}
+        for start, end in self.iterRecordSpans(source):
+            text = source[start:end]
+            if encoding is None:
+                record = text
+            else:
+                record = decodeText(text, encoding)
+            for entry in self.iterRecordEntries(record, state):
+                yield start, text, entry
+
+    def iterRecordEntries(self, record, state):
+        """
+        yields the (unparsed) entries of the (decoded) text of a single
+        record; 'state' is shared by the records of a source
+        """
+        return self.iterSource(record)
+
+    def getEntryBatches(self, source, size=100):
+        """
+        like iterEntries but yields lists of at most 'size' parsed entries
+        """
+        batch = []
+        for entry in self.iterEntries(source):
+            batch.append(entry)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def agetEntries(self, source, timeout=None):
+        """
+        queues a source to be parsed by getEntries in a thread of the
+        executor; returns a ParseJob to wait for or add a callback to
+        """
+        return self._getExecutor().getEntries(self, source, timeout)
+
+    def aiterEntries(self, source, timeout=None, buffer=100):
+        """
+        queues a source to be parsed by iterEntries in a thread of the
+        executor; returns an EntryStream yielding the parsed entries
+        """
+        return self._getExecutor().iterEntries(self, source, timeout, buffer)
+
+    def _getExecutor(self):
+        if self.executor is None:
+            return getExecutor()
+        return self.executor
+
+    def iterSource(self, source):
+        """
+        yields the single (unparsed) entries of a (text) file or an open
+        file object; parsers able to split their input lazily override this
+        """
+        if hasattr(source, 'read'):
+            source = source.read()
+        source = self.decodeSource(source)
+        return iter(self.splitSource(source))
 
     def checkEncoding(self, source):
         """
         Make sure we have utf encoded text
         """
+        return self.decodeSource(source).encode('utf-8')
+
+    def detectEncoding(self, source):
+        """
+        guesses the encoding of a (byte) source from its byte order mark
+        or else from its first 'sample_size' bytes: UTF-8 if they decode
+        as such, ISO-8859-15 otherwise
+        """
+        sample = source[:self.sample_size]
+        for bom, encoding in _boms:
+            if sample.startswith(bom):
+                return encoding
+        if len(source) > self.sample_size:
+            try:
+                # a character cut off at the end of the sample is no error
+                _utf8_decoder().decode(sample, False)
+            except UnicodeDecodeError:
+                return 'iso-8859-15'
+        return 'utf-8'
+
+    def decodeSource(self, source):
+        """
+        returns a source as unicode, decoding it a single time
+        """
+        if isinstance(source, unicode):
+            return source
+        if self.stats is not None:
+            return self.stats.measure('decodeSource', self._decodeSource,
+                                      source)
+        return self._decodeSource(source)
+
+    def _decodeSource(self, source):
+        return decodeText(source, self.detectEncoding(source))
+
+
+class BibtexFieldsMixin(object):
+    """
+    completes the BibTeX fields parsed from an entry by the parsers of
+    BibTeX and of the formats read into BibTeX fields (RIS, EndNote, MODS)
+    """
+
+    author_names = NameMemo() # shared by all instances
+
+    def completeEntry(self, result, type):
+        """
+        adds the authors, the publication_* fields and the identifiers
+        to the fields parsed from an entry of bibtex 'type'
+        """
+        authorlist = []
+        authorURLlist = []
+
+        # compile authors list of dictionaries
+        # we can have authors
+        if result.has_key('author'):
+            for each in result['author']:
+                each = each.replace(' AND', ' and')
+                authorlist.extend( each.split(' and') )
+        # but for some bibref types we can have editors alternatively
+        elif result.has_key('editor') and (type in ['book','proceedings']):
+            result['editor_flag'] = True
+            for each in result['editor']:
+                each = each.replace(' AND', ' and')
+                authorlist.extend( each.split(' and') )
+        if result.has_key('authorURLs'):
+            authorURLlist = result['authorURLs'].split('and ')
+
+        if authorlist:
+            alist = []
+            authorlist = [x for x in authorlist if x]
+            for author in authorlist:
+                alist.append(self.author_names.getName(author, self.splitName))
+
+        if authorURLlist and alist:
+            index = 0
+            for url in authorURLlist:
+                alist[index]['homepage'] = url.strip()
+                index += 1
+
+        if authorlist:
+            result['authors'] = alist
+
+        # do some renaming and reformatting
+        tmp = result.get('note')
+        while tmp and tmp[-1] in ['}', ',', '\n', '\r']:
+            tmp = tmp[:-1]
+        if tmp:
+            result['note'] = tmp
+        result['publication_year'] = result.get('year', '')
+        result['publication_month'] = result.get('month', '')
+        result['publication_url'] = result.get('url', '')
+        ## result['publication_title'] = result.get('title', '')
+        tmp = result.get('title','')
+        for car in ('\n', '\r', '\t'):
+            tmp = tmp.replace(car, ' ')
+        while '  ' in tmp:
+            tmp = tmp.replace('  ', ' ')
+        result['title'] = tmp
+
+        # collect identifiers
+        identifiers = list()
+        for key in ('isbn', 'doi', 'asin', 'purl', 'urn', 'issn'):
+            if key in result:
+                identifiers.append({'label' : key.upper(), 'value': result[key]})
+        if identifiers:
+            result['identifiers'] = identifiers
+
+        return result
+
+    def splitName(self, author):
+        """
+        returns the (firstname, middlename, lastname) of an author
+        """
+        fname = mname = lname = ''
+        parts = self.splitAuthor(author)
+        if len(parts) == 1:
+            lname = parts[0].strip()
+        else:
+            lname = parts[-1].strip()
+            fname = parts[0].strip()
+            if parts[1:-1]:
+                mname = ' '.join([_ for _ in parts[1:-1]])
+        return fname, mname, lname
+
+    def splitAuthor(self, author=None):
+        if not author: 
+            return []
+        #parts = author.replace('.', ' ').split(',',1)
+        parts = author.split(',',1)
+        if len(parts) == 1: 
+            return parts[0].split()
+        else:
+            tmp = parts[1].split()
+            tmp.append(parts[0])
+            return tmp
+
+
+def decodeText(text, encoding):
+    """
+    decodes a (byte) text with the encoding detectEncoding guessed for
+    the source it is part of
+    """
+    try:
+        return text.decode(encoding)
+    except UnicodeDecodeError:
+        if encoding != 'utf-8':
+            raise
+        # only the part after the sample isn't UTF-8
+        return text.decode('iso-8859-15')
+
+
+def stripBOM(line):
+    """
+    removes a UTF-8 byte order mark from the first line of a source
+    """
+    if isinstance(line, unicode):
+        return line.lstrip(u'\ufeff')
+    if line.startswith(codecs.BOM_UTF8):
+        return line[len(codecs.BOM_UTF8):]
+    return line
+
+
+def _parseEntries(chunk):
+    """
+    parses a chunk of entries inside a worker process of getEntries
+    """
+    parser, entries, timed = chunk
+    if not timed:
+        return [parser.processEntry(entry) for entry in entries]
+    results = []
+    for entry in entries:
+        started = time.time()
+        result = parser.processEntry(entry)
+        results.append((result, time.time() - started))
+    return results
+
+
+def _encodeValue(value, encoding, intern=False):
+    """
+    encodes the unicode strings in a parsed entry (also in its lists and
+    dictionaries); the strings of nested dictionaries like the authors
+    are interned
+    """
+    if isinstance(value, unicode):
+        value = value.encode(encoding)
+        if intern:
+            value = internComponent(value)
+        return value
+    if isinstance(value, dict):
+        return dict([(_encodeValue(k, encoding), _encodeValue(v, encoding,
+                                                              intern))
+                     for k, v in value.items()])
+    if isinstance(value, list):
+        return [_encodeValue(item, encoding, True) for item in value]
+    return value
+
+
+class ParsedReference(object):
+    """A compact, mapping-like alternative to the dictionaries returned by
+    the parsers.
+
+    Upper-cased aliases of fields (like 'DOI' for 'doi') and the
+    'publication_year', 'publication_month' and 'publication_url' copies
+    of 'year', 'month' and 'url' are not stored but resolved on lookup,
+    as are other case variants of the stored field names. The field names
+    of all references with the same layout are shared, so every instance
+    only holds a tuple of values. Once '_max_layouts' layouts exist,
+    fromDict returns entries of new layouts as plain dictionaries.
+    """
+
+    __slots__ = ('_layout', '_values')
+
+    _derived = {'publication_year': 'year',
+                'publication_month': 'month',
+                'publication_url': 'url',
+                }
+    _layouts = {}
+    _max_layouts = 1000
+
+    def __init__(self, layout, values):
+        self._layout = layout
+        self._values = values
+
+    def fromDict(cls, data):
+        """
+        builds a ParsedReference holding the same items as 'data', or
+        a dictionary if no more layouts can be shared
+        """
+        signature = cls._getSignature(data)
+        layout = cls._getLayout(*signature)
+        if layout is None:
+            return dict(data)
+        return cls(layout, tuple([data[key] for key in signature[0]]))
+    fromDict = classmethod(fromDict)
+
+    def _getSignature(cls, data):
+        """
+        returns the stored, aliased and derived keys of 'data'
+        """
+        stored = []
+        aliased = []
+        derived = []
+        for key, value in data.items():
+            lower = key.lower()
+            if key != lower and lower in data and data[lower] == value:
+                aliased.append(key)
+            elif key in cls._derived and \
+                    data.get(cls._derived[key], '') == value:
+                derived.append(key)
+            else:
+                stored.append(key)
+        stored.sort()
+        return (tuple(stored), tuple(sorted(aliased)), tuple(sorted(derived)))
+    _getSignature = classmethod(_getSignature)
+
+    def _getLayout(cls, stored, aliased, derived):
+        """
+        returns the shared layout of the keys, None if there are too many
+        """
+        signature = (stored, aliased, derived)
+        layout = cls._layouts.get(signature)
+        if layout is None:
+            if len(cls._layouts) >= cls._max_layouts:
+                return None
+            layout = cls._layouts.setdefault(signature,
+                                             cls._makeLayout(*signature))
+        return layout
+    _getLayout = classmethod(_getLayout)
+
+    def _makeLayout(cls, stored, aliased, derived):
+        """
+        builds the keys and indexes of a layout
+        """
+        index = {}
+        for i, key in enumerate(stored):
+            index[key] = i
+        for key in aliased:
+            index[key] = index[key.lower()]
+        for key in derived:
+            # None stands for the empty default of a missing field
+            index[key] = index.get(cls._derived[key])
+        lower = {}
+        for key in index:
+            lower.setdefault(key.lower(), index[key])
+        return (stored + aliased + derived, index, lower)
+    _makeLayout = classmethod(_makeLayout)
+
+    def _index(self, key):
+        keys, index, lower = self._layout
+        try:
+            return index[key]
+        except KeyError:
+            return lower[key.lower()]
+
+    def __getitem__(self, key):
+        i = self._index(key)
+        if i is None:
+            return ''
+        return self._values[i]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except (KeyError, AttributeError):
+            return default
+
+    def __contains__(self, key):
         try:
-            source = unicode(source, 'utf-8')
-        except UnicodeDecodeError:
-            source = unicode(source, 'iso-8859-15')
-        return source.encode('utf-8')
+            self._index(key)
+        except (KeyError, AttributeError):
+            return False
+        return True
+
+    has_key = __contains__
+
+    __hash__ = None
+
+    def keys(self):
+        return list(self._layout[0])
+
+    def __iter__(self):
+        return iter(self._layout[0])
+
+    def __len__(self):
+        return len(self._layout[0])
+
+    def values(self):
+        return [self[key] for key in self._layout[0]]
+
+    def items(self):
+        return [(key, self[key]) for key in self._layout[0]]
+
+    def __setitem__(self, key, value):
+        data = dict(self.items())
+        data[key] = value
+        signature = self._getSignature(data)
+        # an instance needs a layout even if it can't be shared
+        self._layout = self._getLayout(*signature) or \
+                       self._makeLayout(*signature)
+        self._values = tuple([data[k] for k in signature[0]])
+
+    def __eq__(self, other):
+        if isinstance(other, (dict, ParsedReference)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __reduce__(self):
+        return (_parsedReference, (self.items(),))
+
+    def __repr__(self):
+        return '<ParsedReference %r>' % dict(self.items())
+
+
+def _parsedReference(items):
+    """
+    unpickles a ParsedReference, sharing the layout with other instances
+    """
+    return ParsedReference.fromDict(dict(items))
 
 
 class EntryParseError(object):
@@ -176,3 +943,13 @@ def isTransformable(source_format, target_format):
         return False
 
     return True
+
+def getTransformUtility():
+    """
+    returns the pooled transform utility if one is registered and the
+    "external" one of bibliograph.rendering otherwise
+    """
+    tool = queryUtility(IBibTransformUtility, name=u"pooled")
+    if tool is None:
+        tool = getUtility(IBibTransformUtility, name=u"external")
+    return tool
@@ -10,10 +10,11 @@
 import os
 import re
 
-from zope.component import getUtility, ComponentLookupError
+from zope.component import ComponentLookupError
 
 from bibliograph.parsing.parsers.base import BibliographyParser
-from bibliograph.rendering.interfaces import IBibTransformUtility
+from bibliograph.parsing.parsers.base import BibtexFieldsMixin
+from bibliograph.parsing.parsers.base import getTransformUtility
 
 from bibliograph.core.utils import _encode, _decode
 from bibliograph.core.bibutils import _hasCommands
@@ -25,7 +26,136 @@ _encoding = 'utf-8'   # XXX: should be taken from the site configuration
 haveBibUtils = _hasCommands('bib2xml')
 FIX_BIBTEX = os.environ.has_key('FIX_BIBTEX')
 
-class BibtexParser(BibliographyParser):
+_entry_chars = re.compile(r'[@{}()]')
+
+def iterEntrySpans(source):
+    """
+    scans a BibTeX source once and yields the (start, end) offsets of
+    every entry, i.e. from its '@' up to and including the brace or
+    parenthesis closing it, whichever of the two opened it after the
+    entry type. Braces preceded by a backslash are ignored, parentheses
+    inside braces as well, and anything between two entries is skipped.
+    An entry which is still open at the end of the source is yielded
+    with None as its end offset, so slicing still returns its text.
+    """
+    inside_entry = False
+    for match in _entry_chars.finditer(source):
+        idx = match.start()
+        char = match.group()
+
+        if not inside_entry:
+            if char == '@':
+                inside_entry = True
+                opener = None
+                braces_nesting_level = parens_nesting_level = 0
+                start = idx
+            continue
+
+        if char == '@' or (idx > 0 and source[idx-1] == '\\'):
+            continue
+
+        if opener is None:
+            # the first brace or parenthesis after the type opens the entry
+            if char in '{(':
+                opener = char
+                braces_nesting_level = int(char == '{')
+                parens_nesting_level = int(char == '(')
+            continue
+
+        if char == '{':
+            braces_nesting_level += 1
+        elif char == '}':
+            braces_nesting_level -= 1
+        elif opener == '(' and braces_nesting_level == 0:
+            if char == '(':
+                parens_nesting_level += 1
+            else:
+                parens_nesting_level -= 1
+        else:
+            continue
+
+        if opener == '{' and braces_nesting_level == 0 or \
+           opener == '(' and parens_nesting_level == 0:
+            inside_entry = False
+            yield start, idx + 1
+
+    if inside_entry:
+        yield start, None
+
+
+# a single part of a field value: a quoted string, a braced string
+# (nested one level deep at most), a number or a macro name
+_macro_token = re.compile(r'"[^"]*"|\{(?:[^{}]|\{[^{}]*\})*\}|[^\s,#{}"=()]+')
+_macro_expr = r'(?:%s)(?:\s*#\s*(?:%s))*' % (_macro_token.pattern,
+                                                 _macro_token.pattern)
+_string_definition = re.compile(
+    r'@string\s*[{(]\s*([^\s=#{}(),"]+)\s*=\s*(%s)\s*[})][ \t\r]*\n?'
+    % _macro_expr, re.I)
+_field_value = re.compile(r'(,\s*[\w\-]+\s*=\s*)(%s)' % _macro_expr)
+
+# the tags checkFormat looks for
+_format_tags = re.compile('^@[A-Z|a-z]*{', re.M)
+
+
+class LaTeX2UnicodeConverter(object):
+    """
+    replaces LaTeX entities by their unicode equivalents in a single pass
+
+    All entities are compiled into one regular expression shaped like a
+    trie, so the longest entity starting at a given position wins. If an
+    entity is listed in several mappings the first mapping takes
+    precedence.
+    """
+
+    def __init__(self, *mappings):
+        self.mapping = {}
+        for mapping in reversed(mappings):
+            for latex_entity, replacement in mapping.items():
+                self.mapping[_decode(latex_entity)] = replacement
+        self.pattern = re.compile(self._trieRegex(self.mapping.keys()))
+
+    def _trieRegex(self, entities):
+        trie = {}
+        for entity in entities:
+            node = trie
+            for char in entity:
+                node = node.setdefault(char, {})
+            node[''] = None
+        return self._nodeRegex(trie)
+
+    def _nodeRegex(self, node):
+        branches = [re.escape(char) + self._nodeRegex(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if '' in node:
+            # a shorter entity ends here; it only matches if no longer one does
+            return '(?:%s)?' % '|'.join(branches)
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:%s)' % '|'.join(branches)
+
+    def _replace(self, match):
+        return self.mapping[match.group()]
+
+    def convert(self, text):
+        return self.pattern.sub(self._replace, text)
+
+
+_latex_converter = None
+
+def getLaTeXConverter():
+    """
+    returns the converter shared by all parsers, it is built on first use
+    """
+    global _latex_converter
+    if _latex_converter is None:
+        _latex_converter = LaTeX2UnicodeConverter(
+            _latex2utf8enc_mapping_simple, _latex2utf8enc_mapping)
+    return _latex_converter
+
+
+class BibtexParser(BibtexFieldsMixin, BibliographyParser):
     """
     A specific parser to process input in BiBTeX-format.
     """
@@ -35,6 +165,8 @@ class BibtexParser(BibliographyParser):
     format = {'name':'BibTeX',
               'extension':'bib'}
 
+    chunk_size = 65536 # bytes read at once when parsing from a file object
+
     def __init__(self,
                  id = 'bibtex',
                  title = "BibTeX parser",
@@ -54,8 +186,7 @@ class BibtexParser(BibliographyParser):
         """
         is this my format?
         """
-        pattern = re.compile('^@[A-Z|a-z]*{', re.M)
-        all_tags = re.findall(pattern, source)
+        all_tags = _format_tags.findall(source)
 
         if all_tags:
             for t in all_tags:
@@ -69,56 +200,162 @@ class BibtexParser(BibliographyParser):
         else:
             return 0
 
-    def preprocess(self, source):
+    def splitSource(self, source):
+        """
+        splits a (text) file with several entries
+        returns a list of those entries
+        """
+        source = self.preprocess(source)
+        return [source[start:end] for start, end in iterEntrySpans(source)]
+
+    def iterSource(self, source):
+        """
+        yields the single (preprocessed) entries of a (text) file or an
+        open file object without keeping a list of all of them
+        """
+        if hasattr(source, 'read'):
+            return self.iterFileSource(source)
+        source = self.preprocess(self.decodeSource(source))
+        return (source[start:end] for start, end in iterEntrySpans(source))
+
+    def iterFileSource(self, fileobj):
+        """
+        reads a file object chunk by chunk and preprocesses every run of
+        complete entries on its own, so only the entries currently being
+        processed are held in memory. Macros defined in earlier chunks
+        stay known for the following ones. While no entry is complete the
+        chunks read grow, so a huge entry isn't scanned again and again.
+        """
+        macros = {}
+        pending = ''
+        size = self.chunk_size
+        while True:
+            chunk = fileobj.read(size)
+            pending += chunk
+            complete = 0
+            if chunk:
+                for start, end in iterEntrySpans(pending):
+                    if end is not None:
+                        complete = end
+            else:
+                complete = len(pending)
+            if not complete:
+                size = max(self.chunk_size, len(pending))
+            else:
+                size = self.chunk_size
+                block = self.decodeSource(pending[:complete])
+                pending = pending[complete:]
+                block = self.preprocess(block, macros)
+                for start, end in iterEntrySpans(block):
+                    yield block[start:end]
+            if not chunk:
+                break
+
+    def iterMappedSource(self, buffer):
+        """
+        yields the single (preprocessed) entries of a memory mapped file;
+        the runs of entries found by iterSpans are preprocessed one after
+        the other with the macros defined so far
+        """
+        macros = {}
+        for text in self.iterMappedText(buffer):
+            text = self.preprocess(text, macros)
+            for start, end in iterEntrySpans(text):
+                yield text[start:end]
+
+    def iterRecordEntries(self, record, state):
+        """
+        preprocesses a single entry with the macros defined by the entries
+        before it
+        """
+        record = self.preprocess(record, state.setdefault('macros', {}))
+        return (record[start:end] for start, end in iterEntrySpans(record))
+
+    def iterRecordSpans(self, buffer):
+        """
+        yields the (start, end) offsets of the entries of a (byte) buffer
+        """
+        for start, end in iterEntrySpans(buffer):
+            if end is None:
+                end = len(buffer)
+            yield start, end
+
+    def preprocess(self, source, macros=None):
         """
         expands LaTeX macros
         removes LaTeX commands and special formating
         converts special characters to their HTML equivalents
         """
-        source = self.expandMacros(source)
+        source = self.measure('expandMacros', self.expandMacros, source,
+                              macros)
 
         # let Bibutils cleanup up the BibTeX mess
         if FIX_BIBTEX and haveBibUtils:
             try:
-                tool = getUtility(IBibTransformUtility, name=u"external")
-                source = tool.transform(source, 'bib', 'bib')
+                tool = getTransformUtility()
+                result = self.measure('transform', tool.transform, source,
+                                      'bib', 'bib')
+                if isinstance(source, unicode):
+                    result = _decode(result)
+                # a failed transformation gives no output, go on without
+                if result.strip():
+                    source = result
             except ComponentLookupError:
                 pass
 
-        source = self.stripComments(source)
-        source = self.convertChars(source)
+        source = self.measure('stripComments', self.stripComments, source)
+        source = self.measure('convertChars', self.convertChars, source)
         # it is important to convertChars before stripping off commands!!!
         # thus, whatever command will be replaced by a unicode value... the
         # remaining LaTeX commands will vanish here...
-        source = self.stripCommands(source)
+        source = self.measure('stripCommands', self.stripCommands, source)
         return source
 
-    def expandMacros(self, source):
-        source = self.expandStringMacros(source)
+    def expandMacros(self, source, macros=None):
+        source = self.expandStringMacros(source, macros)
         # add more macro conventions here if there are any
         return source
 
-    def expandStringMacros(self, source):
-        lines = source.split('\n')
-        macros = []
-        sourcelns = []
-        for line in lines:
-            if line.find('@String') > -1:
-                macros.append(line)
+    def expandStringMacros(self, source, macros=None):
+        """
+        collects all @String definitions (in any case) in a first pass
+        and removes them from the source, then expands the macros and
+        resolves '#' concatenations in the field values in a second one.
+        Definitions are added to 'macros' if a dictionary is passed.
+        """
+        if macros is None:
+            macros = {}
+
+        def define(match):
+            name = match.group(1).lower()
+            macros[name] = self.concatenateMacroValue(match.group(2), macros)
+            return ''
+
+        source = _string_definition.sub(define, source)
+        if not macros and '#' not in source:
+            return source
+
+        def expand(match):
+            value = match.group(2)
+            if '#' not in value and value.lower() not in macros:
+                return match.group(0)
+            return '%s{%s}' % (match.group(1),
+                               self.concatenateMacroValue(value, macros))
+
+        return _field_value.sub(expand, source)
+
+    def concatenateMacroValue(self, value, macros):
+        """
+        joins the parts of a (possibly '#' concatenated) value,
+        replacing known macro names by their values
+        """
+        parts = []
+        for token in _macro_token.findall(value):
+            if token[0] in '"{':
+                parts.append(token[1:-1])
             else:
-                sourcelns.append(line)
-        source = '\n'.join(sourcelns)
-        for macro in macros:
-            split_on = re.compile('[{=}]+')
-            raw_matches = split_on.split(macro)
-            matches = [m for m in raw_matches if m not in ['', ' ', '\r']]
-            # raise str(matches)
-            short = matches[1].strip()
-            long = matches[-1].strip()
-            pattern = "\\b" + short + "\\b"
-            old = re.compile(pattern)
-            source = old.sub(long, source)
-        return source
+                parts.append(macros.get(token.lower(), token))
+        return ''.join(parts)
 
     def stripCommands(self, source):
         oldstyle_cmd = re.compile(r'{\\[a-zA-Z]{2,}')
@@ -128,44 +365,16 @@ class BibtexParser(BibliographyParser):
         return source
 
     def stripComments(self, source):
-
-        inside_entry = False
-        waiting_for_first_brace = False
-        newsource = ''
-
-        for idx in range(len(source)):
-
-            char = source[idx]
-            last_char = (idx > 0) and source[idx-1] or '\n'
-            next_char = (idx < len(source)-1) and source[idx+1] or '\n'
-
-            if char == '@' and not inside_entry:
-                inside_entry = True
-                waiting_for_first_brace = True
-                braces_nesting_level = 0
-
-            if inside_entry:
-
-                newsource = newsource + char
-                if char == '{' and last_char != "\\":
-                    braces_nesting_level += 1
-
-                if char == '}' and last_char != "\\":
-                    braces_nesting_level -= 1
-
-                if waiting_for_first_brace and (braces_nesting_level == 1):
-                    waiting_for_first_brace = False
-
-                if (braces_nesting_level == 0) and not waiting_for_first_brace and (char == '}'):
-                    inside_entry = False
-                    newsource = newsource + "\n"
-
-        completely = re.compile('.*')
-        ## this line caused issue #20, leaving it here for now... mg-20061023
-        # source = completely.sub(newsource, 'dummy')
-        ## this line fixes issue #20
-        source = newsource
-        return source
+        """
+        drops everything outside of the entries (comments, blank lines)
+        and terminates each entry with a newline
+        """
+        entries = []
+        for start, end in iterEntrySpans(source):
+            entries.append(source[start:end])
+            if end is not None:
+                entries.append('\n')
+        return ''.join(entries)
 
     def convertChars(self, source):
         source = self.convertLaTeX2Unicode(source)
@@ -173,13 +382,9 @@ class BibtexParser(BibliographyParser):
         return self.explicitReplacements(source)
 
     def convertLaTeX2Unicode(self, source):
-        for latex_entity in _latex2utf8enc_mapping_simple.keys():
-            source = _encode(_decode(source).replace(latex_entity, _latex2utf8enc_mapping_simple[latex_entity]))
-
-        for latex_entity in _latex2utf8enc_mapping.keys():
-            source = _encode(_decode(source).replace(latex_entity, _latex2utf8enc_mapping[latex_entity]))
-
-        return source
+        if isinstance(source, unicode):
+            return getLaTeXConverter().convert(source)
+        return _encode(getLaTeXConverter().convert(_decode(source)))
 
     def fixWhiteSpace(self, source):
         ttable = [(r'\ ', ' '),
@@ -217,8 +422,6 @@ class BibtexParser(BibliographyParser):
         BibliographyEntry's edit method
         """
         result = {}
-        authorlist = []
-        authorURLlist = []
 
         # remove newlines and <CR>s, and remove the last '}'
         entry = entry.replace('\n', ' ').replace('\r', '').replace('\t', ' ').rstrip().rstrip('}')
@@ -279,89 +482,10 @@ class BibtexParser(BibliographyParser):
 
             #print key, result[key]
 
-        # compile authors list of dictionaries
-        # we can have authors
-        if result.has_key('author'):
-            for each in result['author']:
-                each = each.replace(' AND', ' and')
-                authorlist.extend( each.split(' and') )
-        # but for some bibref types we can have editors alternatively
-        elif result.has_key('editor') and (type in ['book','proceedings']):
-            result['editor_flag'] = True
-            for each in result['editor']:
-                each = each.replace(' AND', ' and')
-                authorlist.extend( each.split(' and') )
-        if result.has_key('authorURLs'):
-            authorURLlist = result['authorURLs'].split('and ')
-
-        if authorlist:
-            alist = []
-            authorlist = [x for x in authorlist if x]
-            for author in authorlist:
-                fname = mname = lname = ''
-                parts = self.splitAuthor(author)
-                if len(parts) == 1:
-                    lname = parts[0].strip()
-                else:
-                    lname = parts[-1].strip()
-                    fname = parts[0].strip()
-                    if parts[1:-1]:
-                        mname = ' '.join([_ for _ in parts[1:-1]])
-                adict = {'firstname': fname,
-                         'middlename': mname,
-                         'lastname': lname}
-                alist.append(adict)
-
-        if authorURLlist and alist:
-            index = 0
-            for url in authorURLlist:
-                alist[index]['homepage'] = url.strip()
-                index += 1
-
-        if authorlist:
-            result['authors'] = alist
-
-        # do some renaming and reformatting
-        tmp = result.get('note')
-        while tmp and tmp[-1] in ['}', ',', '\n', '\r']:
-            tmp = tmp[:-1]
-        if tmp:
-            result['note'] = tmp
-        result['publication_year'] = result.get('year', '')
-        result['publication_month'] = result.get('month', '')
-        result['publication_url'] = result.get('url', '')
-        ## result['publication_title'] = result.get('title', '')
-        tmp = result.get('title','')
-        for car in ('\n', '\r', '\t'):
-            tmp = tmp.replace(car, ' ')
-        while '  ' in tmp:
-            tmp = tmp.replace('  ', ' ')
-        result['title'] = tmp
-
-        # collect identifiers
-        identifiers = list()
-        for key in ('isbn', 'doi', 'asin', 'purl', 'urn', 'issn'):
-            if key in result:
-                identifiers.append({'label' : key.upper(), 'value': result[key]})
-        if identifiers:
-            result['identifiers'] = identifiers
-
-        return result
+        return self.completeEntry(result, type)
 
     # the helper method's
 
-    def splitAuthor(self, author=None):
-        if not author: 
-            return []
-        #parts = author.replace('.', ' ').split(',',1)
-        parts = author.split(',',1)
-        if len(parts) == 1: 
-            return parts[0].split()
-        else:
-            tmp = parts[1].split()
-            tmp.append(parts[0])
-            return tmp
-
     def splitMultiple(self, value):
         value = self.clean(value)
         result = list()
@@ -9,17 +9,52 @@
 # Python stuff
 import re
 
-# Zope stuff
-from zope.component import getUtility 
-from zope.interface import implements
-
 # Bibliography stuff
-from bibliograph.rendering.interfaces import IBibTransformUtility
-from bibliograph.parsing.parsers.base import isTransformable
-from bibliograph.parsing.parsers.bibtex import BibtexParser as BaseParser
+from bibliograph.parsing.parsers.tagged import TaggedParser, isbn_types
+
+# EndNote reference types and the BibTeX types they are parsed as
+endnote_types = {'journal article'       : 'article',
+                 'magazine article'      : 'article',
+                 'newspaper article'     : 'article',
+                 'electronic article'    : 'article',
+                 'book'                  : 'book',
+                 'edited book'           : 'book',
+                 'book section'          : 'incollection',
+                 'conference paper'      : 'inproceedings',
+                 'conference proceedings': 'inproceedings',
+                 'report'                : 'techreport',
+                 'thesis'                : 'phdthesis',
+                 'unpublished work'      : 'unpublished',
+                 'manuscript'            : 'unpublished',
+                 }
+
+# EndNote tags taken over as they are (the first occurrence wins)
+endnote_fields = {'%T': 'title',
+                  '%J': 'journal',
+                  '%B': 'booktitle',
+                  '%V': 'volume',
+                  '%N': 'number',
+                  '%I': 'publisher',
+                  '%C': 'address',
+                  '%S': 'series',
+                  '%7': 'edition',
+                  '%U': 'url',
+                  '%R': 'doi',
+                  '%X': 'abstract',
+                  '%Z': 'note',
+                  '%8': 'month',
+                  }
+
+_tag = re.compile(r'^(%\S)(?: (.*))?$')
+
+# the first line of a record
+_record_start = re.compile(r'^%0 ', re.M)
+
+# the tags checkFormat looks for
+_format_tags = re.compile('^%[0-9|A-Z] ', re.M)
 
 
-class EndNoteParser(BaseParser):
+class EndNoteParser(TaggedParser):
     """
     A specific parser to process input in EndNote's text format.
     """
@@ -27,6 +62,11 @@ class EndNoteParser(BaseParser):
     format = {'name':'EndNote',
               'extension':'enw'}
 
+    record_start = _record_start
+    first_tag = '%0 '
+    tag_pattern = _tag
+    list_tags = ('%K',) # every line is a keyword of its own
+
     def __init__(self,
                  id = 'endnote',
                  title = "EndNote's text format parser"
@@ -34,24 +74,17 @@ class EndNoteParser(BaseParser):
         """
         initializes including the regular expression patterns
         """
-        BaseParser.__init__(self, id=id, title=title)
-
-    # Here we need to provide 'checkFormat' and 'preprocess'
+        TaggedParser.__init__(self, id=id, title=title)
 
-    def isAvailable(self):
-        """ test if transforming from Endnote to BibTex is possible...
-        """
-        return isTransformable('end', 'bib')
+    # Here we need to provide 'checkFormat' and 'parseEntry'
 
     def checkFormat(self, source):
         """
         does the source look to be in endnote format?
         """
-        # Ultimately end2xml is used
         # http://www.scripps.edu/~cdputnam/software/bibutils/bibutils2.html#end2xml
 
-        pattern = re.compile('^%[0-9|A-Z] ', re.M)
-        all_tags = re.findall(pattern, source)
+        all_tags = _format_tags.findall(source)
         # Should always start w/ '%0' and have at least one author '%A',
         # a year (date) '%D' and a title '%T'
         required = ('%A ', '%D ', '%T ')
@@ -61,14 +94,60 @@ class EndNoteParser(BaseParser):
         else:
             return 0
 
-    def preprocess(self, source):
+    def parseEntry(self, entry):
+        """See IBibliographyParser.
         """
-        prep the source and convert EndNote to BibTeX
-        """
-        # Remove carriage returns - end2xml chokes on them
-        source = source.replace('\r', '')
+        result = {}
+        fields = {}
+        authors = []
+        editors = []
+        keywords = []
+        endnote_type = ''
+        for tag, value in self.splitTags(entry):
+            if tag == '%0':
+                endnote_type = value.lower()
+            elif tag == '%A':
+                authors.append(value)
+            elif tag == '%E':
+                editors.append(value)
+            elif tag == '%K':
+                keywords.extend([k.strip() for k in re.split('[\n;]', value)
+                                 if k.strip()])
+            elif value and not fields.has_key(tag):
+                fields[tag] = value
+        type = endnote_types.get(endnote_type, 'misc')
+        result['reference_type'] = type.capitalize() + 'Reference'
+
+        values = {}
+        for tag, key in endnote_fields.items():
+            if fields.has_key(tag):
+                values[key] = fields[tag]
+        if fields.has_key('%P'):
+            pages = fields['%P'].split('-')
+            if len(pages) == 2 and pages[0].strip() and pages[1].strip():
+                values['pages'] = '%s--%s' % (pages[0].strip(),
+                                              pages[1].strip())
+            else:
+                values['pages'] = fields['%P']
+        if fields.has_key('%@'):
+            if type in isbn_types:
+                values['isbn'] = fields['%@']
+            else:
+                values['issn'] = fields['%@']
+        date = fields.get('%D', '').split('/')
+        if date[0].strip():
+            values['year'] = date[0].strip()
+        for key, value in values.items():
+            result[key] = value
+            result[key.upper()] = value
 
-        tool = getUtility(IBibTransformUtility, name=u"external")
-        return tool.transform(source, 'end', 'bib')
+        result['pid'] = self.getPid(fields.get('%F'), authors,
+                                    values.get('year', ''))
+        if authors:
+            result['author'] = authors
+        if editors and type in ['book', 'proceedings']:
+            result['editor'] = editors
+        if keywords:
+            result['keywords'] = keywords
 
-    # all the rest we inherit from our parent BibTeX(!) parser
+        return self.completeEntry(result, type)
@@ -7,8 +7,64 @@
 
 """MedlineParser class"""
 import re
+from cStringIO import StringIO
 
 from bibliograph.parsing.parsers.base import BibliographyParser
+from bibliograph.parsing.names import NameMemo
+
+# the handlers of the tags we are interested in, called with the parser,
+# the result dictionary and the value of the tag
+
+def _parseType(parser, result, value):
+    if value.find('Journal Article')> -1 or value.find('JOURNAL ARTICLE')> -1:
+        result['reference_type'] = 'ArticleReference'
+
+def _parseTitle(parser, result, value):
+    title = value.replace('\n', ' ').replace('      ', '').strip()
+    result['title'] = title
+
+def _parseAbstract(parser, result, value):
+    tmp = value.replace('\n', ' ').replace('  ', '')
+    result['abstract'] = tmp.replace('  ', '').replace('  ', '')
+
+def _parseDate(parser, result, value):
+    result['publication_year'] = value[:4]
+    pmonth = value[5:].replace('\n','').replace('\r','')
+    result['publication_month'] = pmonth
+
+def _parseFullAuthor(parser, result, value):
+    adict = parser.full_author_names.getName(value, parser.splitFullName)
+    result.setdefault('authors',[]).append(adict)
+
+def _parseAuthor(parser, result, value):
+    # only split once it is clear there are no 'FAU' names
+    result.setdefault('_short_authors',[]).append(value)
+
+def _field(key):
+    def _parseField(parser, result, value):
+        result[key] = value.strip()
+    return _parseField
+
+# records are separated by blank lines
+_blank_lines = re.compile(r'\n(?:[ \t\r]*\n)+')
+# a tagged line and the continuation lines following it
+_tag_lines = re.compile(r'^(.{0,4}- )(.*(?:\n(?!.{0,4}- ).*)*\n?)', re.M)
+
+tag_handlers = {'PT  - ': _parseType,
+                'TI  - ': _parseTitle,
+                'AB  - ': _parseAbstract,
+                'PMID- ': _field('pmid'),
+                'TA  - ': _field('journal'),
+                'VI  - ': _field('volume'),
+                'IP  - ': _field('number'),
+                'PG  - ': _field('pages'),
+                'DP  - ': _parseDate,
+                'FAU - ': _parseFullAuthor,
+                'AU  - ': _parseAuthor,
+                }
+
+# the tags checkFormat looks for
+_format_tags = re.compile('^[A-Z| ]{4}-', re.M)
 
 
 class MedlineParser(BibliographyParser):
@@ -19,6 +75,13 @@ class MedlineParser(BibliographyParser):
     format = {'name':'Medline',
               'extension':'med'}
 
+    tag_handlers = tag_handlers
+    chunk_size = 65536
+
+    # shared by all instances
+    full_author_names = NameMemo()
+    author_names = NameMemo()
+
     def __init__(self,
                  id = 'medline',
                  title = 'Medline Parser',
@@ -41,8 +104,7 @@ class MedlineParser(BibliographyParser):
         is this my format?
         """
         # Medlines tags are up to for caps in length (padded) followed w/ a '-'
-        pattern = re.compile('^[A-Z| ]{4}-', re.M)
-        all_tags = re.findall(pattern, source)
+        all_tags = _format_tags.findall(source)
 
         # Should always contain 'PMID-', have at least one author 'AU',
         # an abstract 'AB' and a title 'TI'
@@ -53,6 +115,65 @@ class MedlineParser(BibliographyParser):
         else:
             return 0
 
+    def splitSource(self, source):
+        """
+        splits Medline source into its records
+        """
+        return list(self.iterSource(source))
+
+    def iterSource(self, source):
+        """
+        yields the records (separated by blank lines) of a (text) source
+        or an open file object, reading the latter block by block
+        """
+        if isinstance(source, unicode):
+            # cStringIO only takes ASCII unicode
+            records = _blank_lines.split(source)
+            return (record for record in records
+                    if record and not record.isspace())
+        return self.iterFileSource(source)
+
+    def iterFileSource(self, source):
+        """
+        yields the records of a (byte) source or an open file object
+        """
+        if not hasattr(source, 'read'):
+            source = StringIO(source)
+        rest = ''
+        while True:
+            block = source.read(self.chunk_size)
+            if not block:
+                break
+            records = _blank_lines.split(rest + block)
+            # the last record may continue in the next block
+            rest = records.pop()
+            for record in records:
+                if record and not record.isspace():
+                    yield self.decodeSource(record)
+        if rest and not rest.isspace():
+            yield self.decodeSource(rest)
+
+    def iterRecordSpans(self, buffer):
+        """
+        yields the (start, end) offsets of the records (separated by blank
+        lines) of a (byte) buffer
+        """
+        start = 0
+        for match in _blank_lines.finditer(buffer):
+            if match.start() > start:
+                yield start, match.start()
+            start = match.end()
+        if start < len(buffer):
+            yield start, len(buffer)
+
+    def iterTags(self, entry):
+        """
+        returns the (tag, value) pairs of a record; a tag is the
+        prefix of a line (like 'TI  - ') and its value keeps the line
+        breaks and indentation of the continuation lines
+        """
+        return _tag_lines.findall(entry)
+
     def parseEntry(self, entry):
         """
         parses a single entry
@@ -60,68 +181,49 @@ class MedlineParser(BibliographyParser):
         returns a dictionary to be passed to
         BibliographyEntry's edit method
         """
-        result = {}
-
-        tokens = self.pattern.split(entry)
-
-        checkAU = 0
-        if 'FAU - ' not in tokens:
-            checkAU = 1
-
-        nested = []
-        for i in range(1,len(tokens),2):
-            nested.append([tokens[i],tokens[i+1]])
-
         # some defaults
-        result['note'] = 'automatic medline import'
-
-        for key, value in nested:
-            if key == 'PT  - ' and (value.find('Journal Article')> -1
-                                    or value.find('JOURNAL ARTICLE')> -1):
-                result['reference_type'] = 'ArticleReference'
-            elif key == 'TI  - ':
-                title = value.replace('\n', ' ').replace('      ', '').strip()
-                result['title'] = title
-            elif key == 'AB  - ':
-                tmp = value.replace('\n', ' ').replace('  ', '')
-                result['abstract'] = tmp.replace('  ', '').replace('  ', '')
-            elif key == 'PMID- ': result['pmid'] = str(value).strip()
-            elif key == 'TA  - ': result['journal'] = str(value).strip()
-            elif key == 'VI  - ': result['volume'] = str(value).strip()
-            elif key == 'IP  - ': result['number'] = str(value).strip()
-            elif key == 'PG  - ': result['pages'] = str(value).strip()
-            elif key == 'DP  - ':
-                result['publication_year'] = value[:4]
-                pmonth = value[5:].replace('\n','').replace('\r','')
-                result['publication_month'] = pmonth
-            elif key == 'FAU - ':
-                raw = value.replace('\n', '').split(', ')
-                lname = raw[0]
-                fnames = raw[1].split(' ',1)
-                fname = fnames[0]
-                if len(fnames)> 1:
-                    minit = fnames[1]
-                else:
-                    minit = ''
-                adict = {'firstname': fname
-                         ,'middlename': minit
-                         ,'lastname': lname
-                         }
-                result.setdefault('authors',[]).append(adict)
-
-            elif checkAU and key == 'AU  - ':
-                raw = value.replace('\n', '').split()
-                lname = raw[0]
-                fnames = raw[1]
-                fname = fnames[0]
-                if len(fnames)> 1:
-                    minit = fnames[1:]
-                else:
-                    minit = ''
-                adict = {'firstname': fname
-                         ,'middlename': minit
-                         ,'lastname': lname
-                         }
-                result.setdefault('authors',[]).append(adict)
-
+        result = {'note': 'automatic medline import'}
+
+        handlers = self.tag_handlers
+        for tag, value in self.iterTags(entry):
+            handler = handlers.get(tag)
+            if handler is not None:
+                handler(self, result, value)
+
+        # the short 'AU' names only count if there are no 'FAU' ones
+        short_authors = result.pop('_short_authors', None)
+        if short_authors and not result.has_key('authors'):
+            result['authors'] = [self.author_names.getName(value,
+                                                           self.splitName)
+                                 for value in short_authors]
         return result
+
+    def splitFullName(self, value):
+        """
+        returns (firstname, middlename, lastname) of a 'FAU' value
+        like 'Groot, Tom V M'
+        """
+        raw = value.replace('\n', '').split(', ')
+        lname = raw[0]
+        fnames = raw[1].split(' ',1)
+        fname = fnames[0]
+        if len(fnames)> 1:
+            minit = fnames[1]
+        else:
+            minit = ''
+        return fname, minit, lname
+
+    def splitName(self, value):
+        """
+        returns (firstname, middlename, lastname) of an 'AU' value
+        like 'Groot TV'
+        """
+        raw = value.replace('\n', '').split()
+        lname = raw[0]
+        fnames = raw[1]
+        fname = fnames[0]
+        if len(fnames)> 1:
+            minit = fnames[1:]
+        else:
+            minit = ''
+        return fname, minit, lname
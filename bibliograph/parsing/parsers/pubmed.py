@@ -0,0 +1,269 @@
+############################################################################
+#                                                                          #
+#             copyright (c) 2003 ITB, Humboldt-University Berlin           #
+#             written by: Raphael Ritz, r.ritz@biologie.hu-berlin.de       #
+#                                                                          #
+############################################################################
+
+"""PubmedXMLParser class"""
+
+# there is a module called xml next to this one
+from __future__ import absolute_import
+
+# Python stuff
+import zlib
+from cStringIO import StringIO
+from xml.etree import cElementTree as etree
+
+# Bibliography stuff
+from bibliograph.parsing.parsers.medline import MedlineParser
+from bibliograph.parsing.parsers.xml import iterElements, iterRawElements
+from bibliograph.parsing.parsers.xml import readBytes
+
+GZIP_MAGIC = '\x1f\x8b'
+
+# window bits making zlib read (and skip) a gzip header
+_gzip_wbits = 16 + zlib.MAX_WBITS
+
+
+def _text(element, path=None):
+    if element is not None and path is not None:
+        element = element.find(path)
+    if element is None:
+        return ''
+    # titles and abstracts may contain inline markup like <i>
+    text = ' '.join(''.join(element.itertext()).split())
+    return text
+
+
+class _SourceReader(object):
+    """
+    reads a file object whose first bytes were read already, gzip
+    compressed sources are decompressed on the fly
+    """
+
+    def __init__(self, fileobj, head):
+        self.fileobj = fileobj
+        self.head = head
+        self.output = ''
+        self.compressed = head == GZIP_MAGIC
+        self.decompressor = None
+        if self.compressed:
+            self.decompressor = zlib.decompressobj(_gzip_wbits)
+
+    def _readRaw(self, size):
+        if size < 0:
+            data = self.head + self.fileobj.read()
+            self.head = ''
+            return data
+        if self.head:
+            data = self.head + self.fileobj.read(max(0, size - len(self.head)))
+            self.head = ''
+            return data
+        return self.fileobj.read(size)
+
+    def read(self, size=-1):
+        if not self.compressed:
+            return self._readRaw(size)
+        while self.decompressor is not None and \
+              (size < 0 or len(self.output) < size):
+            raw = self._readRaw(65536)
+            if not raw:
+                self.output += self.decompressor.flush()
+                self.decompressor = None
+                break
+            self.output += self.decompressor.decompress(raw)
+            # a gzip file may consist of several members
+            while self.decompressor.unused_data.strip('\x00'):
+                rest = self.decompressor.unused_data
+                self.output += self.decompressor.flush()
+                self.decompressor = zlib.decompressobj(_gzip_wbits)
+                self.output += self.decompressor.decompress(rest)
+        if size < 0:
+            size = len(self.output)
+        data = self.output[:size]
+        self.output = self.output[size:]
+        return data
+
+
+class PubmedXMLParser(MedlineParser):
+    """
+    A specific parser to process PubMed/MEDLINE XML (PubmedArticleSet),
+    plain or gzip compressed.
+    """
+
+    format = {'name':'PubMed XML',
+              'extension':'xml'}
+
+    def __init__(self,
+                 id = 'pubmed',
+                 title = 'PubMed XML Parser'):
+        """
+        initializes including the regular expression patterns
+        """
+        MedlineParser.__init__(self, id=id, title=title)
+
+    # Here we need to provide 'checkFormat', 'iterSource' and 'parseEntry'
+
+    def checkFormat(self, source):
+        """
+        is this my format?
+        """
+        if isinstance(source, str) and source.startswith(GZIP_MAGIC):
+            # look at the beginning of the compressed XML instead
+            try:
+                teststring = zlib.decompressobj(_gzip_wbits).decompress(
+                    source[:16384], 1000)
+            except zlib.error:
+                return 0
+        else:
+            teststring = source[:1000]
+        if teststring.find('<PubmedArticleSet') > -1 or \
+           teststring.find('<PubmedArticle>') > -1:
+            return 1
+        return 0
+
+    def openSource(self, source):
+        """
+        returns a file object reading the uncompressed XML of a (text)
+        source or an open file object
+        """
+        if not hasattr(source, 'read'):
+            if isinstance(source, unicode):
+                source = source.encode('utf-8')
+            source = StringIO(source)
+        # no seeking back, file objects like sockets can't
+        return _SourceReader(source, source.read(2))
+
+    def iterRecords(self, source):
+        """
+        yields the <PubmedArticle> elements of a source while it is parsed
+        incrementally
+        """
+        return iterElements(self.openSource(source), 'PubmedArticle')
+
+    def splitSource(self, source):
+        """
+        splits a PubmedArticleSet into its articles
+        """
+        return list(self.iterSource(source))
+
+    def iterSource(self, source):
+        """
+        yields every article of a source as a separate XML document
+        """
+        for element in self.iterRecords(source):
+            yield etree.tostring(element, 'utf-8')
+
+    def iterEntries(self, source, stats=None):
+        """
+        yields the parsed articles without serializing them again, unless
+        a 'sampler' needs the raw records
+        """
+        parser = self.withStats(stats)
+        if parser.sampler is not None:
+            entries = parser.processEntries(parser.iterRawEntries(source),
+                                            raw=True)
+        else:
+            entries = parser.processEntries(parser.iterRecords(source))
+        for entry in entries:
+            yield entry
+
+    def iterRawEntries(self, source):
+        """
+        yields the (offset, raw XML, entry) of every article, the offset
+        in bytes of the uncompressed XML
+        """
+        data = self.openSource(readBytes(source)).read()
+        return iterRawElements(data, 'PubmedArticle')
+
+    def iterMappedSource(self, buffer):
+        """
+        yields the articles of a memory mapped file, which is parsed
+        incrementally like an open file object
+        """
+        return self.iterRecords(buffer)
+
+    def parseEntry(self, entry):
+        """
+        parses a single <PubmedArticle> element (or its XML text)
+
+        returns a dictionary with the fields MedlineParser.parseEntry
+        returns for the same citation
+        """
+        if isinstance(entry, basestring):
+            entry = etree.fromstring(entry)
+        result = {}
+        citation = entry.find('MedlineCitation')
+        if citation is None:
+            return "PubMed XML Parser Error: no MedlineCitation found."
+        article = citation.find('Article')
+        if article is None:
+            article = etree.Element('Article')
+
+        # some defaults
+        result['note'] = 'automatic medline import'
+
+        for ptype in article.findall('PublicationTypeList/PublicationType'):
+            if _text(ptype).lower() == 'journal article':
+                result['reference_type'] = 'ArticleReference'
+        result['pmid'] = _text(citation, 'PMID')
+        title = _text(article, 'ArticleTitle')
+        if title:
+            result['title'] = title
+        abstract = []
+        for part in article.findall('Abstract/AbstractText'):
+            text = _text(part)
+            if part.get('Label') and text:
+                text = '%s: %s' % (part.get('Label'), text)
+            if text:
+                abstract.append(text)
+        if abstract:
+            result['abstract'] = ' '.join(abstract)
+
+        journal = _text(citation, 'MedlineJournalInfo/MedlineTA') or \
+                  _text(article, 'Journal/ISOAbbreviation')
+        if journal:
+            result['journal'] = journal
+        issue = article.find('Journal/JournalIssue')
+        for key, path in (('volume', 'Volume'),
+                          ('number', 'Issue')):
+            value = _text(issue, path)
+            if value:
+                result[key] = value
+        pages = _text(article, 'Pagination/MedlinePgn')
+        if pages:
+            result['pages'] = pages
+
+        date = article.find('Journal/JournalIssue/PubDate')
+        if date is not None:
+            if date.find('Year') is not None:
+                result['publication_year'] = _text(date, 'Year')
+                result['publication_month'] = _text(date, 'Month')
+            else:
+                # like '1998 Dec-1999 Jan', split the same way as 'DP'
+                value = _text(date, 'MedlineDate')
+                result['publication_year'] = value[:4]
+                result['publication_month'] = value[5:]
+
+        for author in article.findall('AuthorList/Author'):
+            raw = (_text(author, 'LastName'), _text(author, 'ForeName'),
+                   _text(author, 'Initials'), _text(author, 'CollectiveName'))
+            if not [part for part in raw if part]:
+                continue
+            adict = self.full_author_names.getName(raw, self.splitAuthor)
+            result.setdefault('authors',[]).append(adict)
+
+        return result
+
+    def splitAuthor(self, raw):
+        """
+        returns (firstname, middlename, lastname) of a (LastName,
+        ForeName, Initials, CollectiveName) tuple
+        """
+        lname, fore, initials, collective = raw
+        if not lname:
+            return '', '', collective
+        if fore:
+            return self.splitFullName('%s, %s' % (lname, fore))
+        return initials[:1], initials[1:], lname
@@ -8,19 +8,10 @@
 """RISParser class (Research Information Systems/Reference Manager)"""
 
 # Python stuff
-import os
 import re
 
-# Zope stuff
-from zope.component import getUtility
-
 # Bibliography stuff
-from bibliograph.rendering.interfaces import IBibTransformUtility
-
-from bibliograph.parsing.parsers.base import BibliographyParser
-from bibliograph.parsing.parsers.base import isTransformable
-
-from bibliograph.parsing.parsers.bibtex import BibtexParser as BaseParser
+from bibliograph.parsing.parsers.tagged import TaggedParser, isbn_types
 
 
 month_mapper = {'jan' : '01',
@@ -55,8 +46,49 @@ def fixMonth(s):
         return month_mapper[s_lower]
     return s
 
-
-class RISParser(BaseParser):
+# RIS reference types and the BibTeX types they are parsed as
+ris_types = {'JOUR' : 'article',
+             'JFULL': 'article',
+             'MGZN' : 'article',
+             'NEWS' : 'article',
+             'ABST' : 'article',
+             'BOOK' : 'book',
+             'EDBOOK': 'book',
+             'CHAP' : 'incollection',
+             'CONF' : 'inproceedings',
+             'CPAPER': 'inproceedings',
+             'RPRT' : 'techreport',
+             'THES' : 'phdthesis',
+             'UNPB' : 'unpublished',
+             'MANSCPT': 'unpublished',
+             }
+
+# RIS tags taken over as they are (the first occurrence wins)
+ris_fields = {'VL': 'volume',
+              'IS': 'number',
+              'CP': 'issue',
+              'PB': 'publisher',
+              'CY': 'address',
+              'UR': 'url',
+              'DO': 'doi',
+              'T3': 'series',
+              'N1': 'note',
+              'N2': 'abstract',
+              'AB': 'abstract',
+              'ET': 'edition',
+              }
+
+_tag = re.compile(r'^([A-Z][A-Z0-9])  -(?: (.*))?$')
+_initials = re.compile(r'\.(?=[^\s\-])')
+
+# the first line of a record
+_record_start = re.compile(r'^TY  -', re.M)
+
+# the tags checkFormat looks for
+_format_tags = re.compile('^[0-9|A-Z]{2}  - ', re.M)
+
+
+class RISParser(TaggedParser):
     """
     A specific parser to process input in RIS format (Research Information Systems/Reference Manager).
     """
@@ -66,6 +98,11 @@ class RISParser(BaseParser):
     format = {'name':'RIS',
               'extension':'ris'}
 
+    record_start = _record_start
+    first_tag = 'TY  -'
+    last_tag = 'ER  -'
+    tag_pattern = _tag
+
     def __init__(self,
                  id = 'ris',
                  title = "RIS format parser"
@@ -73,53 +110,103 @@ class RISParser(BaseParser):
         """
         initializes including the regular expression patterns
         """
-        BaseParser.__init__(self, id=id, title=title)
+        TaggedParser.__init__(self, id=id, title=title)
 
-    # Here we need to provide 'checkFormat' and 'preprocess'
-
-    def isAvailable(self):
-        """ test if transforming from RIS format to BibTex is possible...
-        """
-        return isTransformable('ris', 'bib')
+    # Here we need to provide 'checkFormat' and 'parseEntry'
 
     def checkFormat(self, source):
         """
         is this RIS format?
         (Research Information Systems/Reference Manager)
         """
-        pattern = re.compile('^[0-9|A-Z]{2}  - ', re.M)
-        all_tags = re.findall(pattern, source)
+        all_tags = _format_tags.findall(source)
         if len(all_tags) and (all_tags[0] == 'TY  - ') \
             and (all_tags[-1:] == ['ER  - ']):
             return 1
         return 0
 
-    def _checkEncoding(self, source):
-        """ The RIS parser can only deal properly with UTF-8 encoded
-            RIS data (since we are use utf-8 as fixed encoding passed
-            to ris2bib.
-        """
-        try:
-            unicode(source, 'utf-8')
-        except UnicodeDecodeError:
-            raise RuntimeError('RIS input does not seem to be properly UTF-8 encoded')
-
-    def preprocess(self, source):
+    def normalizeName(self, name):
         """
-        convert RIS to BibTeX
+        separates run-together initials like in 'Franks,L.M.'
         """
-
-        self._checkEncoding(source)
-        tool = getUtility(IBibTransformUtility, name=u"external")
-        return tool.transform(source, 'ris', 'bib')
+        if ',' not in name:
+            return name
+        last, first = name.split(',', 1)
+        first = _initials.sub('. ', first).strip()
+        return ('%s, %s' % (last.strip(), first)).strip(', ')
 
     def parseEntry(self, entry):
         """See IBibliographyParser.
         """
-        rd = super(RISParser, self).parseEntry(entry) # rd for 'result_dict'
+        rd = {} # rd for 'result_dict'
+        fields = {}
+        authors = []
+        editors = []
+        keywords = []
+        ris_type = 'GEN'
+        for tag, value in self.splitTags(entry):
+            if tag == 'TY':
+                ris_type = value.upper()
+            elif tag in ('AU', 'A1'):
+                authors.append(self.normalizeName(value))
+            elif tag in ('A2', 'ED'):
+                editors.append(self.normalizeName(value))
+            elif tag == 'KW':
+                keywords.append(value)
+            elif value and not fields.has_key(tag):
+                fields[tag] = value
+        type = ris_types.get(ris_type, 'misc')
+        rd['reference_type'] = type.capitalize() + 'Reference'
+
+        values = {}
+        for tag, key in ris_fields.items():
+            if fields.has_key(tag) and not values.has_key(key):
+                values[key] = fields[tag]
+        title = fields.get('TI') or fields.get('T1') or fields.get('CT')
+        journal = fields.get('JF') or fields.get('JO') or \
+                  fields.get('JA') or fields.get('J1') or fields.get('J2')
+        secondary = fields.get('T2') or fields.get('BT')
+        if type == 'book':
+            title = title or secondary
+        elif type == 'article':
+            journal = journal or secondary
+        elif secondary:
+            values['booktitle'] = secondary
+        if title:
+            values['title'] = title
+        if journal:
+            values['journal'] = journal
+        if fields.has_key('SP'):
+            pages = fields['SP']
+            if fields.has_key('EP'):
+                pages = '%s--%s' % (pages, fields['EP'])
+            values['pages'] = pages
+        if fields.has_key('SN'):
+            if type in isbn_types:
+                values['isbn'] = fields['SN']
+            else:
+                values['issn'] = fields['SN']
+        # dates are written as 'YYYY/MM/DD/other info'
+        date = (fields.get('PY') or fields.get('Y1') or '').split('/')
+        if date[0].strip():
+            values['year'] = date[0].strip()
+        if len(date) > 1 and date[1].strip():
+            values['month'] = date[1].strip()
+        for key, value in values.items():
+            rd[key] = value
+            rd[key.upper()] = value
+
+        rd['pid'] = self.getPid(fields.get('ID'), authors,
+                                values.get('year', ''))
+        if authors:
+            rd['author'] = authors
+        if editors and type in ['book', 'proceedings']:
+            rd['editor'] = editors
+        if keywords:
+            rd['keywords'] = keywords
+
+        rd = self.completeEntry(rd, type)
         if not rd.has_key('number') and rd.has_key('issue'):
             rd['number'] = rd['issue'].replace(' ', '')
         rd['publication_month'] = fixMonth(rd['publication_month'])
         return rd
-
-    # all the rest we inherit from our parent BibTeX(!) parser
@@ -0,0 +1,97 @@
+"""TaggedParser class"""
+
+# Python stuff
+from cStringIO import StringIO
+
+# Bibliography stuff
+from bibliograph.parsing.parsers.base import BibliographyParser
+from bibliograph.parsing.parsers.base import BibtexFieldsMixin
+from bibliograph.parsing.parsers.base import stripBOM
+
+# the types where an ISBN/ISSN tag holds an ISBN rather than an ISSN
+isbn_types = ('book', 'incollection', 'inbook', 'proceedings')
+
+
+class TaggedParser(BibtexFieldsMixin, BibliographyParser):
+    """
+    Base class of the parsers of line tagged formats (RIS, EndNote) whose
+    records are read into BibTeX fields. A record starts with a line
+    starting with 'first_tag' and, if 'last_tag' is set, ends with a line
+    starting with that one; lines outside of records are skipped.
+    """
+
+    first_tag = None    # the beginning of the line starting a record
+    last_tag = None     # the beginning of the line ending a record
+    tag_pattern = None  # matches a tagged line, grouping tag and value
+    list_tags = ()      # tags keeping their continuation lines apart
+
+    def __init__(self, id, title):
+        """
+        minimal initialization
+        """
+        self.id = id
+        self.title = title
+
+    def splitSource(self, source):
+        """
+        splits a source into its records
+        """
+        return list(self.iterSource(source))
+
+    def iterSource(self, source):
+        """
+        yields the records of a (text) source or an open file object,
+        reading the latter line by line
+        """
+        if isinstance(source, unicode):
+            source = source.splitlines(True)
+        elif not hasattr(source, 'read'):
+            source = StringIO(source)
+        record = []
+        first = True
+        for line in source:
+            if first:
+                line = stripBOM(line)
+                first = False
+            if line.startswith(self.first_tag):
+                if record:
+                    yield self.decodeSource(''.join(record).strip())
+                record = [line]
+            elif record:
+                record.append(line)
+                if self.last_tag and line.startswith(self.last_tag):
+                    yield self.decodeSource(''.join(record).strip())
+                    record = []
+        if record:
+            yield self.decodeSource(''.join(record).strip())
+
+    def splitTags(self, entry):
+        """
+        returns the list of [tag, value] pairs of a record, lines without
+        a tag continue the value of the previous one (on a line of their
+        own for the 'list_tags')
+        """
+        tags = []
+        for line in entry.splitlines():
+            match = self.tag_pattern.match(line)
+            if match is not None:
+                tags.append([match.group(1), (match.group(2) or '').strip()])
+            elif tags and line.strip():
+                if tags[-1][0] in self.list_tags:
+                    separator = '\n'
+                else:
+                    separator = ' '
+                tags[-1][1] = (tags[-1][1] + separator + line.strip()).strip()
+        return tags
+
+    def getPid(self, label, authors, year):
+        """
+        returns the 'label' a record brings or a BibTeX-like cite key made
+        of the last name of the first author and the year
+        """
+        if label:
+            return label
+        pid = ''
+        if authors:
+            pid = authors[0].split(',')[0].strip().replace(' ', '')
+        return pid + year
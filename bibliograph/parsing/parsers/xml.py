@@ -7,17 +7,165 @@
 
 """XMLParser (MODS) class"""
 
-# Python stuff
-import re, os
+# this module is called xml itself
+from __future__ import absolute_import
 
-# Zope stuff
-from zope.component import getUtility
+# Python stuff
+import mmap
+from cStringIO import StringIO
+from xml.etree import cElementTree as etree
+from xml.parsers import expat
 
 # Bibliography stuff
-from bibliograph.rendering.interfaces import IBibTransformUtility
-from bibliograph.parsing.parsers.base import isTransformable
 from bibliograph.parsing.parsers.bibtex import BibtexParser as BaseParser
 
+MODS_NS = '{http://www.loc.gov/mods/v3}'
+
+# MODS genres and the BibTeX types they are parsed as; the genre of the
+# host item (e.g. the journal of an article) decides first
+host_types = {'periodical'              : 'article',
+              'academic journal'        : 'article',
+              'journal'                 : 'article',
+              'magazine'                : 'article',
+              'newspaper'               : 'article',
+              'book'                    : 'incollection',
+              'collection'              : 'incollection',
+              'conference publication'  : 'inproceedings',
+              }
+genre_types = {'book'                   : 'book',
+               'conference publication' : 'proceedings',
+               'thesis'                 : 'phdthesis',
+               'ph.d. thesis'           : 'phdthesis',
+               'masters thesis'         : 'mastersthesis',
+               'report'                 : 'techreport',
+               'technical report'       : 'techreport',
+               'unpublished'            : 'unpublished',
+               }
+
+# identifier types taken over as fields
+identifier_types = ('isbn', 'issn', 'doi', 'asin', 'purl', 'urn')
+
+
+def _localName(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def _children(element, name):
+    return [child for child in element if _localName(child.tag) == name]
+
+def _child(element, name):
+    for child in element:
+        if _localName(child.tag) == name:
+            return child
+    return None
+
+def _text(element):
+    if element is None or not element.text:
+        return ''
+    text = ' '.join(element.text.split())
+    return text
+
+def iterElements(fileobj, name):
+    """
+    parses 'fileobj' incrementally and yields the outermost elements with
+    the local name 'name'; every element is cleared and dropped from the
+    tree once the consumer is done with it, so memory use stays flat
+    """
+    root = None
+    depth = 0
+    for event, element in etree.iterparse(fileobj, ('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = element
+            if _localName(element.tag) == name:
+                depth += 1
+            continue
+        if _localName(element.tag) != name:
+            continue
+        depth -= 1
+        if depth:
+            continue
+        yield element
+        element.clear()
+        if element is not root:
+            root.clear()
+
+def iterRawElements(data, name, chunk_size=65536):
+    """
+    parses the XML bytes 'data' and yields (offset, raw XML, element XML)
+    for the outermost elements with the local name 'name': the raw XML is
+    the element as found at that byte offset of 'data', the element XML
+    the element serialized on its own (with its namespaces declared)
+    """
+    parser = expat.ParserCreate(None, '}')
+    parser.buffer_text = True
+    found = []
+    state = {'builder': None, 'depth': 0, 'start': 0}
+
+    def qualify(name):
+        if '}' in name:
+            return '{' + name
+        return name
+
+    def start(tag, attributes):
+        builder = state['builder']
+        if builder is None:
+            if _localName(tag) != name:
+                return
+            builder = state['builder'] = etree.TreeBuilder()
+            state['start'] = parser.CurrentByteIndex
+        if _localName(tag) == name:
+            state['depth'] += 1
+        attributes = dict([(qualify(key), value)
+                           for key, value in attributes.items()])
+        builder.start(qualify(tag), attributes)
+
+    def end(tag):
+        builder = state['builder']
+        if builder is None:
+            return
+        builder.end(qualify(tag))
+        if _localName(tag) != name:
+            return
+        state['depth'] -= 1
+        if state['depth']:
+            return
+        # the end tag (or an empty element) ends with the next '>'
+        stop = data.find('>', parser.CurrentByteIndex) + 1
+        element = builder.close()
+        state['builder'] = None
+        found.append((state['start'], data[state['start']:stop],
+                      etree.tostring(element, 'utf-8')))
+
+    def text(text):
+        if state['builder'] is not None:
+            state['builder'].data(text)
+
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = text
+    for i in range(0, len(data), chunk_size):
+        parser.Parse(data[i:i+chunk_size], False)
+        for record in found:
+            yield record
+        del found[:]
+    parser.Parse('', True)
+    for record in found:
+        yield record
+
+def readBytes(source):
+    """
+    returns all bytes of a (text) source, an open file object or a memory
+    mapped file, unicode encoded to UTF-8
+    """
+    if isinstance(source, mmap.mmap):
+        return source[:]
+    if hasattr(source, 'read'):
+        return source.read()
+    if isinstance(source, unicode):
+        return source.encode('utf-8')
+    return source
+
+
 
 class XMLParser(BaseParser):
     """
@@ -40,12 +188,7 @@ class XMLParser(BaseParser):
         """
         BaseParser.__init__(self, id=id, title=title)
 
-    # Here we need to provide 'isAvailable', 'checkFormat' and 'preprocess'
-
-    def isAvailable(self):
-        """ test if transforming from XML to BibTex is possible...
-        """
-        return isTransformable('xml', 'bib')
+    # Here we need to provide 'checkFormat', 'iterSource' and 'parseEntry'
 
     def checkFormat(self, source):
         """ is this my format?
@@ -58,11 +201,227 @@ class XMLParser(BaseParser):
         else:
             return 0
 
-    def preprocess(self, source):
+    def iterRecords(self, source):
+        """
+        yields the <mods> elements of a (text) source or an open file
+        object while it is parsed incrementally
+        """
+        if not hasattr(source, 'read'):
+            if isinstance(source, unicode):
+                source = source.encode('utf-8')
+            source = StringIO(source)
+        return iterElements(source, 'mods')
+
+    def splitSource(self, source):
+        """
+        splits a MODS collection into its records
+        """
+        return list(self.iterSource(source))
+
+    def iterSource(self, source):
+        """
+        yields every <mods> record of a source as a separate XML document
+        """
+        for element in self.iterRecords(source):
+            yield etree.tostring(element, 'utf-8')
+
+    def iterEntries(self, source, stats=None):
+        """
+        yields the parsed records without serializing them again, unless
+        a 'sampler' needs the raw records
+        """
+        parser = self.withStats(stats)
+        if parser.sampler is not None:
+            entries = parser.processEntries(parser.iterRawEntries(source),
+                                            raw=True)
+        else:
+            entries = parser.processEntries(parser.iterRecords(source))
+        for entry in entries:
+            yield entry
+
+    def iterRawEntries(self, source):
+        """
+        yields the (offset, raw XML, entry) of every <mods> record, the
+        offset in bytes of the XML; see BibliographyParser.iterRawEntries
+        """
+        return iterRawElements(readBytes(source), 'mods')
+
+    def iterMappedSource(self, buffer):
+        """
+        yields the <mods> records of a memory mapped file, which is parsed
+        incrementally like an open file object
+        """
+        return self.iterRecords(buffer)
+
+    def getName(self, name):
+        """
+        returns a 'Family, Given' string for a MODS <name>
+        """
+        family = []
+        given = []
+        for part in _children(name, 'namePart'):
+            text = _text(part)
+            if not text:
+                continue
+            if part.get('type') == 'family':
+                family.append(text)
+            elif part.get('type') == 'given':
+                if len(text) == 1:
+                    text += '.'
+                given.append(text)
+            else:
+                family.append(text)
+        if given:
+            return '%s, %s' % (' '.join(family), ' '.join(given))
+        return ' '.join(family)
+
+    def getType(self, mods, host):
+        """
+        returns the BibTeX type of a record
+        """
+        if host is not None:
+            for genre in _children(host, 'genre'):
+                type = host_types.get(_text(genre).lower())
+                if type:
+                    return type
+        for genre in _children(mods, 'genre'):
+            type = genre_types.get(_text(genre).lower())
+            if type:
+                return type
+        origin = _child(mods, 'originInfo')
+        if origin is not None and \
+           _text(_child(origin, 'issuance')) == 'monographic':
+            return 'book'
+        return 'misc'
+
+    def getTitle(self, element):
         """
-        convert XML to BibTeX
+        returns the title (and subtitle) of a record or related item
         """
-        tool = getUtility(IBibTransformUtility, name=u"external")
-        return tool.transform(source, 'xml', 'bib')
+        info = _child(element, 'titleInfo')
+        if info is None:
+            return ''
+        title = _text(_child(info, 'title'))
+        subtitle = _text(_child(info, 'subTitle'))
+        if subtitle:
+            title = '%s: %s' % (title, subtitle)
+        return title
+
+    def parseEntry(self, entry):
+        """See IBibliographyParser.
+
+        'entry' is a <mods> element or its XML text
+        """
+        if isinstance(entry, basestring):
+            entry = etree.fromstring(entry)
+        result = {}
+        values = {}
+        authors = []
+        editors = []
+        keywords = []
+
+        host = None
+        for related in _children(entry, 'relatedItem'):
+            if related.get('type') == 'host' and host is None:
+                host = related
+            elif related.get('type') == 'series':
+                values['series'] = self.getTitle(related)
+        type = self.getType(entry, host)
+        result['reference_type'] = type.capitalize() + 'Reference'
+
+        values['title'] = self.getTitle(entry)
+        if host is not None:
+            if type == 'article':
+                values['journal'] = self.getTitle(host)
+            else:
+                values['booktitle'] = self.getTitle(host)
+
+        for name in _children(entry, 'name'):
+            roles = [_text(term).lower()
+                     for role in _children(name, 'role')
+                     for term in _children(role, 'roleTerm')]
+            if 'editor' in roles or 'edt' in roles:
+                editors.append(self.getName(name))
+            elif not roles or 'author' in roles or 'aut' in roles:
+                authors.append(self.getName(name))
+
+        date = ''
+        for origin in [_child(e, 'originInfo') for e in (entry, host)
+                       if e is not None]:
+            if origin is None:
+                continue
+            date = date or _text(_child(origin, 'dateIssued'))
+            publisher = _text(_child(origin, 'publisher'))
+            if publisher:
+                values.setdefault('publisher', publisher)
+            place = _child(origin, 'place')
+            if place is not None:
+                address = _text(_child(place, 'placeTerm'))
+                if address:
+                    values.setdefault('address', address)
+
+        for part in [_child(e, 'part') for e in (entry, host)
+                     if e is not None]:
+            if part is None:
+                continue
+            date = date or _text(_child(part, 'date'))
+            for detail in _children(part, 'detail'):
+                key = detail.get('type')
+                if key == 'issue':
+                    key = 'number'
+                number = _text(_child(detail, 'number'))
+                if key in ('volume', 'number', 'chapter') and number:
+                    values.setdefault(key, number)
+            for extent in _children(part, 'extent'):
+                if extent.get('unit') not in ('page', 'pages'):
+                    continue
+                pages = [_text(_child(extent, 'start')),
+                         _text(_child(extent, 'end'))]
+                pages = '--'.join([p for p in pages if p])
+                if pages:
+                    values.setdefault('pages', pages)
+
+        date = date.split('-')
+        if date[0]:
+            values['year'] = date[0]
+        if len(date) > 1 and date[1]:
+            values['month'] = date[1]
+
+        for identifier in _children(entry, 'identifier'):
+            key = (identifier.get('type') or '').lower()
+            if key in identifier_types and _text(identifier):
+                values.setdefault(key, _text(identifier))
+            elif key == 'uri' and _text(identifier):
+                values.setdefault('url', _text(identifier))
+        for location in _children(entry, 'location'):
+            url = _text(_child(location, 'url'))
+            if url:
+                values.setdefault('url', url)
+        for subject in _children(entry, 'subject'):
+            keywords.extend([_text(topic)
+                             for topic in _children(subject, 'topic')
+                             if _text(topic)])
+        for key in ('abstract', 'note'):
+            text = _text(_child(entry, key))
+            if text:
+                values[key] = text
+
+        for key, value in values.items():
+            if value:
+                result[key] = value
+                result[key.upper()] = value
+
+        pid = entry.get('ID')
+        if not pid:
+            for identifier in _children(entry, 'identifier'):
+                if identifier.get('type') == 'citekey':
+                    pid = _text(identifier)
+        result['pid'] = pid or ''
+        if authors:
+            result['author'] = authors
+        if editors and type in ['book', 'proceedings']:
+            result['editor'] = editors
+        if keywords:
+            result['keywords'] = keywords
 
-    # all the rest we inherit from our parent BibTeX(!) parser
+        return self.completeEntry(result, type)
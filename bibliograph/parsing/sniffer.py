@@ -0,0 +1,271 @@
+"""Detection of the format of a bibliographic source"""
+
+# Python stuff
+import re
+import threading
+
+# Zope stuff
+from zope.interface import implements
+from zope.component import getSiteManager
+
+# Bibliography stuff
+from bibliograph.parsing.interfaces import IBibliographyParser
+from bibliograph.parsing.interfaces import IFormatSniffer
+from bibliograph.parsing.parsers.pubmed import PubmedXMLParser
+
+# the start of every line telling something about the format; one scan
+# with this pattern collects what all the detectors below need
+_line_starts = re.compile(r'^(?:@(?P<bibtex>[A-Za-z]+)\s*[{(]'
+                          r'|(?P<endnote>%[0-9A-Z]) '
+                          r'|(?P<tag>[A-Z][A-Z0-9 ]{1,3})-(?: |$))', re.M)
+
+bibtex_types = ('article', 'book', 'booklet', 'conference', 'inbook',
+                'incollection', 'inproceedings', 'manual', 'mastersthesis',
+                'misc', 'phdthesis', 'proceedings', 'techreport',
+                'unpublished', 'collection', 'patent', 'webpublished',
+                'string', 'preamble', 'comment')
+
+# asked whether a window (plain or gzip compressed) is PubMed XML
+_pubmed_parser = PubmedXMLParser()
+
+
+class Features(object):
+    """
+    what a single scan of the window found out about a source
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.bibtex = {}     # lowercased entry type -> count
+        self.endnote = {}    # '%X' -> count
+        self.tags = {}       # RIS/Medline tag (stripped) -> count
+        self.first_endnote = None
+        self.first_tag = None
+        for match in _line_starts.finditer(window):
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'bibtex':
+                value = value.lower()
+                self.bibtex[value] = self.bibtex.get(value, 0) + 1
+            elif kind == 'endnote':
+                if self.first_endnote is None:
+                    self.first_endnote = value
+                self.endnote[value] = self.endnote.get(value, 0) + 1
+            else:
+                value = value.strip()
+                if self.first_tag is None:
+                    self.first_tag = value
+                self.tags[value] = self.tags.get(value, 0) + 1
+        self.head = window[:1000]
+
+
+def _bibtex(features):
+    if not features.bibtex:
+        return 0
+    known = sum([count for type, count in features.bibtex.items()
+                 if type in bibtex_types])
+    total = sum(features.bibtex.values())
+    if known == total:
+        return 0.9
+    return 0.6 * known / total
+
+def _endnote(features):
+    if features.first_endnote != '%0':
+        return 0
+    found = [tag for tag in ('%A', '%T', '%D') if tag in features.endnote]
+    return 0.6 + 0.1 * len(found)
+
+def _ris(features):
+    if features.first_tag != 'TY':
+        return 0
+    if 'ER' in features.tags:
+        return 0.95
+    return 0.6
+
+def _medline(features):
+    if 'PMID' not in features.tags:
+        return 0
+    found = [tag for tag in ('AU', 'TI', 'AB') if tag in features.tags]
+    return 0.6 + 0.1 * len(found)
+
+def _mods(features):
+    head = features.head
+    if head.find('www.loc.gov/mods') > -1 or \
+       head.find('<modsCollection') > -1:
+        return 0.9
+    if head.find('<mods') > -1:
+        return 0.6
+    return 0
+
+def _pubmed(features):
+    # baseline files are distributed compressed, the parser looks inside
+    if _pubmed_parser.checkFormat(features.window):
+        return 0.95
+    return 0
+
+# detectors for the parsers registered by this package
+detectors = {'bibtex': _bibtex,
+             'endnote': _endnote,
+             'ris': _ris,
+             'medline': _medline,
+             'xml': _mods,
+             'pubmed': _pubmed,
+             }
+
+
+class PeekableReader(object):
+    """
+    wraps a file object, which need not be able to seek, so its first
+    bytes can be looked at and are read again by the parser afterwards
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.head = ''
+
+    def peek(self, size):
+        """
+        returns the next 'size' bytes (fewer at the end of the file)
+        without consuming them
+        """
+        while len(self.head) < size:
+            data = self.fileobj.read(size - len(self.head))
+            if not data:
+                break
+            self.head += data
+        return self.head[:size]
+
+    def read(self, size=-1):
+        if size < 0:
+            data = self.head + self.fileobj.read()
+            self.head = ''
+            return data
+        data = self.head[:size]
+        self.head = self.head[size:]
+        if len(data) < size:
+            data += self.fileobj.read(size - len(data))
+        return data
+
+    def readline(self):
+        if not self.head:
+            return self.fileobj.readline()
+        end = self.head.find('\n') + 1
+        if end:
+            line = self.head[:end]
+            self.head = self.head[end:]
+            return line
+        line = self.head + self.fileobj.readline()
+        self.head = ''
+        return line
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+
+class FormatSniffer(object):
+    """
+    Ranks the registered IBibliographyParser utilities by how likely they
+    can parse a source.
+
+    Only the first 'window' bytes of a source are looked at, and they are
+    scanned a single time for the features of all known formats. Parsers
+    without a detector here are asked through their checkFormat method
+    (on the window only). The registered parsers are looked up once per
+    site manager and looked up again when its registrations change.
+    """
+
+    implements(IFormatSniffer)
+
+    def __init__(self, window=64 * 1024, detectors=detectors):
+        self.window = window
+        self.detectors = detectors
+        self._site = None
+        self._parsers = []
+        self._lock = threading.Lock()
+
+    def getParsers(self):
+        """
+        returns the (name, parser) pairs of the available and enabled
+        parsers of the current site
+        """
+        site = getSiteManager()
+        # the registry counts its changes, so registering a parser later
+        # is noticed as well
+        key = (site, getattr(site.utilities, '_generation', None))
+        with self._lock:
+            if key != self._site:
+                self._parsers = [(name, parser) for name, parser
+                                 in site.getUtilitiesFor(IBibliographyParser)
+                                 if parser.isAvailable() and
+                                    parser.isEnabled()]
+                self._site = key
+            return self._parsers
+
+    def reset(self):
+        """
+        forgets the parsers looked up
+        """
+        with self._lock:
+            self._site = None
+            self._parsers = []
+
+    def getWindow(self, source):
+        """
+        returns the beginning of a (text) source or an open file object;
+        the window is read from a file object, nothing is read again
+        afterwards unless it is a PeekableReader (see sniff)
+        """
+        if isinstance(source, PeekableReader):
+            return source.peek(self.window)
+        if hasattr(source, 'read'):
+            return source.read(self.window)
+        return source[:self.window]
+
+    def detect(self, source):
+        """
+        returns (name, confidence) pairs for the parsers of the site which
+        might parse 'source', the most likely first; confidence is a
+        number between 0 and 1
+        """
+        window = self.getWindow(source)
+        features = Features(window)
+        candidates = []
+        for name, parser in self.getParsers():
+            detector = self.detectors.get(name)
+            if detector is not None:
+                confidence = detector(features)
+            elif parser.checkFormat(window):
+                confidence = 0.5
+            else:
+                confidence = 0
+            if confidence:
+                candidates.append((name, confidence))
+        candidates.sort(key=lambda candidate: -candidate[1])
+        return candidates
+
+    def getParser(self, source):
+        """
+        returns the parser most likely able to parse 'source' or None
+        """
+        candidates = self.detect(source)
+        if not candidates:
+            return None
+        name = candidates[0][0]
+        for other, parser in self.getParsers():
+            if other == name:
+                return parser
+
+    def sniff(self, source):
+        """
+        returns the parser most likely able to parse 'source' (or None)
+        and the source to pass to it: an open file object is wrapped in a
+        PeekableReader, so no seeking back is needed and pipes and sockets
+        can be sniffed as well
+        """
+        if hasattr(source, 'read') and \
+           not isinstance(source, PeekableReader):
+            source = PeekableReader(source)
+        return self.getParser(source), source
@@ -0,0 +1,150 @@
+"""Statistics of the stages of parsing"""
+
+# Python stuff
+import time
+import heapq
+import threading
+
+
+def _size(value):
+    """
+    the size of a source or an entry, 0 for anything not a string
+    """
+    if isinstance(value, basestring):
+        return len(value)
+    return 0
+
+
+class ParseStats(object):
+    """
+    Collects the wall time, the number of calls, the bytes (or characters)
+    going in and out and the number of entries of the stages of parsing.
+
+    Parsers only measure their stages while their 'stats' attribute is set
+    to a ParseStats, or for a single call given a ParseStats as 'stats'
+    (which keeps the calls of a shared parser apart). The stages are named after the methods doing the work:
+    'decodeSource', the BibTeX preprocessing steps ('expandMacros',
+    'transform' for bibutils, 'stripComments', 'convertChars' and
+    'stripCommands'), 'splitSource' (which includes the time of the steps
+    done while splitting a source lazily), 'parseEntry' and 'getEntries'.
+    If a callback is given it is called with the stage, the seconds, the
+    bytes in and out and the entries of every measurement, in the thread
+    doing the parsing.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._stages = {} # stage -> [calls, seconds, in, out, entries]
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, bytes_in=0, bytes_out=0, entries=0):
+        """
+        adds a measurement of 'stage'
+        """
+        with self._lock:
+            data = self._stages.get(stage)
+            if data is None:
+                data = self._stages[stage] = [0, 0.0, 0, 0, 0]
+            data[0] += 1
+            data[1] += seconds
+            data[2] += bytes_in
+            data[3] += bytes_out
+            data[4] += entries
+        if self.callback is not None:
+            self.callback(stage, seconds, bytes_in, bytes_out, entries)
+
+    def measure(self, stage, function, source, *args):
+        """
+        returns function(source, *args), adding its time and the sizes of
+        'source' and the result to 'stage'
+        """
+        started = time.time()
+        result = function(source, *args)
+        self.add(stage, time.time() - started, _size(source), _size(result))
+        return result
+
+    def get(self, stage):
+        """
+        returns the totals of a stage as a dictionary or None
+        """
+        with self._lock:
+            data = self._stages.get(stage)
+            if data is None:
+                return None
+            return dict(zip(('calls', 'seconds', 'bytes_in', 'bytes_out',
+                             'entries'), data))
+
+    def stages(self):
+        """
+        returns the names of the stages measured so far
+        """
+        with self._lock:
+            return sorted(self._stages)
+
+    def asDict(self):
+        """
+        returns the totals of all stages, keyed by stage
+        """
+        return dict([(stage, self.get(stage)) for stage in self.stages()])
+
+    def reset(self):
+        """
+        forgets all measurements
+        """
+        with self._lock:
+            self._stages.clear()
+
+
+class SlowEntrySampler(object):
+    """
+    Keeps the 'size' slowest entries parsed while a parser's 'sampler'
+    attribute is set to it, to find the entries making a source slow.
+
+    Every entry is kept with the raw text of its record as found in the
+    source (before decoding or any preprocessing), the offset of that
+    record in the source, its size, its position among the entries of the
+    source and the seconds processEntry took, so source[offset:offset+size]
+    is the record to reproduce a slow parse with. Only 'size' entries are
+    kept at a time, so a sampler can stay attached while parsing large
+    sources.
+
+    While sampling, parsers split their sources record by record (see
+    iterRawEntries), reading file objects at once. The offsets of the XML
+    parsers are those of the elements in the (uncompressed) XML bytes.
+    """
+
+    def __init__(self, size=10):
+        self.size = size
+        self._heap = [] # (seconds, position, offset, text), fastest first
+        self._lock = threading.Lock()
+
+    def add(self, seconds, entry, position, offset):
+        """
+        considers an entry which took 'seconds' to process
+        """
+        heap = self._heap
+        if len(heap) >= self.size and seconds <= heap[0][0]:
+            return
+        with self._lock:
+            item = (seconds, position, offset, entry)
+            if len(heap) < self.size:
+                heapq.heappush(heap, item)
+            elif seconds > heap[0][0]:
+                heapq.heapreplace(heap, item)
+
+    def entries(self):
+        """
+        returns the entries kept as dictionaries, the slowest first
+        """
+        with self._lock:
+            items = sorted(self._heap, reverse=True)
+        return [{'seconds': seconds, 'position': position, 'offset': offset,
+                 'size': _size(text), 'text': text}
+                for seconds, position, offset, text in items]
+
+    def reset(self):
+        """
+        forgets all entries
+        """
+        with self._lock:
+            del self._heap[:]
@@ -1,8 +1,10 @@
 import unittest
+import cPickle
 from zope.interface.verify import verifyObject
 
 from bibliograph.parsing.interfaces import IBibliographyParser
 from bibliograph.parsing.parsers.base import BibliographyParser
+from bibliograph.parsing.parsers.base import ParsedReference
 
 
 class BibliographyParserTest(unittest.TestCase):
@@ -17,7 +19,80 @@ class BibliographyParserTest(unittest.TestCase):
     def test_verify(self):
         self.failUnless(verifyObject(IBibliographyParser, BibliographyParser()))
 
+    def test_detect_encoding(self):
+        parser = BibliographyParser()
+        parser.sample_size = 8
+        self.assertEqual(parser.detectEncoding('\xef\xbb\xbfM\xc3\xbcller'),
+                         'utf-8-sig')
+        self.assertEqual(parser.detectEncoding('G\xf6ttingen, 1999'),
+                         'iso-8859-15')
+        # a character cut off by the end of the sample
+        self.assertEqual(parser.detectEncoding('Jos\xc3\xa9 M\xc3\xbcller'),
+                         'utf-8')
+
+    def test_decode_source(self):
+        parser = BibliographyParser()
+        self.assertEqual(parser.decodeSource('M\xc3\xbcller'), u'M\xfcller')
+        self.assertEqual(parser.decodeSource('M\xfcller'), u'M\xfcller')
+        source = u'M\xfcller'
+        self.failUnless(parser.decodeSource(source) is source)
+        # latin-1 only after the sample
+        parser.sample_size = 4
+        self.assertEqual(parser.decodeSource('Mark M\xfcller'),
+                         u'Mark M\xfcller')
+        self.assertEqual(parser.checkEncoding('Mark M\xfcller'),
+                         'Mark M\xc3\xbcller')
+
+class ParsedReferenceTest(unittest.TestCase):
+    '''Tests for the compact reference type'''
+
+    def setUp(self):
+        self.data = {'doi': '1-2', 'DOI': '1-2', 'title': 'A title',
+                     'TITLE': 'A  title', 'year': '2001',
+                     'publication_year': '2001', 'publication_month': '',
+                     'authors': [{'lastname': 'Ritz'}]}
+        self.ref = ParsedReference.fromDict(self.data)
+
+    def test_mapping(self):
+        self.assertEqual(self.ref, self.data)
+        self.assertEqual(sorted(self.ref.keys()), sorted(self.data.keys()))
+        self.assertEqual(dict(**self.ref), self.data)
+        self.assertEqual(self.ref['TITLE'], 'A  title')
+        self.assertEqual(self.ref.get('publication_month'), '')
+        self.assertEqual(self.ref.get('Doi'), '1-2')
+        self.assertEqual(self.ref.get('volume', 'none'), 'none')
+        self.failUnless(self.ref.has_key('DOI'))
+        self.failIf('volume' in self.ref)
+
+    def test_compact(self):
+        self.assertEqual(len(self.ref._values), 5)
+        other = ParsedReference.fromDict(dict(self.data, title='B'))
+        self.failUnless(other._layout is self.ref._layout)
+
+    def test_setitem_and_pickle(self):
+        self.ref['year'] = '2002'
+        self.assertEqual(self.ref['year'], '2002')
+        self.assertEqual(self.ref['publication_year'], '2001')
+        self.assertEqual(cPickle.loads(cPickle.dumps(self.ref, 2)), self.ref)
+
+    def test_max_layouts(self):
+        max_layouts = ParsedReference._max_layouts
+        ParsedReference._max_layouts = len(ParsedReference._layouts)
+        try:
+            other = ParsedReference.fromDict(dict(self.data, title='B'))
+            self.failUnless(other._layout is self.ref._layout)
+            # new layouts past the cap are not worth it
+            data = dict(self.data, volume='3')
+            self.assertEqual(type(ParsedReference.fromDict(data)), dict)
+            self.ref['volume'] = '3'
+            self.assertEqual(self.ref, data)
+            self.assertEqual(len(ParsedReference._layouts),
+                             ParsedReference._max_layouts)
+        finally:
+            ParsedReference._max_layouts = max_layouts
+
 def test_suite():
     suite = unittest.TestSuite([
-        unittest.makeSuite(BibliographyParserTest),])
+        unittest.makeSuite(BibliographyParserTest),
+        unittest.makeSuite(ParsedReferenceTest),])
     return suite
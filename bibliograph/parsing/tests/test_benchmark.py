@@ -0,0 +1,74 @@
+import os
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+
+from bibliograph.parsing.benchmark.corpus import CorpusGenerator, formats
+from bibliograph.parsing.benchmark.runner import parsers, runBenchmarks
+from bibliograph.parsing.benchmark.runner import writeResults
+
+
+class CorpusGeneratorTest(unittest.TestCase):
+
+    def test_formats(self):
+        generator = CorpusGenerator(authors=2, special_density=0.5)
+        for format, name in formats.items():
+            source = generator.generate(format, 5)
+            parser = parsers[name]()
+            entries = parser.getEntries(source)
+            self.assertEqual(len(entries), 5, format)
+            self.assertEqual(len(entries[0]['authors']), 2, format)
+            self.failUnless(entries[0]['title'], format)
+            self.failUnless(entries[4]['publication_year'], format)
+
+    def test_reproducible(self):
+        self.assertEqual(CorpusGenerator(seed=1).generate('bibtex', 3),
+                         CorpusGenerator(seed=1).generate('bibtex', 3))
+        self.assertNotEqual(CorpusGenerator(seed=1).generate('ris', 3),
+                            CorpusGenerator(seed=2).generate('ris', 3))
+
+    def test_macros(self):
+        source = CorpusGenerator(macros=3).generate('bibtex', 10)
+        self.assertEqual(source.count('@String'), 3)
+        entries = parsers['bibtex']().getEntries(source)
+        self.failIf([e for e in entries if e['journal'].startswith('j')])
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_report(self):
+        report = runBenchmarks(['bibtex', 'medline'], [3], repeat=1)
+        self.assertEqual([(r['format'], r['parsed'])
+                          for r in report['results']],
+                         [('bibtex', 3), ('medline', 3)])
+        self.failUnless('convertChars' in report['results'][0]['stages'])
+        self.failUnless('parseEntry' in report['results'][1]['stages'])
+
+        path = os.path.join(self.directory, 'results.json')
+        writeResults(report, path)
+        self.assertEqual(json.load(open(path))['results'][1]['entries'], 3)
+        path = os.path.join(self.directory, 'results.csv')
+        writeResults(report, path)
+        rows = list(csv.DictReader(open(path)))
+        self.assertEqual(rows[0]['format'], 'bibtex')
+        self.assertEqual(rows[1]['convertChars'], '')
+
+    def test_mapped(self):
+        report = runBenchmarks(['ris'], [4], repeat=1, mapped=True)
+        self.assertEqual(report['results'][0]['parsed'], 4)
+        self.failUnless('splitSource' in report['results'][0]['stages'])
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(CorpusGeneratorTest),
+        unittest.makeSuite(BenchmarkTest),])
+    return suite
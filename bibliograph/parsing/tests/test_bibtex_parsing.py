@@ -10,9 +10,11 @@
 # http://www.logilab.fr/ -- mailto:contact@logilab.fr #
 #                                                     #
 #######################################################
+import os
+import tempfile
 import unittest
 
-from bibliograph.parsing.parsers.bibtex import BibtexParser
+from bibliograph.parsing.parsers.bibtex import BibtexParser, getLaTeXConverter
 from bibliograph.parsing.tests import setup
 from bibliograph.parsing.tests.base import TestEntries
 
@@ -139,6 +141,99 @@ class TestBibtexParsing2(unittest.TestCase):
         r = results[1]
         self.assertEqual(r['address'], unicode('Gttingen', 'iso-8859-15').encode('utf-8'))
         
+    def testStripComments(self):
+        source = ('% a comment\n@Book{a, title = {Brace \\} inside}}'
+                  ' between entries\n@Misc{b, note = {x}}')
+        self.assertEqual(self.parser.stripComments(source),
+                         '@Book{a, title = {Brace \\} inside}}\n'
+                         '@Misc{b, note = {x}}\n')
+
+    def testSplitSourceKeepsEntriesTogether(self):
+        source = ('@Misc{a, note = {{first} @second},\n  year = 2001}\n'
+                  '@Misc{b, year = 2002}\n')
+        results = self.parser.getEntries(source)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['note'], 'first @second')
+        self.assertEqual(results[1]['pid'], 'b')
+
+    def testConvertLaTeX2UnicodeLongestMatch(self):
+        source = "{\\'{\\i}} M{\\\"u}ller $\\alpha$ {\\ss}"
+        self.assertEqual(self.parser.convertLaTeX2Unicode(source),
+                         u'\xed M\xfcller \u03b1 \xdf'.encode('utf-8'))
+        self.failUnless(getLaTeXConverter() is getLaTeXConverter())
+
+    def testStringMacros(self):
+        source = ('@String{jgg = "Journal of {G}enetics"}\n'
+                  '@STRING{pre = {Proc. of }}\n'
+                  '@string(conf = pre # "Conf")\n'
+                  '@Article{a,\n  journal = jgg,\n'
+                  '  booktitle = conf # { 2001},\n'
+                  '  title = {On jgg},\n  month = Mar\n}\n')
+        results = self.parser.getEntries(source)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['journal'], 'Journal of Genetics')
+        self.assertEqual(results[0]['booktitle'], 'Proc. of Conf 2001')
+        self.assertEqual(results[0]['title'], 'On jgg')
+        self.assertEqual(results[0]['month'], 'Mar')
+
+    def testIterEntriesFromFile(self):
+        source = open(setup.IDCOOKING_TEST_BIB, 'r').read()
+        expected = self.parser.getEntries(source)
+        self.parser.chunk_size = 100
+        results = list(self.parser.iterEntries(open(setup.IDCOOKING_TEST_BIB, 'r')))
+        self.assertEqual(results, expected)
+        batches = list(self.parser.getEntryBatches(source, 4))
+        self.assertEqual([len(b) for b in batches], [4, 2])
+        self.assertEqual(batches[0] + batches[1], expected)
+
+    def testParallelGetEntries(self):
+        source = open(setup.IDCOOKING_TEST_BIB, 'r').read()
+        self.assertEqual(self.parser.getEntries(source, workers=2),
+                         self.parser.getEntries(source))
+
+    def testCompactEntries(self):
+        source = open(setup.BIBTEX_TEST_BIB, 'r').read()
+        expected = self.parser.getEntries(source)
+        self.parser.compact = True
+        results = self.parser.getEntries(source)
+        self.assertEqual(results, expected)
+        self.assertEqual(results[2]['DOI'], '1-23-345')
+
+    def testGetEntriesFromFile(self):
+        for source_file in (setup.IDCOOKING_TEST_BIB, setup.BIBTEX_TEST_BIB3):
+            expected = self.parser.getEntries(open(source_file, 'r').read())
+            self.assertEqual(self.parser.getEntriesFromFile(source_file),
+                             expected)
+        # a run of entries per decoding, macros are still known
+        self.parser.chunk_size = 10
+        fd, path = tempfile.mkstemp('.bib')
+        os.write(fd, '@String{jgg = "Journal of {G}enetics"}\n'
+                     '@Article{a, journal = jgg}\n@Article{b, journal = jgg}\n')
+        os.close(fd)
+        try:
+            results = self.parser.getEntriesFromFile(path)
+        finally:
+            os.remove(path)
+        self.assertEqual([r['journal'] for r in results],
+                         ['Journal of Genetics', 'Journal of Genetics'])
+
+    def testIterFileSourceHugeEntry(self):
+        abstract = ' '.join(['word'] * 20000)
+        source = '@Article{huge, abstract = {%s}}\n@Article{small}\n' % abstract
+        reads = []
+        class Reader(object):
+            position = 0
+            def read(self, size):
+                reads.append(size)
+                data = source[self.position:self.position + size]
+                self.position += len(data)
+                return data
+        self.parser.chunk_size = 100
+        results = list(self.parser.iterEntries(Reader()))
+        self.assertEqual([r['pid'] for r in results], ['huge', 'small'])
+        self.assertEqual(len(results[0]['abstract']), len(abstract))
+        # the chunks grow instead of the entry being scanned 1000 times
+        self.failUnless(len(reads) < 20, len(reads))
 
 
 def test_suite():
@@ -0,0 +1,205 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from bibliograph.parsing.cache import ParseResultCache, EntryCache
+from bibliograph.parsing.parsers.bibtex import BibtexParser
+from bibliograph.parsing.parsers.medline import MedlineParser
+from bibliograph.parsing.tests import setup
+
+
+class ParseResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.parser = BibtexParser()
+        self.source = open(setup.BIBTEX_TEST_BIB, 'r').read()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_hit_skips_parsing(self):
+        self.parser.cache = ParseResultCache()
+        expected = self.parser.getEntries(self.source)
+        self.parser.parseEntry = None # would fail if called again
+        self.assertEqual(self.parser.getEntries(self.source), expected)
+        self.assertEqual(self.parser.cache.hits, 1)
+        self.assertEqual(self.parser.cache.misses, 1)
+
+    def test_hits_are_copies(self):
+        self.parser.cache = ParseResultCache()
+        self.parser.getEntries(self.source)[0]['title'] = 'changed'
+        self.assertNotEqual(self.parser.getEntries(self.source)[0]['title'],
+                            'changed')
+
+    def test_key(self):
+        cache = ParseResultCache()
+        key = cache.makeKey(self.parser, self.source)
+        self.assertEqual(key, cache.makeKey(BibtexParser(), self.source))
+        self.assertNotEqual(key, cache.makeKey(MedlineParser(), self.source))
+        self.assertNotEqual(key, cache.makeKey(self.parser, self.source + ' '))
+        compact = BibtexParser()
+        compact.compact = True
+        self.assertNotEqual(key, cache.makeKey(compact, self.source))
+
+    def test_shared_by_compact_parser(self):
+        self.parser.cache = ParseResultCache()
+        compact = BibtexParser()
+        compact.compact = True
+        compact.cache = self.parser.cache
+        self.failUnless(isinstance(self.parser.getEntries(self.source)[0],
+                                   dict))
+        self.failIf(isinstance(compact.getEntries(self.source)[0], dict))
+
+    def test_shared_by_unicode_parser(self):
+        self.parser.cache = ParseResultCache()
+        other = BibtexParser()
+        other.encoding = None
+        other.cache = self.parser.cache
+        self.failUnless(isinstance(self.parser.getEntries(self.source)[0]
+                                   ['title'], str))
+        self.failUnless(isinstance(other.getEntries(self.source)[0]['title'],
+                                   unicode))
+
+    def test_lru_eviction(self):
+        cache = ParseResultCache(max_items=2)
+        cache.set('a', [1])
+        cache.set('b', [2])
+        cache.get('a')
+        cache.set('c', [3])
+        self.assertEqual(cache.get('a'), [1])
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), [3])
+
+    def test_disk_tier(self):
+        cache = ParseResultCache(directory=self.directory)
+        cache.set('a', [1])
+        # a fresh cache only finds the item on disk
+        cache = ParseResultCache(directory=self.directory)
+        self.assertEqual(cache.get('a'), [1])
+
+    def test_corrupt_disk_item(self):
+        self.parser.cache = ParseResultCache(directory=self.directory)
+        expected = self.parser.getEntries(self.source)
+        path = os.path.join(self.directory, os.listdir(self.directory)[0])
+        data = open(path, 'rb').read()
+        open(path, 'wb').write(data[:len(data) // 2])
+        self.parser.cache = ParseResultCache(directory=self.directory)
+        self.assertEqual(self.parser.getEntries(self.source), expected)
+        self.assertEqual(self.parser.cache.misses, 1)
+        # parsed again and stored in one piece
+        self.assertEqual(open(path, 'rb').read(), data)
+
+    def test_disk_eviction(self):
+        cache = ParseResultCache(directory=self.directory, max_disk_size=1)
+        cache.set('a', [1])
+        self.assertEqual(os.listdir(self.directory), [])
+        cache = ParseResultCache(directory=self.directory, max_age=60)
+        cache.set('a', [1])
+        path = os.path.join(self.directory, 'a.pickle')
+        os.utime(path, (time.time() - 120, time.time() - 120))
+        cache._items.clear()
+        self.assertEqual(cache.get('a'), None)
+        self.failIf(os.path.exists(path))
+
+
+class EntryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = BibtexParser()
+        self.source = open(setup.BIBTEX_TEST_BIB, 'r').read()
+
+    def test_unchanged_entries_are_not_parsed(self):
+        cache = EntryCache()
+        expected = cache.getEntries(self.parser, self.source)
+        self.assertEqual(expected, self.parser.getEntries(self.source))
+        parsed = []
+        parseEntry = self.parser.parseEntry
+        def countingParseEntry(entry):
+            parsed.append(entry)
+            return parseEntry(entry)
+        self.parser.parseEntry = countingParseEntry
+        source = self.source.replace('Programming Python.', 'Python')
+        results = cache.getEntries(self.parser, source)
+        self.assertEqual(len(parsed), 1)
+        self.assertEqual(results[0]['title'], 'Python')
+        self.assertEqual(results[1:], expected[1:])
+
+    def test_changes(self):
+        cache = EntryCache()
+        cache.getEntries(self.parser, self.source)
+        self.assertEqual(cache.getChanges()['added'],
+                         ['Lattier2001', 'Lutz2001', 'McKay2003'])
+        source = self.source.replace('Programming Python.', 'Python')
+        source = source.replace('Lattier2001', 'Latteier2001')
+        cache.getEntries(self.parser, source)
+        self.assertEqual(cache.getChanges(),
+                         {'added': ['Latteier2001'],
+                          'changed': ['Lutz2001'],
+                          'removed': ['Lattier2001'],
+                          'duplicates': []})
+
+    def test_duplicate_pids(self):
+        cache = EntryCache()
+        cache.getEntries(self.parser, self.source)
+        source = self.source.replace('McKay2003', 'Lutz2001')
+        cache.getEntries(self.parser, source)
+        changes = cache.getChanges()
+        self.assertEqual(changes['duplicates'], ['Lutz2001'])
+        self.assertEqual(changes['changed'], ['Lutz2001'])
+        self.assertEqual(changes['removed'], ['McKay2003'])
+
+    def test_parser_settings(self):
+        cache = EntryCache()
+        cache.getEntries(self.parser, self.source)
+        other = BibtexParser()
+        other.encoding = None
+        entries = cache.getEntries(other, self.source)
+        self.failUnless(isinstance(entries[0]['title'], unicode))
+        entries = cache.getEntries(MedlineParser(), self.source)
+        self.assertEqual(entries, MedlineParser().getEntries(self.source))
+
+    def test_compact_changes(self):
+        self.parser.compact = True
+        cache = EntryCache()
+        cache.getEntries(self.parser, self.source)
+        self.assertEqual(cache.getChanges()['added'],
+                         ['Lattier2001', 'Lutz2001', 'McKay2003'])
+        source = self.source.replace('Programming Python.', 'Python')
+        cache.getEntries(self.parser, source)
+        self.assertEqual(cache.getChanges()['changed'], ['Lutz2001'])
+
+    def test_corrupt_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'entries')
+            open(path, 'wb').write('\x80\x02}q')
+            cache = EntryCache(path)
+            self.assertEqual(cache.getEntries(self.parser, self.source),
+                             self.parser.getEntries(self.source))
+            self.assertEqual(len(cache.getChanges()['added']), 3)
+            self.assertEqual(len(EntryCache(path)._pids), 3)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_persistence(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'entries')
+            EntryCache(path).getEntries(self.parser, self.source)
+            cache = EntryCache(path)
+            cache.getEntries(self.parser, self.source)
+            self.assertEqual(cache.getChanges(),
+                             {'added': [], 'changed': [], 'removed': [],
+                              'duplicates': []})
+        finally:
+            shutil.rmtree(directory)
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(ParseResultCacheTest),
+        unittest.makeSuite(EntryCacheTest),])
+    return suite
@@ -0,0 +1,63 @@
+import unittest
+
+from bibliograph.parsing.duplicates import DuplicateFinder, findDuplicates
+from bibliograph.parsing.duplicates import normalizeISBN, normalizeText
+from bibliograph.parsing.parsers.base import EntryParseError, ParsedReference
+from bibliograph.parsing.parsers.bibtex import BibtexParser
+from bibliograph.parsing.tests import setup
+
+
+class DuplicateFinderTest(unittest.TestCase):
+
+    def test_normalize(self):
+        self.assertEqual(normalizeText('Der F\xc3\xbcrst:  \xc3\x89tude!'),
+                         u'der furst etude')
+        self.assertEqual(normalizeISBN('3-87440-243-6'), '9783874402439')
+        self.assertEqual(normalizeISBN('978-3-87440-243-9'), '9783874402439')
+        self.assertEqual(normalizeISBN('n/a'), None)
+
+    def test_samples(self):
+        source = open(setup.BIBTEX_TEST_BIB, 'r').read() + \
+                 open(setup.BIBTEX_TEST_BIB_DUP, 'r').read()
+        entries = BibtexParser().getEntries(source)
+        self.assertEqual(findDuplicates(entries), [[0, 3]])
+
+    def test_keys(self):
+        entries = [
+            {'title': 'Programming  Python.', 'publication_year': '2001',
+             'authors': [{'lastname': 'Lutz'}]},
+            {'title': 'Other', 'doi': 'doi:10.1002/X'},
+            EntryParseError('Bibtex Parser Error: malformed first line.'),
+            ParsedReference.fromDict({'title': 'programming python',
+                                      'publication_year': '2001',
+                                      'authors': [{'lastname': u'Lutz'}]}),
+            {'title': 'Different', 'identifiers': [
+                {'label': 'DOI', 'value': 'http://dx.doi.org/10.1002/x'},
+                {'label': 'ISBN', 'value': '3874402436'}]},
+            {'title': 'Again different', 'isbn': '978-3-87440-243-9'},
+            {'title': 'Programming Python', 'publication_year': '2002',
+             'authors': [{'lastname': 'Lutz'}]},
+            ]
+        self.assertEqual(findDuplicates(iter(entries)), [[0, 3], [1, 4, 5]])
+        finder = DuplicateFinder(use_identifiers=False)
+        self.assertEqual(finder.findClusters(entries), [[0, 3]])
+
+    def test_parts(self):
+        # the chapters of a book share its ISBN but are no duplicates
+        entries = [{'reference_type': 'BookReference', 'title': 'Volume',
+                    'isbn': '3874402436'},
+                   {'reference_type': 'IncollectionReference',
+                    'title': 'First chapter', 'isbn': '3874402436'},
+                   {'reference_type': 'IncollectionReference',
+                    'title': 'Second chapter', 'isbn': '3874402436'},
+                   {'reference_type': 'IncollectionReference',
+                    'title': 'Second chapter', 'isbn': '3874402436'},
+                   {'reference_type': 'BookReference', 'title': 'Volume.',
+                    'isbn': '978-3-87440-243-9'}]
+        self.assertEqual(findDuplicates(entries), [[0, 4], [2, 3]])
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(DuplicateFinderTest),])
+    return suite
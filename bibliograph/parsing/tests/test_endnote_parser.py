@@ -73,6 +73,27 @@ please make sure bibutils is installed to run all tests. """
         self.failIf(self.parser.checkFormat(s1), 
                         'Endnote Parser incorrectly accepted RIS format')
 
+    def test_parse_without_bibutils(self):
+        source = ('%0 Book Section\r\n%A Franks, L. M.\r\n%D 1991\r\n'
+                  '%T Preface by an\r\nAIDS Victim\r\n%B Cancer, HIV and AIDS\r\n'
+                  '%P vii-viii\r\n%@ 0-679-40110-5\r\n%K HIV\r\nAIDS\r\n')
+        entries = self.parser.getEntries(source)
+        self.assertEqual(len(entries), 1)
+        entry = entries[0]
+        self.assertEqual(entry['reference_type'], 'IncollectionReference')
+        self.assertEqual(entry['pid'], 'Franks1991')
+        self.assertEqual(entry['title'], 'Preface by an AIDS Victim')
+        self.assertEqual(entry['booktitle'], 'Cancer, HIV and AIDS')
+        self.assertEqual(entry['pages'], 'vii--viii')
+        self.assertEqual(entry['keywords'], ['HIV', 'AIDS'])
+        self.assertEqual(entry['identifiers'],
+                         [{'label': 'ISBN', 'value': '0-679-40110-5'}])
+
+        expected = self.parser.getEntries(open(setup.ENDNOTE_TEST_SOURCE).read())
+        entries = self.parser.iterEntries(open(setup.ENDNOTE_TEST_SOURCE))
+        self.assertEqual(list(entries), expected)
+
+
 def test_suite():
     suite = unittest.TestSuite([
         unittest.makeSuite(TestEndNoteParser),])
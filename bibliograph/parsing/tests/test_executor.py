@@ -0,0 +1,117 @@
+import time
+import threading
+import unittest
+
+from bibliograph.parsing.executor import ParseExecutor
+from bibliograph.parsing.parsers.bibtex import BibtexParser
+from bibliograph.parsing.parsers.medline import MedlineParser
+from bibliograph.parsing.tests import setup
+
+
+class SlowParser(MedlineParser):
+    """ waits for 'release' before parsing each entry """
+
+    def __init__(self, release, delay=0.0):
+        MedlineParser.__init__(self)
+        self.release = release
+        self.delay = delay
+        self.running = 0
+        self.most = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def processEntry(self, entry):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.most = max(self.most, self.running)
+        try:
+            self.release.wait()
+            time.sleep(self.delay)
+            return MedlineParser.processEntry(self, entry)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class ParseExecutorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.source = open(setup.MEDLINE_TEST_MED, 'r').read()
+        self.expected = MedlineParser().getEntries(self.source)
+
+    def test_getEntries(self):
+        parser = MedlineParser()
+        job = parser.agetEntries(self.source)
+        self.assertEqual(job.getResult(5), self.expected)
+        done = []
+        job.addCallback(done.append)
+        self.assertEqual(done, [job])
+        stream = parser.aiterEntries(self.source, buffer=1)
+        self.assertEqual(list(stream), self.expected)
+
+    def test_concurrency(self):
+        release = threading.Event()
+        parser = SlowParser(release, delay=0.01)
+        executor = ParseExecutor(workers=2)
+        jobs = [executor.getEntries(parser, self.source) for i in range(4)]
+        time.sleep(0.1)
+        release.set()
+        for job in jobs:
+            self.assertEqual(job.getResult(10), self.expected)
+        self.assertEqual(parser.most, 2)
+
+    def test_timeout(self):
+        release = threading.Event()
+        executor = ParseExecutor(workers=1, timeout=0.1)
+        job = executor.getEntries(SlowParser(release), self.source)
+        queued = executor.getEntries(BibtexParser(), '')
+        self.assertRaises(RuntimeError, job.getResult)
+        self.failUnless(job.cancelled)
+        release.set()
+        # the job queued behind is dropped once it is too late
+        self.assertRaises(RuntimeError, queued.getResult)
+        self.assertEqual(executor.getEntries(MedlineParser(), self.source,
+                                             timeout=5).getResult(),
+                         self.expected)
+
+    def test_stream_errors(self):
+        class BrokenParser(MedlineParser):
+            def processEntry(self, entry):
+                raise ValueError(entry)
+        stream = ParseExecutor().iterEntries(BrokenParser(), self.source)
+        self.assertRaises(ValueError, list, stream)
+        release = threading.Event()
+        stream = ParseExecutor(timeout=0.1).iterEntries(SlowParser(release),
+                                                        self.source)
+        self.assertRaises(RuntimeError, list, stream)
+        release.set()
+
+    def test_abandoned_stream(self):
+        executor = ParseExecutor(workers=1)
+        for entry in executor.iterEntries(MedlineParser(), self.source,
+                                          buffer=1):
+            break
+        # the worker is free for the next job
+        self.assertEqual(executor.getEntries(MedlineParser(),
+                                             self.source).getResult(3),
+                         self.expected)
+
+    def test_cancelled_job_stops(self):
+        release = threading.Event()
+        parser = SlowParser(release)
+        executor = ParseExecutor(workers=1)
+        job = executor.getEntries(parser, self.source + self.source,
+                                  timeout=0.1)
+        self.assertRaises(RuntimeError, job.getResult)
+        release.set()
+        self.assertEqual(executor.getEntries(MedlineParser(),
+                                             self.source).getResult(3),
+                         self.expected)
+        self.failUnless(parser.calls < 2 * len(self.expected))
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(ParseExecutorTest),])
+    return suite
@@ -0,0 +1,88 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from bibliograph.parsing.index import CiteKeyIndex
+from bibliograph.parsing.parsers.bibtex import BibtexParser
+from bibliograph.parsing.tests import setup
+
+
+class CiteKeyIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'master.bib')
+        source = ''.join([open(name, 'r').read() for name in
+                          (setup.IDCOOKING_TEST_BIB, setup.BIBTEX_TEST_BIB,
+                           setup.BIBTEX_TEST_BIB_DUP)])
+        self.write(source)
+        self.entries = BibtexParser().getEntries(source)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, source):
+        f = open(self.path, 'w')
+        f.write(source)
+        f.close()
+
+    def test_lookup(self):
+        index = CiteKeyIndex(self.path)
+        self.assertEqual(len(index), 9)
+        for entry in self.entries:
+            self.failUnless(entry['pid'] in index)
+            self.failUnless(entry in index.getEntries([entry['pid']]))
+        self.assertEqual(index.getEntry('Dolnik2005'), self.entries[1])
+        self.assertEqual(index.getEntry('unknown'), None)
+        offset, length, digest = index.lookup(u'Dolnik2005')[0]
+        self.assertEqual(open(self.path).read()[offset], '@')
+
+    def test_duplicates(self):
+        index = CiteKeyIndex(self.path)
+        self.assertEqual(index.getDuplicates().keys(), ['Lutz2001'])
+        self.assertEqual(len(index.getEntries(['Lutz2001'])), 2)
+
+    def test_sidecar(self):
+        CiteKeyIndex(self.path).update()
+        self.failUnless(os.path.exists(self.path + '.idx'))
+        index = CiteKeyIndex(self.path)
+        index.build = None # would fail if called
+        self.assertEqual(index.getEntry('Dolnik2005'), self.entries[1])
+
+    def test_invalidation(self):
+        index = CiteKeyIndex(self.path)
+        index.update()
+        time.sleep(0.01)
+        self.write('@String{jgg = "Journal of {G}enetics"}\n'
+                   '@Article{new, journal = jgg}\n')
+        self.failIf(index.isCurrent())
+        self.assertEqual(index.keys(), ['new'])
+        self.assertEqual(index.getEntry('new')['journal'],
+                         'Journal of Genetics')
+        # a change the file's size and time don't tell
+        stat = os.stat(self.path)
+        self.write('@String{jgg = "Journal of {G}enetics"}\n'
+                   '@Article{new, journal = {x}}\n')
+        os.utime(self.path, (stat.st_atime, stat.st_mtime))
+        self.assertEqual(index.getEntry('new')['journal'], 'x')
+
+    def test_parenthesized_string(self):
+        source = ('@string(jgg = "Journal of (G)enetics")\n'
+                  '@Article{a, journal = jgg, title = {(Open}}\n'
+                  '@Article{b, journal = jgg, title = {Closed)}}\n')
+        self.write(source)
+        entries = BibtexParser().getEntries(source)
+        index = CiteKeyIndex(self.path)
+        self.assertEqual(sorted(index.keys()), ['a', 'b'])
+        self.assertEqual(index.getEntry('a'), entries[0])
+        self.assertEqual(index.getEntry('b'), entries[1])
+        self.assertEqual(index.getEntry('b')['journal'],
+                         'Journal of (G)enetics')
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(CiteKeyIndexTest),])
+    return suite
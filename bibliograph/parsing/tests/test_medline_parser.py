@@ -45,6 +45,57 @@ class TestMedlineParser(unittest.TestCase):
         self.failIf(self.parser.checkFormat(s3), 
                     'Medline Parser incorrectly accepted EndNote format')
 
+    def test_iter_entries(self):
+        source = open(setup.MEDLINE_TEST_MED, 'r').read()
+        expected = self.parser.getEntries(source)
+        # the blank lines between records don't give empty entries
+        self.assertEqual(len(expected), 4)
+        self.parser.chunk_size = 100
+        entries = list(self.parser.iterEntries(open(setup.MEDLINE_TEST_MED)))
+        self.assertEqual(entries, expected)
+        self.assertEqual(entries[0]['title'],
+                         'Molecular genetic evidence for parthenogenesis in '
+                         'the Burmese python, Python molurus bivittatus.')
+
+    def test_short_author_names(self):
+        source = ('PMID- 1\nTI  - A title\nAU  - Groot TV\nAU  - Bruins E\n'
+                  'PT  - Journal Article\n')
+        entry = self.parser.getEntries(source)[0]
+        self.assertEqual(entry['reference_type'], 'ArticleReference')
+        self.assertEqual([a['lastname'] for a in entry['authors']],
+                         ['Groot', 'Bruins'])
+        self.assertEqual(entry['authors'][0]['middlename'], 'V')
+        # the short names are not even split if there are full ones
+        source = ('PMID- 2\nTI  - A title\nFAU - Groot, Tom V\n'
+                  'AU  - Anonymous\n')
+        entry = self.parser.getEntries(source)[0]
+        self.assertEqual([a['lastname'] for a in entry['authors']],
+                         ['Groot'])
+
+    def test_unicode_entries(self):
+        source = open(setup.MEDLINE_TEST_MED, 'r').read()
+        expected = self.parser.getEntries(source)
+        self.parser.encoding = None
+        entries = self.parser.getEntries(source)
+        self.assertEqual(len(entries), len(expected))
+        self.failUnless(isinstance(entries[0]['title'], unicode))
+        self.failUnless(isinstance(entries[0]['authors'][0]['lastname'],
+                                   unicode))
+        self.assertEqual(entries[0]['title'].encode('utf-8'),
+                         expected[0]['title'])
+
+    def test_entries_from_file(self):
+        expected = self.parser.getEntries(open(setup.MEDLINE_TEST_MED).read())
+        self.parser.chunk_size = 100
+        self.assertEqual(self.parser.getEntriesFromFile(setup.MEDLINE_TEST_MED),
+                         expected)
+
+    def test_unicode_source(self):
+        source = u'PMID- 1\nTI  - M\xfcller\n\nPMID- 2\nTI  - \u03b1\n'
+        entries = self.parser.getEntries(source)
+        self.assertEqual([e['title'] for e in entries],
+                         ['M\xc3\xbcller', '\xce\xb1'])
+
 def test_suite():
     suite = unittest.TestSuite([
         unittest.makeSuite(TestMedlineParser),])
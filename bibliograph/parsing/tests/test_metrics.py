@@ -0,0 +1,91 @@
+import threading
+import unittest
+
+from bibliograph.parsing.metrics import MetricsRegistry
+from bibliograph.parsing.metrics import enableMetrics, disableMetrics
+from bibliograph.parsing.cache import ParseResultCache
+from bibliograph.parsing.parsers.bibtex import BibtexParser
+from bibliograph.parsing.parsers.medline import MedlineParser
+from bibliograph.parsing.tests import setup
+
+
+class MetricsRegistryTest(unittest.TestCase):
+
+    def test_expose(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('parsed_total', 'Parsed.', ('parser',))
+        counter.inc(2, 'bibtex')
+        counter.inc(1, 'med"line')
+        histogram = registry.histogram('seconds', 'Time.', buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(2)
+        self.failUnless(registry.counter('parsed_total', 'Parsed.')
+                        is counter)
+        self.assertRaises(ValueError, registry.histogram, 'parsed_total', '')
+        self.assertEqual(registry.expose(),
+                         '# HELP parsed_total Parsed.\n'
+                         '# TYPE parsed_total counter\n'
+                         'parsed_total{parser="bibtex"} 2\n'
+                         'parsed_total{parser="med\\"line"} 1\n'
+                         '# HELP seconds Time.\n'
+                         '# TYPE seconds histogram\n'
+                         'seconds_bucket{le="0.1"} 1\n'
+                         'seconds_bucket{le="1"} 2\n'
+                         'seconds_bucket{le="+Inf"} 3\n'
+                         'seconds_sum 2.55\n'
+                         'seconds_count 3\n')
+
+    def test_threads(self):
+        counter = MetricsRegistry().counter('calls_total', 'Calls.')
+        def work():
+            for i in range(1000):
+                counter.inc()
+        threads = [threading.Thread(target=work) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(counter.get(), 8000)
+
+
+class ParserMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.metrics = enableMetrics(self.registry)
+
+    def tearDown(self):
+        disableMetrics()
+
+    def test_parse(self):
+        parser = BibtexParser()
+        source = open(setup.BIBTEX_TEST_BIB, 'r').read()
+        entries = parser.getEntries(source)
+        self.assertEqual(self.metrics.entries.get('bibtex'), len(entries))
+        self.assertEqual(self.metrics.failures.get('bibtex'), 0)
+        self.assertEqual(self.metrics.seconds.get('bibtex')[1], 1)
+        self.failUnless(self.metrics.bytes.get('bibtex') > 0)
+        parser.getEntries('@Article{\n title = {Malformed},\n}\n'
+                          '@Book{ok,\n title = {Fine},\n}\n')
+        self.assertEqual(self.metrics.entries.get('bibtex'),
+                         len(entries) + 2)
+        self.assertEqual(self.metrics.failures.get('bibtex'), 1)
+        self.failUnless('bibliograph_parser_entries_total{parser="bibtex"}'
+                        in self.registry.expose())
+
+    def test_cache(self):
+        parser = MedlineParser()
+        parser.cache = ParseResultCache()
+        source = open(setup.MEDLINE_TEST_MED, 'r').read()
+        parser.getEntries(source)
+        parser.getEntries(source)
+        self.assertEqual(self.metrics.cache.get('result', 'miss'), 1)
+        self.assertEqual(self.metrics.cache.get('result', 'hit'), 1)
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(MetricsRegistryTest),
+        unittest.makeSuite(ParserMetricsTest),])
+    return suite
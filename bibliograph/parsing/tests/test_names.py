@@ -0,0 +1,52 @@
+import unittest
+
+from bibliograph.parsing.names import NameMemo
+from bibliograph.parsing.parsers.bibtex import BibtexParser
+
+
+class NameMemoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.memo = NameMemo(max_size=2)
+
+    def parse(self, raw):
+        self.calls.append(raw)
+        first, last = raw.split()
+        return first, '', last
+
+    def test_memoized(self):
+        a = self.memo.getName('Raphael Ritz', self.parse)
+        b = self.memo.getName('Raphael Ritz', self.parse)
+        self.assertEqual(a, {'firstname': 'Raphael', 'middlename': '',
+                             'lastname': 'Ritz'})
+        self.assertEqual(a, b)
+        self.failIf(a is b)
+        self.failUnless(a['lastname'] is b['lastname'])
+        self.assertEqual(self.calls, ['Raphael Ritz'])
+
+    def test_shared_components(self):
+        a = self.memo.getName('Raphael Ritz', self.parse)
+        b = self.memo.getName('Ute ' + 'Ritz', self.parse)
+        self.failUnless(a['lastname'] is b['lastname'])
+
+    def test_bounded(self):
+        for raw in ('A B', 'C D', 'E F'):
+            self.memo.getName(raw, self.parse)
+        self.failUnless(len(self.memo._names) <= 2)
+
+    def test_bibtex_authors(self):
+        parser = BibtexParser()
+        source = ('@Misc{a, author = {Carneiro, Pedro and James J. Heckman}}\n'
+                  '@Misc{b, author = {James J. Heckman}}\n')
+        a, b = parser.getEntries(source)
+        self.assertEqual(a['authors'][1], b['authors'][0])
+        self.assertEqual(b['authors'][0], {'firstname': 'James',
+                                           'middlename': 'J.',
+                                           'lastname': 'Heckman'})
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(NameMemoTest),])
+    return suite
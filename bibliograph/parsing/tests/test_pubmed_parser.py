@@ -0,0 +1,105 @@
+import gzip
+import unittest
+from cStringIO import StringIO
+from zope.interface.verify import verifyObject
+
+from bibliograph.parsing.tests import setup
+from bibliograph.parsing.parsers.medline import MedlineParser
+from bibliograph.parsing.parsers.pubmed import PubmedXMLParser
+from bibliograph.parsing.interfaces import IBibliographyParser
+
+class Unseekable(object):
+    """ a file object like a socket """
+
+    def __init__(self, data):
+        self.data = StringIO(data)
+
+    def read(self, size=-1):
+        return self.data.read(size)
+
+
+class TestPubmedXMLParser(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = PubmedXMLParser()
+
+    def test_parser_contract(self):
+        self.failUnless(IBibliographyParser.providedBy(self.parser))
+        self.failUnless(verifyObject(IBibliographyParser, self.parser))
+
+    def test_import(self):
+        source = open(setup.PUBMED_TEST_XML, 'r').read()
+        entries = self.parser.getEntries(source)
+        self.assertEqual(len(entries), 2)
+
+        # the same fields as from the Medline text format
+        medline = MedlineParser().getEntries(
+            open(setup.MEDLINE_TEST_MED, 'r').read())[0]
+        entry = dict(entries[0])
+        self.failUnless(medline.pop('abstract').startswith(entry.pop('abstract')))
+        self.assertEqual(entry, medline)
+
+        entry = entries[1]
+        self.assertEqual(entry['title'], 'Snakes of Senegal: an update.')
+        self.assertEqual(entry['abstract'],
+                         'BACKGROUND: Some snakes. RESULTS: More snakes.')
+        self.assertEqual(entry['publication_year'], '1998')
+        self.assertEqual(entry['publication_month'], 'Dec-1999 Jan')
+        self.assertEqual(entry['authors'],
+                         [{'firstname': 'H', 'middlename': 'P',
+                           'lastname': u'M\xfcller'.encode('utf-8')},
+                          {'firstname': '', 'middlename': '',
+                           'lastname': 'Snake Study Group'}])
+
+    def test_gzip(self):
+        source = open(setup.PUBMED_TEST_XML, 'r').read()
+        compressed = StringIO()
+        f = gzip.GzipFile(fileobj=compressed, mode='wb')
+        f.write(source)
+        f.close()
+        expected = self.parser.getEntries(source)
+        self.failUnless(self.parser.checkFormat(compressed.getvalue()))
+        self.assertEqual(self.parser.getEntries(compressed.getvalue()),
+                         expected)
+        compressed.seek(0)
+        self.assertEqual(list(self.parser.iterEntries(compressed)), expected)
+
+    def test_gzip_stream(self):
+        source = open(setup.PUBMED_TEST_XML, 'r').read()
+        compressed = StringIO()
+        for part in (source[:500], source[500:]):
+            # a file of two members, read from a file object without seek
+            f = gzip.GzipFile(fileobj=compressed, mode='wb')
+            f.write(part)
+            f.close()
+        stream = Unseekable(compressed.getvalue())
+        self.assertEqual(list(self.parser.iterEntries(stream)),
+                         self.parser.getEntries(source))
+        self.assertEqual(len(self.parser.getEntries(Unseekable(source))), 2)
+
+    def test_check_gzip_format(self):
+        for path in (setup.BIBTEX_TEST_BIB, setup.PUBMED_TEST_XML):
+            compressed = StringIO()
+            f = gzip.GzipFile(fileobj=compressed, mode='wb')
+            f.write(open(path, 'r').read())
+            f.close()
+            self.assertEqual(self.parser.checkFormat(compressed.getvalue()),
+                             path == setup.PUBMED_TEST_XML)
+        self.failIf(self.parser.checkFormat('\x1f\x8bnot really gzip'))
+
+    def test_check_format(self):
+        s0 = open(setup.PUBMED_TEST_XML, 'r').read()
+        s1 = open(setup.MEDLINE_TEST_XML, 'r').read()
+        s2 = open(setup.MEDLINE_TEST_MED, 'r').read()
+
+        self.failUnless(self.parser.checkFormat(s0),
+                        'PubMed XML Parser failed to detect PubMed XML format')
+        self.failIf(self.parser.checkFormat(s1),
+                    'PubMed XML Parser incorrectly accepted MODS format')
+        self.failIf(self.parser.checkFormat(s2),
+                    'PubMed XML Parser incorrectly accepted Medline format')
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestPubmedXMLParser),])
+    return suite
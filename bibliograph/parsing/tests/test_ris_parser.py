@@ -75,6 +75,30 @@ please make sure bibutils is installed to run all tests. """
         self.failUnless(parser.checkFormat(s1), 'RIS Parser failed to detect RIS format')
         self.failIf(parser.checkFormat(s2), 'RIS Parser incorrectly detected EndNote format as RIS')
 
+    def test_ParseWithoutBibutils(self):
+        parser = RISParser()
+        source = ('TY  - CHAP\nA1  - Franks,L.M.\nT1  - Preface by an \n'
+                  'AIDS Victim\nY1  - 1991/Oct/\nT2  - Cancer, HIV and AIDS.\n'
+                  'SN  - 0-679-40110-5\nKW  - HIV\nKW  - AIDS\nER  - \n')
+        entries = parser.getEntries(source)
+        self.assertEqual(len(entries), 1)
+        entry = entries[0]
+        self.assertEqual(entry['reference_type'], 'IncollectionReference')
+        self.assertEqual(entry['pid'], 'Franks1991')
+        self.assertEqual(entry['title'], 'Preface by an AIDS Victim')
+        self.assertEqual(entry['booktitle'], 'Cancer, HIV and AIDS.')
+        self.assertEqual(entry['publication_month'], '10')
+        self.assertEqual(entry['keywords'], ['HIV', 'AIDS'])
+        self.assertEqual(entry['identifiers'],
+                         [{'label': 'ISBN', 'value': '0-679-40110-5'}])
+        self.assertEqual(entry['authors'], [{'firstname': 'L.',
+                                             'middlename': 'M.',
+                                             'lastname': 'Franks'}])
+
+        expected = parser.getEntries(open(setup.RIS_SOURCE, 'r').read())
+        self.assertEqual(list(parser.iterEntries(open(setup.RIS_SOURCE, 'r'))),
+                         expected)
+
 
 def test_suite():
     suite = unittest.TestSuite([
@@ -0,0 +1,119 @@
+import gzip
+import unittest
+from cStringIO import StringIO
+from zope.component import provideUtility
+from zope.component.testing import setUp, tearDown
+from zope.interface.verify import verifyObject
+
+from bibliograph.parsing.tests import setup
+from bibliograph.parsing.interfaces import IBibliographyParser
+from bibliograph.parsing.interfaces import IFormatSniffer
+from bibliograph.parsing.parsers.bibtex import BibtexParser
+from bibliograph.parsing.parsers.endnote import EndNoteParser
+from bibliograph.parsing.parsers.medline import MedlineParser
+from bibliograph.parsing.parsers.pubmed import PubmedXMLParser
+from bibliograph.parsing.parsers.ris import RISParser
+from bibliograph.parsing.parsers.xml import XMLParser
+from bibliograph.parsing.sniffer import FormatSniffer, PeekableReader
+
+
+class Unseekable(object):
+    """ a file object like a pipe or a socket """
+
+    def __init__(self, data):
+        self.data = StringIO(data)
+
+    def read(self, size=-1):
+        return self.data.read(size)
+
+    def readline(self):
+        return self.data.readline()
+
+
+def compress(data):
+    compressed = StringIO()
+    fileobj = gzip.GzipFile(fileobj=compressed, mode='wb')
+    fileobj.write(data)
+    fileobj.close()
+    return compressed.getvalue()
+
+
+class FormatSnifferTest(unittest.TestCase):
+
+    def setUp(self):
+        setUp()
+        for name, factory in (('bibtex', BibtexParser),
+                              ('endnote', EndNoteParser),
+                              ('medline', MedlineParser),
+                              ('pubmed', PubmedXMLParser),
+                              ('ris', RISParser),
+                              ('xml', XMLParser)):
+            provideUtility(factory(), IBibliographyParser, name=name)
+        self.sniffer = FormatSniffer()
+
+    def tearDown(self):
+        tearDown()
+
+    def test_interface(self):
+        self.failUnless(verifyObject(IFormatSniffer, self.sniffer))
+
+    def test_detect(self):
+        for path, name in ((setup.BIBTEX_TEST_BIB, 'bibtex'),
+                           (setup.IDCOOKING_TEST_BIB, 'bibtex'),
+                           (setup.ENDNOTE_TEST_SOURCE, 'endnote'),
+                           (setup.MEDLINE_TEST_MED, 'medline'),
+                           (setup.PUBMED_TEST_XML, 'pubmed'),
+                           (setup.RIS_SOURCE, 'ris'),
+                           (setup.MEDLINE_TEST_XML, 'xml')):
+            source = open(path, 'r').read()
+            candidates = self.sniffer.detect(source)
+            self.assertEqual(candidates[0][0], name,
+                             '%s detected as %s' % (path, candidates))
+            self.failUnless(0 < candidates[0][1] <= 1)
+            parsers = dict(self.sniffer.getParsers())
+            self.failUnless(self.sniffer.getParser(source) is parsers[name])
+        self.assertEqual(self.sniffer.detect('no bibliography at all'), [])
+        self.assertEqual(self.sniffer.getParser(''), None)
+
+    def test_window(self):
+        source = open(setup.RIS_SOURCE, 'r').read()
+        # only the beginning is looked at, and read again when parsing
+        self.sniffer.window = 30
+        self.assertEqual(self.sniffer.detect(source), [('ris', 0.6)])
+        reader = PeekableReader(Unseekable(source))
+        self.assertEqual(self.sniffer.detect(reader), [('ris', 0.6)])
+        self.assertEqual(reader.read(), source)
+
+    def test_sniff(self):
+        source = open(setup.RIS_SOURCE, 'r').read()
+        parser, fileobj = self.sniffer.sniff(Unseekable(source))
+        self.assertEqual(parser.getFormatName(), 'RIS')
+        self.assertEqual(parser.getEntries(fileobj),
+                         parser.getEntries(source))
+        source = open(setup.PUBMED_TEST_XML, 'r').read()
+        parser, fileobj = self.sniffer.sniff(Unseekable(compress(source)))
+        self.assertEqual(parser.getFormatName(), 'PubMed XML')
+        self.assertEqual(parser.getEntries(fileobj),
+                         parser.getEntries(source))
+        self.assertEqual(self.sniffer.sniff('')[0], None)
+
+    def test_compressed(self):
+        # only PubMed XML is parsed compressed, nothing else is taken for it
+        for path in (setup.BIBTEX_TEST_BIB, setup.RIS_SOURCE):
+            source = compress(open(path, 'r').read())
+            self.assertEqual(self.sniffer.detect(source), [])
+        source = compress(open(setup.PUBMED_TEST_XML, 'r').read())
+        self.assertEqual(self.sniffer.detect(source), [('pubmed', 0.95)])
+
+    def test_lookup_cache(self):
+        parsers = self.sniffer.getParsers()
+        self.failUnless(self.sniffer.getParsers() is parsers)
+        provideUtility(BibtexParser(), IBibliographyParser, name='other')
+        self.assertEqual(len(self.sniffer.getParsers()), len(parsers) + 1)
+
+
+def test_suite():
+    from unittest import TestSuite, makeSuite
+    suite = TestSuite()
+    suite.addTest(makeSuite(FormatSnifferTest))
+    return suite
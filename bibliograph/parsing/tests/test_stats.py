@@ -0,0 +1,184 @@
+import gzip
+import cPickle
+import threading
+from cStringIO import StringIO
+import unittest
+
+from bibliograph.parsing.stats import ParseStats, SlowEntrySampler
+from bibliograph.parsing.metrics import MetricsRegistry, ParserMetrics
+from bibliograph.parsing.parsers.bibtex import BibtexParser
+from bibliograph.parsing.parsers.medline import MedlineParser
+from bibliograph.parsing.parsers.pubmed import PubmedXMLParser
+from bibliograph.parsing.parsers.xml import XMLParser
+from bibliograph.parsing.tests import setup
+
+
+class ParseStatsTest(unittest.TestCase):
+
+    def test_measure(self):
+        calls = []
+        stats = ParseStats(callback=lambda *args: calls.append(args))
+        self.assertEqual(stats.measure('upper', str.upper, 'abc'), 'ABC')
+        stats.add('upper', 0.5, entries=2)
+        data = stats.get('upper')
+        self.assertEqual((data['calls'], data['bytes_in'], data['bytes_out'],
+                          data['entries']), (2, 3, 3, 2))
+        self.failUnless(data['seconds'] >= 0.5)
+        self.assertEqual([call[0] for call in calls], ['upper', 'upper'])
+        self.assertEqual(stats.get('lower'), None)
+        stats.reset()
+        self.assertEqual(stats.asDict(), {})
+
+    def test_bibtex_stages(self):
+        parser = BibtexParser()
+        source = open(setup.BIBTEX_TEST_BIB, 'r').read()
+        expected = parser.getEntries(source)
+        parser.stats = ParseStats()
+        self.assertEqual(parser.getEntries(source), expected)
+        stages = parser.stats.asDict()
+        for stage in ('decodeSource', 'expandMacros', 'stripComments',
+                      'convertChars', 'stripCommands', 'splitSource',
+                      'parseEntry', 'getEntries'):
+            self.failUnless(stage in stages, stage)
+        self.assertEqual(stages['decodeSource']['bytes_in'], len(source))
+        self.assertEqual(stages['parseEntry']['entries'], 3)
+        self.assertEqual(stages['getEntries']['entries'], 3)
+        # the stats and metrics stay behind when a parser is pickled for
+        # a worker
+        parser.metrics = ParserMetrics(MetricsRegistry())
+        copy = cPickle.loads(cPickle.dumps(parser))
+        self.assertEqual(copy.stats, None)
+        self.assertEqual(copy.metrics, None)
+
+    def test_medline_stages(self):
+        parser = MedlineParser()
+        parser.stats = ParseStats()
+        entries = list(parser.iterEntries(open(setup.MEDLINE_TEST_MED, 'r')))
+        stages = parser.stats.asDict()
+        self.assertEqual(stages['decodeSource']['calls'], len(entries))
+        self.assertEqual(stages['splitSource']['entries'], len(entries))
+        self.assertEqual(stages['parseEntry']['bytes_in'],
+                         stages['splitSource']['bytes_out'])
+
+    def test_per_call(self):
+        parser = MedlineParser()
+        source = open(setup.MEDLINE_TEST_MED, 'r').read()
+        count = len(parser.getEntries(source))
+        calls = [ParseStats() for i in range(8)]
+        def parse(stats, i):
+            for j in range(i + 1):
+                if j % 2:
+                    parser.getEntries(source, stats=stats)
+                else:
+                    list(parser.iterEntries(source, stats=stats))
+        threads = [threading.Thread(target=parse, args=(stats, i))
+                   for i, stats in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i, stats in enumerate(calls):
+            self.assertEqual(stats.get('parseEntry')['entries'],
+                             count * (i + 1))
+            if i:
+                self.assertEqual(stats.get('getEntries')['calls'],
+                                 (i + 1) // 2)
+        self.assertEqual(parser.stats, None)
+
+
+class SlowEntrySamplerTest(unittest.TestCase):
+
+    def test_bounded(self):
+        sampler = SlowEntrySampler(size=3)
+        for position, seconds in enumerate([0.2, 0.5, 0.1, 0.4, 0.3, 0.6]):
+            sampler.add(seconds, 'x' * position, position, position * 10)
+        self.assertEqual([(e['seconds'], e['position'], e['offset'], e['size'])
+                          for e in sampler.entries()],
+                         [(0.6, 5, 50, 5), (0.5, 1, 10, 1), (0.4, 3, 30, 3)])
+        sampler.reset()
+        self.assertEqual(sampler.entries(), [])
+
+    def test_parser(self):
+        source = '@String{j = "Journal"}\n\n' + \
+                 ''.join(['@Article{key%d,\n  author = {M{\\"u}ller, %s},\n'
+                          '  journal = j,\n}\n\n'
+                          % (i, ' and '.join(['A. Author'] * (i * 20 + 1)))
+                          for i in range(6)])
+        parser = BibtexParser()
+        parser.sampler = SlowEntrySampler(size=2)
+        entries = parser.getEntries(source)
+        self.assertEqual(len(entries), 6)
+        self.assertEqual(entries[5]['journal'], 'Journal')
+        slowest = parser.sampler.entries()
+        self.assertEqual(len(slowest), 2)
+        for entry in slowest:
+            # the raw record, before the macros and LaTeX are resolved
+            self.assertEqual(source[entry['offset']:
+                                    entry['offset'] + entry['size']],
+                             entry['text'])
+            self.failUnless(entry['text'].startswith(
+                '@Article{key%d,' % entry['position']))
+            self.failUnless('{\\"u}' in entry['text'])
+        # the entries parsed by worker processes are sampled as well
+        parser.sampler.reset()
+        self.assertEqual(parser.getEntries(source, workers=2), entries)
+        self.assertEqual(len(parser.sampler.entries()), 2)
+
+    def test_mapped_file(self):
+        parser = MedlineParser()
+        expected = parser.getEntriesFromFile(setup.MEDLINE_TEST_MED)
+        parser.sampler = SlowEntrySampler(size=100)
+        self.assertEqual(parser.getEntriesFromFile(setup.MEDLINE_TEST_MED),
+                         expected)
+        source = open(setup.MEDLINE_TEST_MED, 'rb').read()
+        sampled = parser.sampler.entries()
+        self.assertEqual(len(sampled), len(expected))
+        for entry in sampled:
+            self.assertEqual(source[entry['offset']:
+                                    entry['offset'] + entry['size']],
+                             entry['text'])
+            self.failUnless('\nPMID- ' in entry['text'])
+
+    def checkXML(self, parser, path, tag):
+        source = open(path, 'rb').read()
+        expected = parser.getEntries(source)
+        parser.sampler = SlowEntrySampler(size=100)
+        parses = (lambda: parser.getEntries(source),
+                  lambda: parser.getEntries(source, workers=2),
+                  lambda: parser.getEntriesFromFile(path))
+        for parse in parses:
+            self.assertEqual(parse(), expected)
+            sampled = parser.sampler.entries()
+            self.assertEqual(len(sampled), len(expected))
+            for entry in sampled:
+                self.assertEqual(source[entry['offset']:
+                                        entry['offset'] + entry['size']],
+                                 entry['text'])
+                self.failUnless(entry['text'].startswith(tag))
+            parser.sampler.reset()
+        return expected
+
+    def test_xml(self):
+        self.checkXML(XMLParser(), setup.MEDLINE_TEST_XML, '<mods ')
+
+    def test_pubmed(self):
+        parser = PubmedXMLParser()
+        expected = self.checkXML(parser, setup.PUBMED_TEST_XML,
+                                 '<PubmedArticle>')
+        source = open(setup.PUBMED_TEST_XML, 'rb').read().replace(
+            '</PubmedArticle>', '</PubmedArticle>\n\n')
+        compressed = StringIO()
+        fileobj = gzip.GzipFile(fileobj=compressed, mode='wb')
+        fileobj.write(source)
+        fileobj.close()
+        for source in (source, compressed.getvalue()):
+            self.assertEqual(parser.getEntries(source, workers=2), expected)
+            self.assertEqual(len(parser.sampler.entries()), len(expected))
+            parser.sampler.reset()
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(ParseStatsTest),
+        unittest.makeSuite(SlowEntrySamplerTest),])
+    return suite
@@ -0,0 +1,99 @@
+import time
+import threading
+import unittest
+
+from zope.component import provideUtility
+from zope.component.testing import setUp, tearDown
+
+from bibliograph.rendering.interfaces import IBibTransformUtility
+from bibliograph.parsing.parsers import bibtex
+from bibliograph.parsing.transform import PooledTransformUtility, TransformJob
+
+# turns every RIS title into a BibTeX entry, standing in for ris2bib
+RIS2BIB = r"sed -n 's/^TI  - \(.*\)/@Misc{\1, title = {\1}}/p'"
+
+RIS = 'TY  - JOUR\nTI  - %s\nER  - \n'
+
+# like RIS2BIB, but drops records titled 'drop' and doubles 'twice'
+LOSSY = (r"sed -n -e '/^TI  - drop/d' "
+         r"-e 's/^TI  - \(twice\)/@Misc{\1, title = {\1}}\n@Misc{\1b, title = {\1}}/p' "
+         r"-e 's/^TI  - \(.*\)/@Misc{\1, title = {\1}}/p'")
+
+
+class PooledTransformUtilityTest(unittest.TestCase):
+
+    def test_transform(self):
+        tool = PooledTransformUtility(commands={'ris2bib': RIS2BIB})
+        self.assertEqual(tool.transform(RIS % 'a', 'ris', 'bib').strip(),
+                         '@Misc{a, title = {a}}')
+        self.assertRaises(ValueError, tool.transform, '', 'ris', 'end')
+
+    def test_batches(self):
+        tool = PooledTransformUtility(workers=1,
+                                      commands={'ris2bib': RIS2BIB})
+        jobs = ['a', 'b', RIS % 'c' + RIS % 'd', 'e']
+        results = {}
+        def transform(i, title):
+            if not title.startswith('TY'):
+                title = RIS % title
+            results[i] = tool.transform(title, 'ris', 'bib')
+        threads = [threading.Thread(target=transform, args=(i, title))
+                   for i, title in enumerate(jobs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results[0].strip(), '@Misc{a, title = {a}}')
+        self.assertEqual(results[1].strip(), '@Misc{b, title = {b}}')
+        self.assertEqual(results[2].split(),
+                         '@Misc{c, title = {c}} @Misc{d, title = {d}}'.split())
+        self.assertEqual(results[3].strip(), '@Misc{e, title = {e}}')
+
+    def test_batch_split_by_source(self):
+        tool = PooledTransformUtility(commands={'ris2bib': LOSSY})
+        jobs = [TransformJob(RIS % 'drop' + RIS % 'a', 'ris', 'bib', 10),
+                TransformJob(RIS % 'twice', 'ris', 'bib', 10)]
+        tool._runBatch(jobs)
+        self.assertEqual(jobs[0].result.split(),
+                         '@Misc{a, title = {a}}'.split())
+        self.assertEqual(jobs[1].result.split(),
+                         '@Misc{twice, title = {twice}} '
+                         '@Misc{twiceb, title = {twice}}'.split())
+
+    def test_failing_command(self):
+        tool = PooledTransformUtility(commands={'ris2bib': 'false'})
+        self.assertEqual(tool.transform(RIS % 'a', 'ris', 'bib'), '')
+        jobs = [TransformJob(RIS % 'a', 'ris', 'bib', 10),
+                TransformJob(RIS % 'b', 'ris', 'bib', 10)]
+        tool._runBatch(jobs)
+        for job in jobs:
+            self.failUnless(isinstance(job.error, RuntimeError))
+
+    def test_failing_fix(self):
+        # a failed FIX_BIBTEX transformation doesn't cost the entries
+        setUp()
+        fix, have = bibtex.FIX_BIBTEX, bibtex.haveBibUtils
+        try:
+            provideUtility(PooledTransformUtility(commands={'bib2bib':
+                                                            'false'}),
+                           IBibTransformUtility, name=u'pooled')
+            bibtex.FIX_BIBTEX = bibtex.haveBibUtils = True
+            entries = bibtex.BibtexParser().getEntries(
+                '@Misc{a, title = {A}}\n')
+            self.assertEqual([entry['title'] for entry in entries], ['A'])
+        finally:
+            bibtex.FIX_BIBTEX, bibtex.haveBibUtils = fix, have
+            tearDown()
+
+    def test_timeout(self):
+        tool = PooledTransformUtility(commands={'ris2bib': 'sleep 10'})
+        started = time.time()
+        self.assertEqual(tool.transform(RIS % 'a', 'ris', 'bib',
+                                        timeout=0.2), '')
+        self.failUnless(time.time() - started < 5)
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(PooledTransformUtilityTest),])
+    return suite
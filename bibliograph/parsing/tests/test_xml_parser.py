@@ -83,6 +83,24 @@ please make sure bibutils is installed to run all tests. """
         self.failIf(parser.checkFormat(s2), 'XML Parser incorrectly detected Bibtex format as XML(MODS)')
         self.failIf(parser.checkFormat(s3), 'XML Parser incorrectly detected Medline format as XML(MODS)')
     
+    def test_StreamingParser(self):
+        parser = XMLParser()
+        expected = parser.getEntries(open(setup.MEDLINE_TEST_XML, 'r').read())
+        entries = list(parser.iterEntries(open(setup.MEDLINE_TEST_XML, 'r')))
+        self.assertEqual(entries, expected)
+        self.assertEqual([e['pid'] for e in entries],
+                         ['GrootEtAl2003', 'AlibardiThompson2003',
+                          'CokeEtAl2003', 'TrapeMane2002'])
+
+        # a single record without a collection around it
+        source = ('<mods xmlns="http://www.loc.gov/mods/v3" ID="a">'
+                  '<titleInfo><title>A title</title></titleInfo>'
+                  '<genre>book</genre></mods>')
+        entries = parser.getEntries(source)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['reference_type'], 'BookReference')
+        self.assertEqual(entries[0]['title'], 'A title')
+
 
 def test_suite():
     suite = unittest.TestSuite([
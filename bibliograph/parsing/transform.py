@@ -0,0 +1,292 @@
+"""Pooled bibutils transforms"""
+
+# Python stuff
+import os
+import re
+import time
+import uuid
+import signal
+import logging
+import tempfile
+import threading
+import Queue
+from subprocess import Popen
+
+# Zope stuff
+from zope.interface import implements
+
+# Bibliography stuff
+from bibliograph.core.bibutils import _getCommand
+from bibliograph.core.utils import _encode, _convertToOutputEncoding
+from bibliograph.rendering.interfaces import IBibTransformUtility
+
+from bibliograph.parsing.parsers.base import BibliographyParser
+from bibliograph.parsing.parsers.bibtex import iterEntrySpans
+
+log = logging.getLogger('bibliograph.parsing')
+
+# the record put after every source of a batch, for the formats which may
+# be batched; bibutils turns it into an entry naming the marker
+_batch_markers = {'ris': 'TY  - GEN\nID  - %(marker)s\nTI  - %(marker)s\n'
+                         'ER  - \n\n',
+                  'end': '%%0 Generic\n%%F %(marker)s\n%%T %(marker)s\n\n',
+                  }
+
+
+class TransformJob(object):
+    """
+    a single source waiting to be transformed by a PooledTransformUtility
+    """
+
+    def __init__(self, data, source_format, target_format, timeout):
+        self.data = _encode(data)
+        self.source_format = source_format
+        self.target_format = target_format
+        self.deadline = time.time() + timeout
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.done = threading.Event()
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+
+class PooledTransformUtility(object):
+    """An implementation of IBibTransformUtility running the bibutils
+    commands in a bounded pool of worker threads.
+
+    Jobs wait in a queue until one of 'workers' threads picks them up, so
+    no more than that many bibutils pipelines run at the same time. Each
+    job has to be done within 'timeout' seconds of being submitted, a
+    pipeline still running then is killed. Queued RIS and EndNote sources
+    with the same target format are combined into a single bibutils run
+    of up to 'batch_size' bytes; a marker record follows every source and
+    the output is split back per source at the marker entries. If the
+    markers don't come back in order, or the batch fails, every source is
+    transformed on its own.
+
+    A command exiting with a non-zero status or timing out is logged with
+    its error output and gives an empty result, as the "external" utility
+    does, so a parser preprocessing with it goes on without it.
+    """
+
+    implements(IBibTransformUtility)
+
+    def __init__(self, workers=4, timeout=120, batch_size=256 * 1024,
+                 commands=None):
+        self.workers = workers
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.commands = commands # maps e.g. 'ris2bib' to a shell command
+        self.queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def render(self, data, source_format, target_format,
+               output_encoding=None, timeout=None):
+        """ Transform data from 'source_format' to 'target_format'
+        """
+        if timeout is None:
+            timeout = self.timeout
+        # fail early for unknown transformations
+        self._getCommand(source_format, target_format)
+        job = TransformJob(data, source_format, target_format, timeout)
+        self._startWorkers()
+        started = time.time()
+        self.queue.put(job)
+        done = job.done.wait(max(0, job.deadline - time.time()) + 1)
+        metrics = BibliographyParser.metrics
+        if metrics is not None:
+            metrics.recordTransform(source_format, target_format,
+                                    time.time() - started,
+                                    failed=not done or job.error is not None)
+        error = job.error
+        if not done:
+            job.cancelled = True
+            error = RuntimeError('Transformation from %s to %s timed out '
+                                 'after %s seconds' % (source_format,
+                                                       target_format, timeout))
+        if error is not None:
+            # like the "external" utility, a failure only costs the output
+            log.error('bibutils transformation failed: %s', error)
+            return ''
+        if output_encoding is None:
+            return job.result
+        return _convertToOutputEncoding(job.result,
+                                        output_encoding=output_encoding)
+
+    transform = render
+    __call__ = render
+
+    def _getCommand(self, source_format, target_format):
+        if self.commands is not None:
+            key = '%s2%s' % (source_format, target_format)
+            if key not in self.commands:
+                raise ValueError("No transformation from '%s' to '%s' found."
+                                 % (source_format, target_format))
+            return self.commands[key]
+        return _getCommand(source_format, target_format)
+
+    def _startWorkers(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work,
+                                          name='bibutils-%d' % len(self._threads))
+                thread.setDaemon(True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            jobs = self._nextBatch()
+            try:
+                self._runBatch(jobs)
+            except Exception, e:
+                log.exception('bibutils transformation failed')
+                for job in jobs:
+                    if not job.done.isSet():
+                        job.finish(error=e)
+
+    def _nextBatch(self):
+        """
+        waits for a job and adds the compatible jobs queued right now
+        """
+        job = self.queue.get()
+        jobs = [job]
+        if job.source_format not in _batch_markers or \
+           job.target_format != 'bib':
+            return jobs
+        size = len(job.data)
+        postponed = []
+        while size < self.batch_size:
+            try:
+                other = self.queue.get_nowait()
+            except Queue.Empty:
+                break
+            if other.source_format == job.source_format and \
+               other.target_format == job.target_format and \
+               size + len(other.data) <= self.batch_size:
+                jobs.append(other)
+                size += len(other.data)
+            else:
+                postponed.append(other)
+        for other in postponed:
+            self.queue.put(other)
+        return jobs
+
+    def _runJob(self, job):
+        try:
+            job.finish(self._run(job.data, job.source_format,
+                                 job.target_format, job.deadline))
+        except Exception, e:
+            job.finish(error=e)
+
+    def _runBatch(self, jobs):
+        jobs = [job for job in jobs if not job.cancelled]
+        if len(jobs) == 1:
+            self._runJob(jobs[0])
+            return
+        if not jobs:
+            return
+
+        job = jobs[0]
+        prefix = 'bibliographbatch%s' % uuid.uuid4().hex
+        marker = _batch_markers[job.source_format]
+        # make sure every source ends with a newline before joining them
+        data = ''.join([j.data.rstrip('\n') + '\n\n' +
+                        marker % {'marker': '%sn%d' % (prefix, i)}
+                        for i, j in enumerate(jobs)])
+        try:
+            result = self._run(data, job.source_format, job.target_format,
+                               min([j.deadline for j in jobs]))
+            outputs = self._splitBatch(result, prefix, len(jobs))
+        except RuntimeError, e:
+            log.info('Batched bibutils transformation failed (%s)', e)
+            outputs = None
+        if outputs is None:
+            log.info('Could not split batched bibutils output, '
+                     'transforming %d sources one by one', len(jobs))
+            for j in jobs:
+                self._runJob(j)
+            return
+        for j, output in zip(jobs, outputs):
+            j.finish(output)
+
+    def _splitBatch(self, result, prefix, count):
+        """
+        returns the outputs of the 'count' sources of a batch, split at
+        their marker entries, or None if the markers are not all found
+        in their order
+        """
+        marker = re.compile(re.escape(prefix) + r'n(\d+)')
+        outputs = []
+        entries = []
+        for start, end in iterEntrySpans(result):
+            entry = result[start:end]
+            match = marker.search(entry)
+            if match is None:
+                entries.append(entry + '\n\n')
+                continue
+            if int(match.group(1)) != len(outputs):
+                return None
+            outputs.append(''.join(entries))
+            entries = []
+        if len(outputs) != count or entries:
+            return None
+        return outputs
+
+    def _run(self, data, source_format, target_format, deadline):
+        """
+        pipes data through the bibutils command, killing it at 'deadline'
+        """
+        command = self._getCommand(source_format, target_format)
+        env = os.environ.copy()
+        if env.has_key('BIBUTILS_PATH'):
+            env['PATH'] = os.pathsep.join([env.get('PATH', ''),
+                                           env['BIBUTILS_PATH']])
+        # files instead of pipes, pipelines like "end2xml | xml2bib" have
+        # been seen hanging while their output was read from a pipe
+        stdin = tempfile.TemporaryFile()
+        stdout = tempfile.TemporaryFile()
+        stderr = tempfile.TemporaryFile()
+        try:
+            stdin.write(data)
+            stdin.seek(0)
+            ts = time.time()
+            # a session of its own, so the whole pipeline can be killed
+            process = Popen(command, shell=True, stdin=stdin, stdout=stdout,
+                            stderr=stderr, env=env,
+                            preexec_fn=getattr(os, 'setsid', None))
+            while process.poll() is None:
+                if time.time() > deadline:
+                    if hasattr(os, 'killpg'):
+                        os.killpg(process.pid, signal.SIGKILL)
+                    else:
+                        process.kill()
+                    process.wait()
+                    raise RuntimeError('%s timed out' % command)
+                time.sleep(0.01)
+            log.info('%s: %2.2f seconds', command, time.time() - ts)
+            stderr.seek(0)
+            error = stderr.read().strip()
+            if process.returncode:
+                raise RuntimeError('%s failed with exit status %d: %s'
+                                   % (command, process.returncode, error))
+            stdout.seek(0)
+            result = stdout.read()
+            if error:
+                # bibutils reports what it did there as well
+                if data.strip() and not result.strip():
+                    log.error('%s: %s', command, error)
+                else:
+                    log.info('%s: %s', command, error)
+            return result
+        finally:
+            stdin.close()
+            stdout.close()
+            stderr.close()